@@ -0,0 +1 @@
+# 性能基准脚本，使用 python -m benchmarks.xxx 运行，默认跑在 SQLite 内存库上
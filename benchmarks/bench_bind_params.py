@@ -0,0 +1,63 @@
+"""
+对比 DORM 字面量拼接与绑定参数模式：SQL 构建耗时 和 执行耗时
+python -m benchmarks.bench_bind_params
+"""
+import datetime
+
+from benchmarks.common import timeit, print_result
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 2000
+
+
+def build_query(use_bind_params, i):
+    return DORM("bench_users", use_bind_params=use_bind_params).query().where(
+        status__in=[1, 2, 3][:i % 3 + 1],
+        name__like="user_%s" % i,
+        score__gte=i % 100,
+        create_time__lt=datetime.datetime(2030, 1, 1),
+    )
+
+
+def prepare():
+    db.session.execute("DROP TABLE IF EXISTS bench_users")
+    db.session.execute("CREATE TABLE bench_users (id INTEGER PRIMARY KEY, name TEXT, status INT, "
+                       "score INT, create_time TEXT)")
+    for i in range(ROWS):
+        db.session.execute("INSERT INTO bench_users(name, status, score, create_time) VALUES "
+                           "(:name, :status, :score, '2020-01-01 00:00:00')",
+                           {"name": "user_%s" % i, "status": i % 4, "score": i % 100})
+    db.session.commit()
+
+
+def main():
+    prepare()
+    counter = {"i": 0}
+
+    def build(use_bind_params):
+        def run():
+            counter["i"] += 1
+            build_query(use_bind_params, counter["i"]).get_sql()
+        return run
+
+    def execute(use_bind_params):
+        def run():
+            counter["i"] += 1
+            build_query(use_bind_params, counter["i"]).execute(obj_type="dict")
+        return run
+
+    print("== SQL 构建 ==")
+    literal_build = timeit(build(False), number=5000)
+    print_result("literal get_sql", literal_build)
+    print_result("bind params get_sql", timeit(build(True), number=5000), literal_build)
+
+    print("== 构建 + 执行 (SQLite 内存库) ==")
+    literal_exec = timeit(execute(False), number=500)
+    print_result("literal execute", literal_exec)
+    print_result("bind params execute", timeit(execute(True), number=500), literal_exec)
+    print("skeleton cache:", DORM.skeleton_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
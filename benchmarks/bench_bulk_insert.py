@@ -0,0 +1,45 @@
+"""
+批量插入：DORM.batch_insert(一条超长 VALUES 字面量) vs DORM.bulk_insert(分块参数化 executemany)
+python -m benchmarks.bench_bulk_insert
+"""
+import datetime
+import time
+
+import benchmarks.common  # noqa: F401
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 100000
+FIELDS = ["name", "score", "remark", "create_time"]
+
+
+def make_rows():
+    now = datetime.datetime(2022, 1, 1)
+    for i in range(ROWS):
+        yield ["user_%s" % i, i % 100, "remark %s" % i, now]
+
+
+def reset_table():
+    db.session.execute("DROP TABLE IF EXISTS bench_bulk")
+    db.session.execute("CREATE TABLE bench_bulk (id INTEGER PRIMARY KEY, name TEXT, score INT, remark TEXT, "
+                       "create_time TEXT)")
+    db.session.commit()
+
+
+def main():
+    reset_table()
+    t_start = time.perf_counter()
+    DORM("bench_bulk").batch_insert(fields=FIELDS, values=list(make_rows())).execute()
+    legacy = time.perf_counter() - t_start
+    print("batch_insert  %s rows  %.2f s  %.0f rows/s" % (ROWS, legacy, ROWS / legacy))
+
+    reset_table()
+    report = DORM("bench_bulk").bulk_insert(FIELDS, make_rows(), chunk_rows=5000)
+    print("bulk_insert   %s rows  %.2f s  %.0f rows/s  (%s chunks)  x%.2f"
+          % (report["rows"], report["elapsed"], report["rows_per_sec"], report["chunks"],
+             legacy / report["elapsed"]))
+    assert db.session.execute("SELECT COUNT(*) FROM bench_bulk").scalar() == ROWS
+
+
+if __name__ == "__main__":
+    main()
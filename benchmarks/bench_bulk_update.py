@@ -0,0 +1,53 @@
+"""
+每行更新为不同的值：逐行 DORM.update vs DORM.bulk_update(分块 UPDATE ... SET col = CASE id WHEN ... END)
+python -m benchmarks.bench_bulk_update
+"""
+import time
+
+import benchmarks.common  # noqa: F401
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 20000
+
+
+def reset_table():
+    db.session.execute("DROP TABLE IF EXISTS bench_update")
+    db.session.execute("CREATE TABLE bench_update (id INTEGER PRIMARY KEY, name TEXT, score INT)")
+    db.session.commit()
+    DORM("bench_update").bulk_insert(["id", "name", "score"], ([i, "user_%s" % i, 0] for i in range(ROWS)))
+
+
+def make_rows():
+    for i in range(ROWS):
+        yield {"id": i, "score": i % 100, "name": "new_%s" % i}
+
+
+def row_by_row():
+    for row in make_rows():
+        DORM("bench_update", use_bind_params=True, id=row["id"]).update(score=row["score"], name=row["name"]).execute()
+
+
+def check():
+    assert db.session.execute("SELECT COUNT(*) FROM bench_update WHERE name LIKE 'new_%' "
+                              "AND score = id % 100").scalar() == ROWS
+
+
+def main():
+    reset_table()
+    t_start = time.perf_counter()
+    row_by_row()
+    legacy = time.perf_counter() - t_start
+    print("DORM.update per row  %s rows  %.2f s  %.0f rows/s" % (ROWS, legacy, ROWS / legacy))
+    check()
+
+    reset_table()
+    report = DORM("bench_update").bulk_update(key="id", rows=make_rows())
+    print("bulk_update          %s rows  %.2f s  %.0f rows/s  (%s chunks, %s affected)  x%.2f"
+          % (report["rows"], report["elapsed"], report["rows_per_sec"], report["chunks"], report["affected"],
+             legacy / report["elapsed"]))
+    check()
+
+
+if __name__ == "__main__":
+    main()
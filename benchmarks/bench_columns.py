@@ -0,0 +1,58 @@
+"""
+报表聚合：逐行 dict 在 Python 中累加 vs fetch="columns" 后用 numpy 向量化计算
+python -m benchmarks.bench_columns
+"""
+import datetime
+
+import benchmarks.common  # noqa: F401
+from benchmarks.common import timeit, print_result
+from project import db
+from tools.db_tool import columnar
+from tools.db_tool.orm import DORM
+
+ROWS = 100000
+
+
+def prepare():
+    db.session.execute("DROP TABLE IF EXISTS bench_columns")
+    db.session.execute("CREATE TABLE bench_columns (id INTEGER PRIMARY KEY, level INT, amount REAL, "
+                       "create_time DATETIME)")
+    db.session.execute("WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                       "INSERT INTO bench_columns(level, amount, create_time) "
+                       "SELECT n %% 10, CASE WHEN n %% 13 = 0 THEN NULL ELSE n * 0.5 END, "
+                       "datetime('2022-01-01', '+' || (n %% 365) || ' days') FROM seq" % ROWS)
+    db.session.commit()
+
+
+def query():
+    return DORM("bench_columns", force_execute=True).query("level, amount")
+
+
+def by_rows():
+    totals = {}
+    for row in query().execute(obj_type="dict"):
+        if row["amount"] is not None:
+            totals[row["level"]] = totals.get(row["level"], 0) + row["amount"]
+    return totals
+
+
+def by_columns():
+    columns = query().execute(fetch="columns")
+    level, amount = columns["level"], columnar.numpy.ma.filled(columns["amount"], 0)
+    sums = columnar.numpy.bincount(level, weights=amount)
+    return {index: value for index, value in enumerate(sums.tolist())}
+
+
+def main():
+    if columnar.load_numpy() is None:
+        print("numpy 未安装，跳过")
+        return
+    prepare()
+    assert {k: round(v, 2) for k, v in by_rows().items()} == {k: round(v, 2) for k, v in by_columns().items()}
+    baseline = timeit(by_rows)
+    print_result("rows -> dict -> python sum", baseline)
+    print_result("fetch=columns -> numpy bincount", timeit(by_columns), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+导出 20 万行：一次查出后 json_response vs DORM.export 流式 NDJSON/CSV/JSON 的峰值内存和首字节时间
+python -m benchmarks.bench_export
+"""
+import time
+import tracemalloc
+
+import benchmarks.common  # noqa: F401
+from benchmarks.bench_stream import prepare, ROWS
+from project import app, json_response
+from tools.db_tool.orm import DORM
+
+
+def query():
+    return DORM("bench_stream", force_execute=True).query()
+
+
+def consume(response):
+    t_start = time.perf_counter()
+    first_byte = None
+    total = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - t_start
+        total += len(chunk)
+    return first_byte, total
+
+
+def measure(name, build):
+    with app.test_request_context():
+        tracemalloc.start()
+        t_start = time.perf_counter()
+        response = build()
+        first_byte, total = consume(response)
+        elapsed = time.perf_counter() - t_start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    # json_response 要等整个结果查出并序列化后才有首字节
+    if name == "json_response":
+        first_byte = elapsed
+    print("%-16s rows=%s  total %.2f s  first byte %7.1f ms  %6.1f MB out  peak %6.1f MB" % (
+        name, ROWS, elapsed, first_byte * 1000, total / 1024 / 1024, peak / 1024 / 1024))
+
+
+def main():
+    prepare()
+    measure("json_response", lambda: json_response(data={"datalist": query().execute(obj_type="dict")}))
+    for fmt in ("ndjson", "csv", "json"):
+        measure("export %s" % fmt, lambda: query().export(fmt=fmt, chunk_size=2000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+冷启动 import 耗时：用 python -X importtime 在子进程中分别 import 各入口模块，
+取多轮中最快一轮的累计耗时，并列出自身耗时最多的模块，便于发现 import 时的重初始化
+    python -m benchmarks.bench_import [--repeat 5] [--top 10] [模块 ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import benchmarks.common  # noqa: F401  设置 DATABASE_URL/REDIS_URL 等环境变量，子进程继承
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ("tools.db_tool.orm", "project", "manage")
+
+
+def import_times(module):
+    """
+    :return: {模块名: (自身耗时us, 累计耗时us)}
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import %s" % module],
+                            cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError("import %s 失败：%s" % (module, result.stderr[-2000:]))
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import 耗时基准")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        best = None
+        for _ in range(args.repeat):
+            times = import_times(module)
+            if best is None or times[module][1] < best[module][1]:
+                best = times
+        print("%-40s %10.2f ms" % ("import " + module, best[module][1] / 1e3))
+        for name, (self_us, _) in sorted(best.items(), key=lambda item: -item[1][0])[:args.top]:
+            print("    %-36s %10.2f ms" % (name, self_us / 1e3))
+
+
+if __name__ == "__main__":
+    main()
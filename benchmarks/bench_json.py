@@ -0,0 +1,52 @@
+"""
+json_response 序列化：ReturnDict.to_json(标准库 + MyJsonEncoder) vs ReturnDict.to_json_bytes(orjson)
+python -m benchmarks.bench_json
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+import benchmarks.common  # noqa: F401
+from benchmarks.common import timeit, print_result
+from tools.exception import ReturnDict
+from tools.util import JsonTool, orjson
+
+
+def make_rows(count):
+    now = datetime.datetime(2022, 10, 1, 12, 30, 45)
+    return [{
+        "id": i,
+        "name": "用户_%s" % i,
+        "score": decimal.Decimal("%s.25" % i),
+        "level": i % 7,
+        "ratio": i / 3,
+        "uid": uuid.UUID(int=i),
+        "tags": ["a", "b", "c"],
+        "create_time": now,
+        "birthday": now.date(),
+    } for i in range(count)]
+
+
+def main():
+    for name, count in (("small (20 rows)", 20), ("list (1000 rows)", 1000), ("large (20000 rows)", 20000)):
+        data = {"datalist": make_rows(count), "totalcount": count, "update_time": datetime.datetime.now()}
+        return_dict = ReturnDict(data=data)
+        stdlib_bytes = return_dict.to_json().encode("utf-8")
+        number = max(1, 20000 // count)
+        baseline = timeit(lambda: return_dict.to_json().encode("utf-8"), number=number)
+        print_result("%s to_json stdlib" % name, baseline)
+        for backend in ("stdlib", "orjson"):
+            if backend == "orjson" and orjson is None:
+                continue
+            JsonTool.set_backend(backend)
+            assert json.loads(return_dict.to_json_bytes()) == json.loads(stdlib_bytes)
+            print_result("%s to_json_bytes %s" % (name, backend), timeit(return_dict.to_json_bytes, number=number),
+                         baseline)
+        # 序列化不修改调用方的数据
+        assert isinstance(data["update_time"], datetime.datetime)
+    JsonTool.set_backend("auto")
+
+
+if __name__ == "__main__":
+    main()
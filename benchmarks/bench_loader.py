@@ -0,0 +1,48 @@
+"""
+N+1 查询：循环里逐个 execute(fetch="one") vs DORM.load 批量加载
+python -m benchmarks.bench_loader
+"""
+import benchmarks.common  # noqa: F401
+from benchmarks.common import timeit, print_result
+from project import app, db
+from tools.db_tool.orm import DORM
+
+USERS = 2000
+ORDERS = 500
+
+
+def prepare():
+    db.session.execute("DROP TABLE IF EXISTS bench_user")
+    db.session.execute("CREATE TABLE bench_user (id INTEGER PRIMARY KEY, name TEXT)")
+    db.session.execute("WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                       "INSERT INTO bench_user(id, name) SELECT n, 'user_' || n FROM seq" % USERS)
+    db.session.commit()
+
+
+def order_user_ids():
+    return [(i * 7) % USERS + 1 for i in range(ORDERS)]
+
+
+def n_plus_one():
+    return [DORM("bench_user").query().where(id=user_id).execute(fetch="one").name for user_id in order_user_ids()]
+
+
+def batched():
+    with app.test_request_context():
+        users = [DORM("bench_user").load(id=user_id) for user_id in order_user_ids()]
+        names = [user.name for user in users]
+        assert DORM.loader("bench_user").query_count == 1
+        return names
+
+
+def main():
+    prepare()
+    with app.app_context():
+        assert n_plus_one() == batched()
+    baseline = timeit(n_plus_one)
+    print_result("n+1 execute(fetch=one) x%s" % ORDERS, baseline)
+    print_result("DORM.load batched", timeit(batched), baseline)
+
+
+if __name__ == "__main__":
+    main()
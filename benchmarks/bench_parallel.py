@@ -0,0 +1,58 @@
+"""
+互不依赖的查询：逐条执行 vs BaseOrm.execute_parallel
+SQLite 内存库只有一个连接，这里用临时文件库，并注册一个会 sleep 的函数模拟慢查询
+python -m benchmarks.bench_parallel
+"""
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), "dorm_bench_parallel.db")
+
+import benchmarks.common  # noqa: F401
+from benchmarks.common import timeit, print_result
+from sqlalchemy import event
+from project import db
+from tools.db_tool.orm import DORM
+from tools.db_tool.orm_base import BaseOrm
+
+QUERIES = 6
+SLEEP = 0.05
+
+
+def prepare():
+    @event.listens_for(db.engine, "connect")
+    def register_sleep(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, lambda seconds: time.sleep(seconds) or 1)
+
+    db.session.execute("DROP TABLE IF EXISTS bench_parallel")
+    db.session.execute("CREATE TABLE bench_parallel (id INTEGER PRIMARY KEY, name TEXT)")
+    db.session.execute("INSERT INTO bench_parallel(name) VALUES ('a'), ('b'), ('c')")
+    db.session.commit()
+    db.session.remove()
+    db.engine.dispose()
+
+
+def build_queries():
+    return [DORM("bench_parallel").query("id, bench_sleep(%s) AS s" % SLEEP).where(id=i % 3 + 1)
+            for i in range(QUERIES)]
+
+
+def serial():
+    return [query.execute(obj_type="dict") for query in build_queries()]
+
+
+def parallel():
+    return BaseOrm.execute_parallel(build_queries(), obj_type="dict")
+
+
+def main():
+    prepare()
+    assert serial() == parallel()
+    baseline = timeit(serial)
+    print_result("serial x%s (%s s each)" % (QUERIES, SLEEP), baseline)
+    print_result("execute_parallel", timeit(parallel), baseline)
+
+
+if __name__ == "__main__":
+    main()
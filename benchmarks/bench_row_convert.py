@@ -0,0 +1,83 @@
+"""
+行转换微基准：100k 行 x 30 列，对比原先逐单元格 isinstance 判断与按列转换计划
+python -m benchmarks.bench_row_convert
+"""
+import datetime
+import decimal
+
+from benchmarks.common import timeit, print_result
+from tools.db_tool.row_converter import convert_rows, DEFAULT_DATE, DEFAULT_TIME
+from tools.util import JsonTool
+
+ROWS = 100000
+
+
+def legacy_convert_rows(col_names, rows, json_list_keys=None, json_dict_keys=None, decimal_to_float=False):
+    # 原 execute_select_sql 中的逐单元格转换，保留作对照
+    result = []
+    for row_data in rows:
+        obj_dict = {}
+        for index_colname in range(0, len(col_names)):
+            colname = col_names[index_colname]
+            rowvalue = row_data[index_colname]
+            if isinstance(json_list_keys, list) and colname in json_list_keys:
+                if rowvalue:
+                    rowvalue = JsonTool.to_dict_or_list(rowvalue)
+                else:
+                    rowvalue = []
+            if isinstance(json_dict_keys, list) and colname in json_dict_keys:
+                if rowvalue:
+                    rowvalue = JsonTool.to_dict_or_list(rowvalue)
+                else:
+                    rowvalue = {}
+            if isinstance(rowvalue, datetime.datetime):
+                rowvalue_str = rowvalue.strftime('%Y-%m-%d %H:%M:%S')
+                rowvalue = "" if rowvalue_str == DEFAULT_TIME else rowvalue_str
+            elif isinstance(rowvalue, datetime.date):
+                rowvalue_str = rowvalue.strftime('%Y-%m-%d')
+                rowvalue = "" if rowvalue_str == DEFAULT_DATE else rowvalue_str
+            elif isinstance(rowvalue, str) and (colname.endswith("_date") or colname.endswith("_time")) \
+                    and rowvalue.startswith("0000-00-00"):
+                rowvalue = ""
+            if decimal_to_float and isinstance(rowvalue, decimal.Decimal):
+                rowvalue = float(rowvalue)
+            obj_dict[colname] = rowvalue
+        result.append(obj_dict)
+    return result
+
+
+def make_rows():
+    # 30 列：20 个整数/字符串列，2 个 datetime，2 个 date，2 个 _time 字符串列，2 个 decimal，1 个 json，1 个全空列
+    col_names = ["c_int_%s" % i for i in range(10)] + ["c_str_%s" % i for i in range(10)] + \
+                ["create_time", "mod_time", "start_date", "end_date", "plan_time", "real_time",
+                 "price", "amount", "tags", "remark"]
+    dt = datetime.datetime(2022, 5, 1, 12, 30, 0)
+    d = datetime.date(2022, 5, 1)
+    rows = []
+    for i in range(ROWS):
+        rows.append(tuple(range(i, i + 10)) + tuple("s%s" % j for j in range(10)) +
+                    (dt, dt, d, d, "2022-05-01 00:00:00", "0000-00-00 00:00:00",
+                     decimal.Decimal("1.50"), decimal.Decimal("2.25"), '["a", "b"]', None))
+    return col_names, rows
+
+
+def main():
+    col_names, rows = make_rows()
+    options = {"json_list_keys": ["tags"], "decimal_to_float": True}
+    assert legacy_convert_rows(col_names, rows[:100], **options) == convert_rows(col_names, rows[:100], **options)
+
+    print("== %s rows x %s cols ==" % (ROWS, len(col_names)))
+    legacy = timeit(lambda: legacy_convert_rows(col_names, rows, **options), repeat=2)
+    print_result("per-cell isinstance chain", legacy)
+    print_result("converter plan", timeit(lambda: convert_rows(col_names, rows, **options), repeat=2), legacy)
+
+    plain_rows = [row[:20] for row in rows]
+    plain_cols = col_names[:20]
+    legacy = timeit(lambda: legacy_convert_rows(plain_cols, plain_rows), repeat=2)
+    print_result("per-cell (int/str only, 20 cols)", legacy)
+    print_result("converter plan (int/str only, 20 cols)", timeit(lambda: convert_rows(plain_cols, plain_rows),
+                                                                   repeat=2), legacy)
+
+
+if __name__ == "__main__":
+    main()
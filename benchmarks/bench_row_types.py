@@ -0,0 +1,53 @@
+"""
+5 万行结果：每行一个 DORM 对象 vs dict / __slots__ 行对象 / namedtuple / tuple 的内存和构造耗时
+python -m benchmarks.bench_row_types
+"""
+import time
+import tracemalloc
+
+import benchmarks.common  # noqa: F401
+from benchmarks.common import format_seconds
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 50000
+OBJ_TYPES = ("orm", "dict", "row", "namedtuple", "tuple")
+
+
+def prepare():
+    db.session.execute("DROP TABLE IF EXISTS bench_row")
+    db.session.execute("CREATE TABLE bench_row (id INTEGER PRIMARY KEY, name TEXT, score INT, level INT, "
+                       "remark TEXT)")
+    db.session.execute("WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                       "INSERT INTO bench_row(name, score, level, remark) "
+                       "SELECT 'user_' || n, n %% 100, n %% 7, 'remark ' || n FROM seq" % ROWS)
+    db.session.commit()
+
+
+def measure(obj_type):
+    tracemalloc.start()
+    t_start = time.perf_counter()
+    rows = DORM("bench_row", force_execute=True).query().execute(obj_type=obj_type)
+    elapsed = time.perf_counter() - t_start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, elapsed, current
+
+
+def main():
+    prepare()
+    baseline = None
+    for obj_type in OBJ_TYPES:
+        rows, elapsed, memory = measure(obj_type)
+        assert len(rows) == ROWS
+        if obj_type != "tuple":
+            assert rows[1].get_attrs()["name"] if obj_type != "dict" else rows[1]["name"]
+        if baseline is None:
+            baseline = (elapsed, memory)
+        print("obj_type=%-10s %s  x%.2f   retained %7.1f MB  x%.2f" % (
+            obj_type, format_seconds(elapsed), baseline[0] / elapsed, memory / 1024 / 1024, baseline[1] / memory))
+        del rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+SQL日志开销：同步格式化输出 vs 后台队列，以及采样
+python -m benchmarks.bench_sql_log
+"""
+import logging
+import os
+import time
+
+from benchmarks.common import timeit, print_result
+from project import app
+from tools.db_tool.orm_base import BaseOrm, logger
+
+ROWS = [{"id": i, "name": "user_%s" % i, "create_time": "2022-01-01 00:00:00"} for i in range(200)]
+
+
+def log_once(with_val):
+    t_start = time.time()
+    BaseOrm.log_sql_result("SELECT * FROM users WHERE id IN (1,2,3)", {}, t_start, t_start + 0.002,
+                           t_start + 0.003, None, ROWS, log_trace_id="bench", database="default",
+                           with_val=with_val)
+
+
+def main():
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+
+    for with_val in (True, False):
+        print("== with_val=%s ==" % with_val)
+        app.config["SQL_LOG_ASYNC"] = False
+        sync = timeit(lambda: log_once(with_val), number=2000)
+        print_result("sync log_sql_result", sync)
+
+        app.config["SQL_LOG_ASYNC"] = True
+        print_result("async log_sql_result", timeit(lambda: log_once(with_val), number=2000), sync)
+        BaseOrm.sql_log_pipeline.flush()
+
+        app.config["SQL_LOG_SAMPLE_RATE"] = 0.1
+        print_result("async, 10% sampling", timeit(lambda: log_once(with_val), number=2000), sync)
+        app.config["SQL_LOG_SAMPLE_RATE"] = 1.0
+        BaseOrm.sql_log_pipeline.flush()
+    print(BaseOrm.sql_log_pipeline.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+对比 fetch="list" 与 fetch="iter" 的峰值内存
+python -m benchmarks.bench_stream
+"""
+import time
+import tracemalloc
+
+import benchmarks.common  # noqa: F401
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 200000
+
+
+def prepare():
+    db.session.execute("DROP TABLE IF EXISTS bench_stream")
+    db.session.execute("CREATE TABLE bench_stream (id INTEGER PRIMARY KEY, name TEXT, score INT, remark TEXT)")
+    db.session.execute("WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                       "INSERT INTO bench_stream(name, score, remark) "
+                       "SELECT 'user_' || n, n %% 100, 'remark remark remark ' || n FROM seq" % ROWS)
+    db.session.commit()
+
+
+def measure(fetch):
+    tracemalloc.start()
+    t_start = time.perf_counter()
+    total = 0
+    rows = DORM("bench_stream", force_execute=True).query().execute(fetch=fetch, obj_type="dict", chunk_size=2000)
+    for row in rows:
+        total += row["score"]
+    elapsed = time.perf_counter() - t_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("fetch=%-5s rows=%s  %.2f s  peak %.1f MB" % (fetch, ROWS, elapsed, peak / 1024 / 1024))
+
+
+def main():
+    prepare()
+    measure("list")
+    measure("iter")
+
+
+if __name__ == "__main__":
+    main()
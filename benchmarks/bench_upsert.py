@@ -0,0 +1,58 @@
+"""
+同步外部数据：逐行 SELECT 再 INSERT/UPDATE(DORM.save) vs DORM.bulk_upsert(分块 INSERT ... ON CONFLICT/ON DUPLICATE KEY)
+一半的行已存在，需要更新
+python -m benchmarks.bench_upsert
+"""
+import time
+
+import benchmarks.common  # noqa: F401
+from project import db
+from tools.db_tool.orm import DORM
+
+ROWS = 20000
+FIELDS = ["id", "name", "score"]
+
+
+def make_rows():
+    # id 从 ROWS/2 开始，前一半已存在
+    for i in range(ROWS // 2, ROWS // 2 + ROWS):
+        yield [i, "user_%s" % i, i % 100]
+
+
+def reset_table():
+    db.session.execute("DROP TABLE IF EXISTS bench_upsert")
+    db.session.execute("CREATE TABLE bench_upsert (id INTEGER PRIMARY KEY, name TEXT, score INT)")
+    db.session.commit()
+    DORM("bench_upsert").bulk_insert(FIELDS, ([i, "old_%s" % i, 0] for i in range(ROWS)))
+
+
+def row_by_row():
+    for row_id, name, score in make_rows():
+        exists = DORM("bench_upsert", use_bind_params=True).query("id").where(id=row_id).execute(obj_type="dict")
+        orm_obj = DORM("bench_upsert", use_bind_params=True, name=name, score=score)
+        if exists:
+            orm_obj.id = row_id
+            orm_obj.save().execute()
+        else:
+            orm_obj.insert(id=row_id).execute()
+
+
+def main():
+    reset_table()
+    t_start = time.perf_counter()
+    row_by_row()
+    legacy = time.perf_counter() - t_start
+    print("SELECT + save  %s rows  %.2f s  %.0f rows/s" % (ROWS, legacy, ROWS / legacy))
+    assert db.session.execute("SELECT COUNT(*) FROM bench_upsert").scalar() == ROWS // 2 + ROWS
+
+    reset_table()
+    report = DORM("bench_upsert").bulk_upsert(FIELDS, make_rows(), chunk_rows=5000)
+    print("bulk_upsert    %s rows  %.2f s  %.0f rows/s  (%s chunks, %s inserted, %s updated)  x%.2f"
+          % (report["rows"], report["elapsed"], report["rows_per_sec"], report["chunks"], report["inserted"],
+             report["updated"], legacy / report["elapsed"]))
+    assert report["inserted"] == ROWS // 2 and report["updated"] == ROWS // 2
+    assert db.session.execute("SELECT COUNT(*) FROM bench_upsert WHERE name LIKE 'user_%'").scalar() == ROWS
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import time
+
+# 基准默认跑在 SQLite 内存库，必须在 import project 之前设置
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("SQLALCHEMY_SILENCE_UBER_WARNING", "1")
+# 指纹统计只在进程内汇总，不依赖 Redis
+os.environ.setdefault("SQL_METRICS_BACKEND", "local")
+
+import logging
+
+from project import get_default_app
+
+# 基准脚本不在 app 上下文中运行，db 等扩展使用默认 app
+get_default_app()
+
+# 基准只关心耗时，SQL 日志不输出
+logging.getLogger("tools.db_tool.orm_base").setLevel(logging.WARNING)
+
+
+def timeit(func, number=1, repeat=3):
+    """
+    运行 func number 次，重复 repeat 轮，返回最快一轮的单次平均耗时(秒)
+    """
+    best = None
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - t_start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def format_seconds(seconds):
+    if seconds >= 0.01:
+        return "%10.2f ms" % (seconds * 1e3)
+    return "%10.2f us" % (seconds * 1e6)
+
+
+def print_result(name, seconds, baseline=None):
+    if baseline:
+        print("%-40s %s   x%.2f" % (name, format_seconds(seconds), baseline / seconds))
+    else:
+        print("%-40s %s" % (name, format_seconds(seconds)))
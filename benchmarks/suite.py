@@ -0,0 +1,384 @@
+"""
+ORM 与响应层热点路径的基准套件：SQLite 内存库 + fakeredis(已安装时)，固定数据和随机种子，结果保存为 JSON，
+compare 对比两次结果，任一用例单次耗时比基线慢超过阈值时退出码为 1，可放在 CI 中卡住性能回退
+    python -m benchmarks.suite run [--output result.json] [--repeat 7] [--quick] [--filter dorm.] [--baseline base.json]
+    python -m benchmarks.suite compare base.json result.json [--threshold 0.15]
+    python -m benchmarks.suite list
+"""
+import argparse
+import datetime
+import decimal
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+import benchmarks.common  # noqa: F401
+import sqlalchemy
+from project import db, get_app
+from project.extensions import redis_client
+from tools.db_tool.orm import DORM
+from tools.db_tool.orm_base import BaseOrm, logger
+from tools.exception import ReturnDict
+from tools.util import JsonTool
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = 20221001
+TABLE_ROWS = 5000
+DEFAULT_THRESHOLD = 0.15
+
+# 用例注册表：名称 -> {"func", "number", "setup", "redis"}，按注册顺序运行
+CASES = {}
+
+
+def case(name, number, setup=None, redis=False):
+    """
+    注册基准用例，func 无参数，每次调用为一次操作
+    :param number: 每轮调用次数，--quick 时减少到 1/10
+    :param setup: 每个用例运行前调用一次，返回 False 时跳过该用例
+    :param redis: 是否需要 Redis，没有 fakeredis 时跳过，不连接真实 Redis
+    """
+    def decorator(func):
+        CASES[name] = {"func": func, "number": number, "setup": setup, "redis": redis}
+        return func
+    return decorator
+
+
+def use_fake_redis():
+    """
+    把 redis_client 换成进程内的 fakeredis，基准结果不受本机 Redis 影响
+    :return: 是否替换成功
+    """
+    if fakeredis is None:
+        return False
+    # FlaskRedis 把连接放在 _redis_client，属性访问都代理给它
+    redis_client._redis_client = fakeredis.FakeStrictRedis(decode_responses=True)
+    return True
+
+
+def prepare_tables():
+    random.seed(SEED)
+    db.session.execute("DROP TABLE IF EXISTS bench_user")
+    db.session.execute("DROP TABLE IF EXISTS bench_order")
+    db.session.execute("DROP TABLE IF EXISTS bench_insert")
+    db.session.execute("CREATE TABLE bench_user (id INTEGER PRIMARY KEY, name TEXT, status INT, score NUMERIC, "
+                       "tags TEXT, create_time TIMESTAMP, birth_date DATE)")
+    db.session.execute("CREATE TABLE bench_order (id INTEGER PRIMARY KEY, user_id INT, amount NUMERIC, "
+                       "remark TEXT, create_time TIMESTAMP)")
+    db.session.execute("CREATE INDEX idx_bench_order_user ON bench_order(user_id)")
+    db.session.execute("CREATE TABLE bench_insert (id INTEGER PRIMARY KEY, name TEXT, score INT, "
+                       "create_time TIMESTAMP)")
+    db.session.commit()
+    now = datetime.datetime(2022, 10, 1, 12, 30, 45)
+    DORM("bench_user").bulk_insert(
+        ["id", "name", "status", "score", "tags", "create_time", "birth_date"],
+        ([i, "user_%s" % i, i % 4, "%s.25" % (i % 1000), '["a", "b"]', now, now.date()]
+         for i in range(1, TABLE_ROWS + 1)))
+    DORM("bench_order").bulk_insert(
+        ["id", "user_id", "amount", "remark", "create_time"],
+        ([i, random.randint(1, TABLE_ROWS), "%s.50" % random.randint(1, 999), "order_%s" % i, now]
+         for i in range(1, TABLE_ROWS * 2 + 1)))
+
+
+WHERE_CONDITIONS = {
+    "status__in": [1, 2, 3],
+    "name__like": "user_1",
+    "score__gte": 10,
+    "score__lt": 900,
+    "create_time__lt": datetime.datetime(2030, 1, 1),
+    "remark__ne": "x",
+    "id__notin": [7, 8, 9],
+}
+
+
+@case("dorm.set_where_str", number=5000)
+def bench_set_where_str():
+    DORM("bench_user").query().set_where_str(WHERE_CONDITIONS)
+
+
+@case("dorm.set_where_str_bind", number=5000)
+def bench_set_where_str_bind():
+    DORM("bench_user", use_bind_params=True).query().set_where_str(WHERE_CONDITIONS)
+
+
+@case("dorm.get_sql_join", number=2000)
+def bench_get_sql_join():
+    DORM("bench_user", table_alias="u").query("u.id, u.name").left_join(
+        "bench_order", table_alias="o", join_on="o.user_id = u.id", col_str="o.amount",
+        query_where_condition_dict={"amount__gte": 10}).inner_join(
+        "bench_user", table_alias="u2", join_on="u2.id = u.id").where(
+        status__in=[1, 2], score__gte=10).order_by("u.id DESC").limit(0, 20).get_sql()
+
+
+@case("orm.execute_select_sql_1000_rows", number=20)
+def bench_execute_select_sql():
+    BaseOrm.execute_select_sql("SELECT * FROM bench_user WHERE id <= 1000", json_list_keys=["tags"],
+                               decimal_to_float=True)
+
+
+@case("orm.pagination_sql", number=200)
+def bench_pagination_sql():
+    BaseOrm.pagination_sql("SELECT * FROM bench_user WHERE status = :status ORDER BY id", page=5, limit=50,
+                           attr_dict={"status": 1})
+
+
+@case("orm.pagination_sql_cached_count", number=200, redis=True)
+def bench_pagination_sql_cached_count():
+    BaseOrm.pagination_sql("SELECT * FROM bench_user WHERE status = :status ORDER BY id", page=5, limit=50,
+                           attr_dict={"status": 1}, count_strategy="cached", count_cache_ttl=600)
+
+
+INSERT_VALUES = [[i, "user_%s" % i, i % 100, datetime.datetime(2022, 10, 1, 12, 30, 45)] for i in range(1, 501)]
+
+
+@case("dorm.batch_insert_build_500_rows", number=200)
+def bench_batch_insert_build():
+    DORM("bench_insert").batch_insert(["id", "name", "score", "create_time"], INSERT_VALUES).get_sql()
+
+
+@case("dorm.batch_insert_execute_500_rows", number=50)
+def bench_batch_insert_execute():
+    DORM("bench_insert").batch_insert(["id", "name", "score", "create_time"], INSERT_VALUES).execute()
+    db.session.execute("DELETE FROM bench_insert")
+    db.session.commit()
+
+
+def make_response_data(count):
+    now = datetime.datetime(2022, 10, 1, 12, 30, 45)
+    return {"datalist": [{
+        "id": i,
+        "name": "用户_%s" % i,
+        "score": decimal.Decimal("%s.25" % i),
+        "ratio": i / 3,
+        "tags": ["a", "b"],
+        "create_time": now,
+        "birthday": now.date(),
+    } for i in range(count)], "totalcount": count}
+
+
+RESPONSE = ReturnDict(data=make_response_data(1000))
+
+
+@case("response.to_json_1000_rows", number=50)
+def bench_to_json():
+    RESPONSE.to_json()
+
+
+@case("response.to_json_bytes_1000_rows", number=50)
+def bench_to_json_bytes():
+    RESPONSE.to_json_bytes()
+
+
+LOG_ROWS = [{"id": i, "name": "user_%s" % i, "create_time": "2022-01-01 00:00:00"} for i in range(200)]
+
+
+def setup_sql_log():
+    # 日志写到 /dev/null，只测格式化和输出的开销；同步写，不受后台线程调度影响
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    state = (logger.level, logger.propagate, get_app().config.get("SQL_LOG_ASYNC", True))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    get_app().config["SQL_LOG_ASYNC"] = False
+
+    def restore():
+        logger.removeHandler(handler)
+        handler.stream.close()
+        logger.setLevel(state[0])
+        logger.propagate = state[1]
+        get_app().config["SQL_LOG_ASYNC"] = state[2]
+    return restore
+
+
+@case("orm.log_sql_result", number=2000, setup=setup_sql_log)
+def bench_log_sql_result():
+    t_start = time.time()
+    BaseOrm.log_sql_result("SELECT * FROM bench_user WHERE id IN (1,2,3)", {}, t_start, t_start + 0.002,
+                           t_start + 0.003, None, LOG_ROWS, log_trace_id="bench", database="default")
+
+
+def run_case(func, number, repeat):
+    """
+    预热一轮后运行 repeat 轮，每轮调用 number 次，计时期间关闭 GC
+    :return: 每轮的单次平均耗时(秒)列表
+    """
+    func()
+    rounds = []
+    gc_enabled = gc.isenabled()
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            gc.disable()
+            t_start = time.perf_counter()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter() - t_start) / number)
+            if gc_enabled:
+                gc.enable()
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return rounds
+
+
+def get_git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                                text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def get_environment(fake_redis):
+    return {
+        "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "json_backend": JsonTool.backend,
+        "fake_redis": fake_redis,
+    }
+
+
+def run_suite(repeat=7, quick=False, name_filter=None):
+    fake_redis = use_fake_redis()
+    prepare_tables()
+    results = {}
+    for name, item in CASES.items():
+        if name_filter and name_filter not in name:
+            continue
+        if item["redis"] and not fake_redis:
+            print("%-40s skipped (未安装 fakeredis)" % name)
+            continue
+        number = max(1, item["number"] // 10) if quick else item["number"]
+        restore = item["setup"]() if item["setup"] else None
+        try:
+            random.seed(SEED)
+            rounds = run_case(item["func"], number, repeat)
+        finally:
+            if restore:
+                restore()
+        results[name] = {
+            "number": number,
+            "repeat": repeat,
+            "best": min(rounds),
+            "median": statistics.median(rounds),
+            "mean": statistics.mean(rounds),
+            "stdev": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+        }
+        print("%-40s best %s   median %s   ±%.1f%%" % (
+            name, benchmarks.common.format_seconds(min(rounds)),
+            benchmarks.common.format_seconds(results[name]["median"]),
+            results[name]["stdev"] / results[name]["mean"] * 100 if results[name]["mean"] else 0))
+    return {"environment": get_environment(fake_redis), "results": results}
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, metric="best"):
+    """
+    :return: (对比行列表, 回退的用例名列表)，current 比 baseline 慢超过 threshold(比例)即为回退
+    """
+    rows, regressions = [], []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            rows.append((name, base[metric], None, None, "missing"))
+            continue
+        ratio = cur[metric] / base[metric] if base[metric] else 1.0
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base[metric], cur[metric], ratio, status))
+    for name in current["results"]:
+        if name not in baseline["results"]:
+            rows.append((name, None, current["results"][name][metric], None, "new"))
+    return rows, regressions
+
+
+def print_compare(rows, threshold, metric):
+    print("%-40s %13s %13s %8s  %s (%s, threshold %.0f%%)" % ("case", "baseline", "current", "ratio", "status",
+                                                               metric, threshold * 100))
+    for name, base, cur, ratio, status in rows:
+        print("%-40s %13s %13s %8s  %s" % (
+            name, benchmarks.common.format_seconds(base) if base is not None else "-",
+            benchmarks.common.format_seconds(cur) if cur is not None else "-",
+            "x%.2f" % ratio if ratio is not None else "-", status))
+
+
+def load_result(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ORM/响应层基准套件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="运行基准并保存 JSON 结果")
+    run_parser.add_argument("--output", "-o", default=None, help="结果文件，默认 benchmark-<git commit>.json")
+    run_parser.add_argument("--repeat", type=int, default=7)
+    run_parser.add_argument("--quick", action="store_true", help="每轮调用次数减少到 1/10，用于快速检查")
+    run_parser.add_argument("--filter", dest="name_filter", default=None, help="只运行名称包含该字符串的用例")
+    run_parser.add_argument("--baseline", default=None, help="运行后与该结果对比，回退时退出码为 1")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    run_parser.add_argument("--metric", choices=("best", "median"), default="best")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次结果，回退时退出码为 1")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="允许变慢的比例，默认 0.15 即 15%%")
+    compare_parser.add_argument("--metric", choices=("best", "median"), default="best")
+
+    subparsers.add_parser("list", help="列出用例")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, item in CASES.items():
+            print("%-40s number=%s%s" % (name, item["number"], "  (redis)" if item["redis"] else ""))
+        return 0
+
+    if args.command == "run":
+        current = run_suite(repeat=args.repeat, quick=args.quick, name_filter=args.name_filter)
+        output = args.output or os.path.join(
+            ROOT_DIR, "benchmark-%s.json" % (current["environment"]["git_commit"] or "result"))
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print("结果已保存到 %s" % output)
+        if not args.baseline:
+            return 0
+        baseline = load_result(args.baseline)
+    else:
+        baseline, current = load_result(args.baseline), load_result(args.current)
+
+    rows, regressions = compare_results(baseline, current, threshold=args.threshold, metric=args.metric)
+    print_compare(rows, args.threshold, args.metric)
+    if regressions:
+        print("性能回退：%s" % ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,8 +28,50 @@ ans = load_dotenv(os.path.join(basedir, f".env_dir/{cur_flask_env}"))
 class Config(object):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite://")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 连接池：大小、溢出、等待超时(秒)、回收(秒)、取连接前 ping，启动时每个库预热的连接数
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", 0))
+    # 从库，多个用逗号分隔，SELECT 会轮询分配到从库，事务中的读和写走主库
+    SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if uri.strip()]
+    SQLALCHEMY_BINDS = {f"replica_{index}": uri for index, uri in enumerate(SQLALCHEMY_REPLICA_URIS)}
+    DB_READ_FROM_REPLICA = os.getenv("DB_READ_FROM_REPLICA", "1") == "1"
+    # 从库延迟检查，延迟超过 DB_REPLICA_MAX_LAG 秒切回主库，DB_REPLICA_LAG_SQL 为空时不检查
+    DB_REPLICA_LAG_SQL = os.getenv("DB_REPLICA_LAG_SQL", "SHOW SLAVE STATUS")
+    DB_REPLICA_MAX_LAG = int(os.getenv("DB_REPLICA_MAX_LAG", 5))
+    DB_REPLICA_CHECK_INTERVAL = int(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+    # asyncio/并发查询线程池大小，每个线程占用一个连接池连接，不要超过 pool_size + max_overflow
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 8))
+    # BaseOrm.execute_parallel 的默认总时限(秒)
+    DB_PARALLEL_TIMEOUT = float(os.getenv("DB_PARALLEL_TIMEOUT", 10))
+    # pagination_sql 默认的总数查法 regex/derived/window/explain/cached，cached 的缓存秒数
+    PAGINATION_COUNT_STRATEGY = os.getenv("PAGINATION_COUNT_STRATEGY", "regex")
+    PAGINATION_COUNT_CACHE_TTL = int(os.getenv("PAGINATION_COUNT_CACHE_TTL", 60))
+    # json_response 的序列化后端：auto(安装了 orjson 就用 orjson)/orjson/stdlib
+    JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "auto")
+    # 必须配置，create_app 时检查
     REDIS_URL = os.getenv('REDIS_URL')
-    assert REDIS_URL is not None
+    # DORM 查询结果缓存，关闭时写语句也不会去 Redis 失效
+    DORM_QUERY_CACHE_ENABLED = os.getenv("DORM_QUERY_CACHE_ENABLED", "0") == "1"
+    DORM_QUERY_CACHE_TTL = int(os.getenv("DORM_QUERY_CACHE_TTL", 60))
+    # SQL日志：后台线程写入、队列长度、采样率，慢查询(秒)和异常一定记录
+    SQL_LOG_ASYNC = os.getenv("SQL_LOG_ASYNC", "1") == "1"
+    SQL_LOG_QUEUE_SIZE = int(os.getenv("SQL_LOG_QUEUE_SIZE", 10000))
+    SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", 1.0))
+    SQL_LOG_SLOW_THRESHOLD = float(os.getenv("SQL_LOG_SLOW_THRESHOLD", 0.6))
+    # 慢查询的指纹第一次出现时在后台 EXPLAIN，慢查询日志带上全表扫描/filesort/临时表标记
+    SQL_EXPLAIN_SLOW = os.getenv("SQL_EXPLAIN_SLOW", "0") == "1"
+    # 执行的 SQL 前加 /* trace_id=... */ 注释，便于在数据库侧按请求关联
+    SQL_TRACE_COMMENT = os.getenv("SQL_TRACE_COMMENT", "0") == "1"
+    # SQL指纹耗时统计，backend 为 redis 时多个 worker 汇总到 Redis，local 只统计本进程
+    SQL_METRICS_ENABLED = os.getenv("SQL_METRICS_ENABLED", "1") == "1"
+    SQL_METRICS_BACKEND = os.getenv("SQL_METRICS_BACKEND", "redis")
+    SQL_METRICS_FLUSH_INTERVAL = int(os.getenv("SQL_METRICS_FLUSH_INTERVAL", 5))
+    # Redis 中指纹统计最后一次写入后保留的秒数，长时间不再出现的指纹自动过期，0 为不过期
+    SQL_METRICS_RETENTION = int(os.getenv("SQL_METRICS_RETENTION", 86400))
 
 
 class DevConfig(Config):
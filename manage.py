@@ -1,9 +1,13 @@
+import click
 from flask.cli import FlaskGroup
 
 
-from project import app, db, redis_client
+from project import create_app
+from tools.db_tool.sql_report import SORT_KEYS, SqlReport, open_log, parse_time_arg
+from project.extensions import db, redis_client
 
-cli = FlaskGroup(app)
+# 命令执行时才创建 app，--help 等不需要 app 的命令不做初始化
+cli = FlaskGroup(create_app=create_app)
 
 
 # 在引入create_all 前，需要先把model 引入
@@ -24,5 +28,35 @@ def check_redis():
     print('连接成功')
 
 
+@cli.command("sql-report", with_appcontext=False)
+@click.argument("log_files", nargs=-1)
+@click.option("--since", default=None, help="开始时间(含)，YYYY-MM-DD[ HH:MM[:SS]] 或相对时间 30m/2h/1d")
+@click.option("--until", default=None, help="结束时间(不含)，格式同 --since")
+@click.option("--sort", default="total", type=click.Choice(SORT_KEYS), help="排序字段，默认总耗时")
+@click.option("--top", "limit", default=20, help="输出前N个指纹，0 为全部")
+@click.option("--format", "output_format", default="table", type=click.Choice(["table", "json"]))
+@click.option("--width", default=80, help="table 格式指纹的最大显示宽度，0 为不截断")
+def sql_report(log_files, since, until, sort, limit, output_format, width):
+    """
+    按SQL指纹汇总 SQL 日志：总耗时、次数、p50/p95/p99、行数。
+    逐行读取，内存占用与日志大小无关；不传文件或传 - 时读标准输入，支持 .gz
+    """
+    try:
+        report = SqlReport(since=parse_time_arg(since), until=parse_time_arg(until))
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for path in log_files or ("-",):
+        log_file = open_log(path)
+        try:
+            report.add_lines(log_file)
+        finally:
+            if path != "-":
+                log_file.close()
+    if output_format == "json":
+        click.echo(report.to_json(sort=sort, limit=limit))
+    else:
+        click.echo(report.to_table(sort=sort, limit=limit, width=width))
+
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
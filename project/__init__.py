@@ -1,24 +1,142 @@
-from flask import Flask, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_redis import FlaskRedis
+import asyncio
+import functools
+import threading
+
+from flask import Blueprint, Flask, Response, current_app, has_app_context, jsonify
+from sqlalchemy import event
 from tools.exception import ReturnDict
+from tools.db_tool.pool import build_engine_options
+from tools.trace_context import TRACE_ID_HEADER, add_sql_comment, get_trace_id
+from tools.util import JsonTool
+from project.extensions import db, pool_stats, redis_client
+
+
+bp = Blueprint("project", __name__)
+
+# 没有 app 上下文时(脚本、后台线程)使用的默认 app，第一次用到时才创建
+_default_app = None
+_default_app_lock = threading.Lock()
+
+
+def create_app(config_object="config.CUR_CONFIG", **config_overrides):
+    """
+    创建 Flask app 并绑定 db、redis_client 等扩展
+    :param config_object: 传给 app.config.from_object，可以是类或 import 路径
+    :param config_overrides: 覆盖配置项，例如 create_app(SQLALCHEMY_DATABASE_URI="sqlite://")
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.config.update(config_overrides)
+    if not app.config.get("REDIS_URL"):
+        raise RuntimeError("REDIS_URL 未配置")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = build_engine_options(app.config)
+
+    db.init_app(app)
+    redis_client.init_app(app)
+    JsonTool.set_backend(app.config.get("JSON_SERIALIZER", "auto"))
+    app.register_blueprint(bp)
+    init_pool_stats(app)
+    if app.config.get("SQL_TRACE_COMMENT", False):
+        init_sql_trace_comment(app)
+    return app
+
+
+def get_default_app():
+    """
+    返回默认 app，第一次调用时按 config.CUR_CONFIG 创建，
+    并设为 db 的默认 app，没有 app 上下文时 db.session 也能使用
+    """
+    global _default_app
+    if _default_app is None:
+        with _default_app_lock:
+            if _default_app is None:
+                app = create_app()
+                db.app = app
+                _default_app = app
+    return _default_app
+
+
+def get_app():
+    """
+    当前 app：在 app 上下文中返回 current_app，否则返回默认 app
+    """
+    if has_app_context():
+        return current_app._get_current_object()
+    return get_default_app()
+
 
+def __getattr__(name):
+    # 兼容 from project import app，用到时才创建默认 app
+    if name == "app":
+        return get_default_app()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-app = Flask(__name__)
-app.config.from_object('config.CUR_CONFIG')
 
-db = SQLAlchemy(app)
-redis_client = FlaskRedis(app, decode_responses=True)
-db.select
+def init_pool_stats(app, warm=None):
+    """
+    注册主库和从库的连接池统计，并按 DB_POOL_WARM 预热连接。
+    pre-fork 部署时 fork 前建立的连接在子进程中会被丢弃重建，建议在 worker 的 post_fork 中再调用一次
+    """
+    if warm is None:
+        warm = app.config.get("DB_POOL_WARM", 0)
+    binds = [None] + sorted(app.config.get("SQLALCHEMY_BINDS") or {})
+    for bind in binds:
+        name = bind or "default"
+        pool_stats.register(name, db.get_engine(app, bind=bind))
+        if warm:
+            pool_stats.warm(name, warm)
 
-@app.route("/")
+
+def init_sql_trace_comment(app):
+    """
+    主库和从库执行的 SQL 前都加上 /* trace_id=... */，数据库慢查询日志、processlist 可以和应用的 SQL 日志对应
+    """
+    for bind in [None] + sorted(app.config.get("SQLALCHEMY_BINDS") or {}):
+        engine = db.get_engine(app, bind=bind)
+        if not event.contains(engine, "before_cursor_execute", add_sql_comment):
+            event.listen(engine, "before_cursor_execute", add_sql_comment, retval=True)
+
+
+@bp.after_app_request
+def add_trace_id_header(response):
+    # 响应头带上本次请求的 trace id，客户端报错时据此查 SQL 日志
+    response.headers.setdefault(TRACE_ID_HEADER, get_trace_id())
+    return response
+
+
+@bp.route("/")
 def hello_world():
     return jsonify(hello="world")
 
 
-def json_response(code=ReturnDict.CODE_SUCCESS, msg='success', data={}):
-    return ReturnDict(code=code, msg=msg, data=data).to_json()
+@bp.route("/metrics/sql")
+def sql_metrics():
+    # Prometheus 文本格式的SQL指纹耗时统计
+    from tools.db_tool.orm_base import BaseOrm
+    return Response(BaseOrm.sql_metrics.to_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/metrics/pool")
+def pool_metrics():
+    # 连接池实时状态：占用/空闲/溢出连接数、取连接等待耗时直方图、失败次数
+    return json_response(data=pool_stats.snapshot())
+
+
+def json_response(code=ReturnDict.CODE_SUCCESS, msg='success', data={}, status=200):
+    # 直接返回 bytes 的 Response，安装了 orjson 时用 orjson 序列化
+    return ReturnDict(code=code, msg=msg, data=data).to_response(status=status)
 
 
 def dict_response(code=ReturnDict.CODE_SUCCESS, msg='success', data={}):
-    return ReturnDict(code=code, msg=msg, data=data).to_dict()
\ No newline at end of file
+    return ReturnDict(code=code, msg=msg, data=data).to_dict()
+
+
+def async_view(func):
+    """
+    在同步 WSGI worker 中运行 async def 视图(未安装 flask[async] 时 Flask 不能直接注册 async 视图)，
+    视图内可以 await DORM.aexecute，并用 asyncio.gather 并发执行互不依赖的查询
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(func(*args, **kwargs))
+    return wrapper
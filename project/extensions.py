@@ -0,0 +1,9 @@
+from flask_sqlalchemy import SQLAlchemy
+from flask_redis import FlaskRedis
+
+from tools.db_tool.pool import PoolStats
+
+# 扩展对象在 import 时不绑定 app，由 create_app 调用 init_app 绑定
+db = SQLAlchemy()
+redis_client = FlaskRedis(decode_responses=True)
+pool_stats = PoolStats()
@@ -0,0 +1,97 @@
+import datetime
+import decimal
+
+from tools.db_tool.row_converter import build_converter_plan, convert_json_dict, convert_json_list, \
+    get_sample_value
+
+# numpy 是可选依赖且 import 较慢，第一次按列取数时才导入；None 表示还没有导入，False 表示没有安装
+numpy = None
+
+
+def load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as numpy_module
+            numpy = numpy_module
+        except ImportError:  # 没有安装时按列返回 list
+            numpy = False
+    return numpy or None
+
+
+def get_column_dtype(sample):
+    """
+    按列的第一个非空值选择 numpy dtype，不认识的类型返回 None(object 数组)
+    """
+    # bool 是 int 的子类，要先判断；datetime 是 date 的子类，同理
+    if isinstance(sample, bool):
+        return "bool"
+    if isinstance(sample, int):
+        return "int64"
+    if isinstance(sample, (float, decimal.Decimal)):
+        return "float64"
+    if isinstance(sample, datetime.datetime):
+        return "datetime64[us]"
+    if isinstance(sample, datetime.date):
+        return "datetime64[D]"
+    return None
+
+
+def build_column(values, dtype):
+    """
+    :param values: 该列的 object 数组
+    """
+    mask = numpy.equal(values, None)
+    has_null = bool(mask.any())
+    array = values
+    if dtype is not None:
+        try:
+            if has_null and not dtype.startswith("datetime64"):
+                # 数值列的 NULL 先填 0 再转换，datetime64 的 None 会转成 NaT
+                values = values.copy()
+                values[mask] = 0
+            # decimal 转为 float64，需要精确值时用 use_numpy=False
+            array = values.astype(dtype)
+        except (TypeError, ValueError, OverflowError):
+            # 列中混有其他类型(如 int 列里出现超过 int64 的值)，保留 object 数组
+            array = values
+    if has_null:
+        return numpy.ma.MaskedArray(array, mask=mask)
+    return array
+
+
+def convert_columns(col_names, rows, use_numpy=True, json_list_keys=None, json_dict_keys=None,
+                    decimal_to_float=False):
+    """
+    把数据库返回的行转为按列存放：{列名: 该列的全部值}
+    先按 row_converter 的转换计划处理 json 列和 decimal_to_float，与 return_type=list 相同；
+    datetime/date 不格式化为字符串，便于向量化计算时间，1970-01-02 默认时间与 NULL 一样视为空值。再按列建数组：
+    安装了 numpy 时数值/decimal 列为 int64/float64 数组，datetime/date 列为 datetime64[us]/datetime64[D] 数组，
+    其他为 object 数组，有 NULL 的列返回 numpy.ma.MaskedArray，NULL 位置 mask 为 True(datetime64 的值为 NaT)；
+    没有安装 numpy 或 use_numpy=False 时每列是 list，NULL 保持为 None
+    """
+    plan = build_converter_plan(col_names, rows, json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
+                                decimal_to_float=decimal_to_float, keep_datetime=True)
+    if not use_numpy or load_numpy() is None:
+        if not rows:
+            return {colname: [] for colname in col_names}
+        columns = [list(column) for column in zip(*rows)]
+        for _, index, converter in plan:
+            columns[index] = list(map(converter, columns[index]))
+        return dict(zip(col_names, columns))
+
+    table = numpy.empty((len(rows), len(col_names)), dtype=object)
+    if rows:
+        table[:] = rows
+    for _, index, converter in plan:
+        values = list(map(converter, table[:, index]))
+        if converter is convert_json_list or converter is convert_json_dict:
+            # 值是 list/dict，切片赋值会被 numpy 当作多维数据展开，逐个赋值
+            for row_index, value in enumerate(values):
+                table[row_index, index] = value
+        else:
+            table[:, index] = values
+    result = {}
+    for index, colname in enumerate(col_names):
+        result[colname] = build_column(table[:, index], get_column_dtype(get_sample_value(table, index)))
+    return result
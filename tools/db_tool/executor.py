@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context, has_request_context, request
+
+from tools.trace_context import TraceContext, get_trace_id
+
+
+class QueryExecutor(object):
+    """
+    数据库查询线程池：把阻塞的 PyMySQL 调用放到有界线程池中执行。
+    db.session 按线程隔离，每个任务在自己的请求/应用上下文中运行，拿到独立的连接池连接，上下文结束时随 session 一起归还。
+    按进程创建线程池，pre-fork 的 worker 在子进程第一次提交任务时重新创建。
+    """
+
+    def __init__(self, app_getter, max_workers=None):
+        """
+        :param app_getter: 返回当前 app 的函数，提交任务时没有 app 上下文才使用
+        :param max_workers: 默认在创建线程池时读取配置 DB_EXECUTOR_WORKERS
+        """
+        self.app_getter = app_getter
+        self.max_workers = max_workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+
+    def get_max_workers(self):
+        if self.max_workers is None:
+            self.max_workers = self.app_getter().config.get("DB_EXECUTOR_WORKERS", 8)
+        return self.max_workers
+
+    def get_pool(self):
+        if self._pid != os.getpid() or self._pool is None:
+            with self._lock:
+                if self._pid != os.getpid() or self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.get_max_workers(), thread_name_prefix="dorm-query")
+                    self._pid = os.getpid()
+        return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        """
+        :return: concurrent.futures.Future
+        """
+        # 请求上下文和 trace id 要在提交线程里取，任务里的日志才能拿到同一个 trace id
+        app = current_app._get_current_object() if has_app_context() else self.app_getter()
+        context = request._get_current_object().environ if has_request_context() else None
+        trace_id = get_trace_id()
+        pool = self.get_pool()
+        self.submitted += 1
+        return pool.submit(self.run, app, context, trace_id, func, args, kwargs)
+
+    def run(self, app, environ, trace_id, func, args, kwargs):
+        context = app.request_context(environ) if environ is not None else app.app_context()
+        with context, TraceContext(trace_id):
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                self.failed += 1
+                raise
+
+    async def run_async(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "queued": self._pool._work_queue.qsize() if self._pool is not None else 0,
+            "submitted": self.submitted,
+            "failed": self.failed,
+        }
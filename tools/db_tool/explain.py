@@ -0,0 +1,216 @@
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+
+from sqlalchemy import text
+
+from tools.db_tool.sql_fingerprint import fingerprint_id, fingerprint_sql
+from tools.util import JsonTool
+
+logger = logging.getLogger(__name__)
+
+# 各数据库查看执行计划的前缀
+EXPLAIN_PREFIXES = {
+    "mysql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+
+def get_explain_prefix(dialect_name):
+    prefix = EXPLAIN_PREFIXES.get(dialect_name)
+    if prefix is None:
+        raise ValueError("不支持 %s 的执行计划" % dialect_name)
+    return prefix
+
+
+def parse_plan(dialect_name, rows):
+    """
+    解析 EXPLAIN 的结果，标出需要关注的问题
+    :param rows: EXPLAIN 返回的 dict 列表
+    :return: {"rows": 原始的执行计划, "full_scan": 全表扫描的表, "full_index_scan": 全索引扫描的表,
+              "filesort": 是否文件排序, "temporary": 是否用临时表, "estimated_rows": 估算扫描行数(MySQL),
+              "flags": 问题列表}
+    """
+    full_scan, full_index_scan = [], []
+    filesort, temporary = False, False
+    estimated_rows = None
+    if dialect_name == "mysql":
+        # 传统格式：每个表一行，type=ALL 为全表扫描，index 为全索引扫描，Extra 里有 filesort/temporary
+        for row in rows:
+            scan_type = (row.get("type") or "").upper()
+            table = row.get("table")
+            if scan_type == "ALL":
+                full_scan.append(table)
+            elif scan_type == "INDEX":
+                full_index_scan.append(table)
+            extra = row.get("Extra") or ""
+            filesort = filesort or "Using filesort" in extra
+            temporary = temporary or "Using temporary" in extra
+            if row.get("rows") is not None:
+                estimated_rows = (estimated_rows or 0) + int(row["rows"])
+    elif dialect_name == "sqlite":
+        # EXPLAIN QUERY PLAN 的 detail：SCAN t 为全表扫描，SCAN t USING (COVERING) INDEX 为全索引扫描，
+        # USE TEMP B-TREE FOR ORDER BY 相当于 filesort，FOR GROUP BY/DISTINCT 相当于临时表
+        for row in rows:
+            detail = row.get("detail") or ""
+            if detail.startswith("SCAN "):
+                # 3.36 之前是 SCAN TABLE t
+                parts = detail.split(" ")
+                table = parts[2] if parts[1] == "TABLE" and len(parts) > 2 else parts[1]
+                if " INDEX " in detail + " ":
+                    full_index_scan.append(table)
+                else:
+                    full_scan.append(table)
+            elif detail.startswith("USE TEMP B-TREE FOR"):
+                if "ORDER BY" in detail:
+                    filesort = True
+                else:
+                    temporary = True
+    else:
+        raise ValueError("不支持 %s 的执行计划" % dialect_name)
+
+    flags = []
+    if full_scan:
+        flags.append("full_scan")
+    if full_index_scan:
+        flags.append("full_index_scan")
+    if filesort:
+        flags.append("filesort")
+    if temporary:
+        flags.append("temporary")
+    return {
+        "rows": rows,
+        "full_scan": full_scan,
+        "full_index_scan": full_index_scan,
+        "filesort": filesort,
+        "temporary": temporary,
+        "estimated_rows": estimated_rows,
+        "flags": flags,
+    }
+
+
+def explain_on_engine(engine, sql_str, attr_dict=None):
+    """
+    在 engine 的独立连接上查看执行计划，不经过 session，也不写 SQL 日志
+    """
+    dialect_name = engine.dialect.name
+    with engine.connect() as connection:
+        cursor_result = connection.execute(text(get_explain_prefix(dialect_name) + sql_str), attr_dict or {})
+        col_names = list(cursor_result.keys())
+        rows = [dict(zip(col_names, row)) for row in cursor_result.fetchall()]
+    return parse_plan(dialect_name, rows)
+
+
+class PlanCapture(object):
+    """
+    慢查询执行计划采集：同一个SQL指纹第一次超过慢查询阈值时，在后台线程对该库执行一次 EXPLAIN，
+    解析后记录日志并缓存，之后同指纹的慢查询日志直接带上计划的问题标记(全表扫描、filesort、临时表)。
+    只采集 SELECT，按进程启动后台线程，队列满时丢弃。
+    """
+
+    def __init__(self, engine_getter, max_size=1000, max_plans=2000):
+        """
+        :param engine_getter: (app, 库名) -> engine
+        :param max_plans: 最多缓存的指纹数，超过后丢弃最早的
+        """
+        self.engine_getter = engine_getter
+        self.max_size = max_size
+        self.max_plans = max_plans
+        self.plans = collections.OrderedDict()
+        self._scheduled = set()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._scheduled = set()
+            self._thread = threading.Thread(target=self.run, name="sql-plan-capture", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def get_or_schedule(self, app, sql_str, attr_dict, database, elapsed, trace_id=None):
+        """
+        :return: 已采集的执行计划摘要 {"fingerprint_id", "flags", "full_scan", ...}，还没有时提交后台采集并返回 None
+        """
+        if not sql_str.lstrip()[:6].upper() == "SELECT":
+            return None
+        fp_id = fingerprint_id(fingerprint_sql(sql_str))
+        plan = self.plans.get(fp_id)
+        if plan is not None:
+            return self.summary(plan)
+        self.ensure_started()
+        with self._lock:
+            if fp_id in self._scheduled:
+                return None
+            self._scheduled.add(fp_id)
+        try:
+            self._queue.put_nowait((app, fp_id, sql_str, dict(attr_dict or {}), database, elapsed, trace_id))
+        except queue.Full:
+            self.dropped += 1
+            with self._lock:
+                self._scheduled.discard(fp_id)
+        return None
+
+    @staticmethod
+    def summary(plan):
+        return {key: plan[key] for key in ("fingerprint_id", "flags", "full_scan", "full_index_scan",
+                                           "estimated_rows")}
+
+    def run(self):
+        capture_queue = self._queue
+        while True:
+            args = capture_queue.get()
+            try:
+                self.capture(*args)
+            except Exception:
+                self.failed += 1
+                logger.warning("慢查询执行计划采集失败：%s" % traceback.format_exc())
+            finally:
+                capture_queue.task_done()
+
+    def capture(self, app, fp_id, sql_str, attr_dict, database, elapsed, trace_id):
+        engine = self.engine_getter(app, database)
+        plan = explain_on_engine(engine, sql_str, attr_dict)
+        plan.update({
+            "fingerprint_id": fp_id,
+            "fingerprint": fingerprint_sql(sql_str),
+            "sql_str": sql_str,
+            "database": database,
+            "sql_elapsed_time_ms": elapsed * 1000,
+            "trace_id": trace_id,
+            "captured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        with self._lock:
+            self.plans[fp_id] = plan
+            while len(self.plans) > self.max_plans:
+                # 被丢弃的指纹再次变慢时重新采集
+                self._scheduled.discard(self.plans.popitem(last=False)[0])
+        self.captured += 1
+        logger.warning("慢查询执行计划%s：%s" % (plan["flags"] or "", JsonTool.to_json(plan)))
+
+    def flush(self):
+        # 等待队列中的采集全部完成，测试使用
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "plans": len(self.plans),
+            "captured": self.captured,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
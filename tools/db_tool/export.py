@@ -0,0 +1,116 @@
+import csv
+import io
+import logging
+import traceback
+
+from flask import Response, stream_with_context
+
+from tools.exception import StandardError
+from tools.util import JsonTool
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+def iter_export_rows(query, attr_dict=None, chunk_size=1000):
+    """
+    :param query: DORM 查询对象或 SELECT 语句
+    :return: 逐行的 dict 生成器，底层是按 chunk_size 分批读取的服务端游标
+    """
+    from tools.db_tool.orm_base import BaseOrm
+
+    if isinstance(query, str):
+        return BaseOrm.execute_select_sql(query, attr_dict, return_type="stream", chunk_size=chunk_size)
+    kwargs = {"attr_dict": attr_dict} if attr_dict else {}
+    return query.execute(fetch="iter", obj_type="dict", chunk_size=chunk_size, **kwargs)
+
+
+def iter_export_bytes(rows, fmt="ndjson", flush_bytes=64 * 1024):
+    """
+    把行逐条编码后按 flush_bytes 合并成块输出；第一行编码后立即输出，尽快返回首字节。
+    WSGI 服务器写完一块才会取下一块，数据库游标也随之按需读取，不会在内存中堆积
+    """
+    if fmt not in EXPORT_MIMETYPES:
+        raise StandardError("不支持的导出格式[%s]，只能是 ndjson/csv/json" % fmt)
+    if fmt == "csv":
+        yield from iter_csv_bytes(rows, flush_bytes=flush_bytes)
+        return
+    if fmt == "ndjson":
+        encode = lambda row: JsonTool.dumps(row) + b"\n"
+    else:
+        encode = JsonTool.dumps
+
+    buffer = []
+    buffer_size = 0
+    first = True
+    if fmt == "json":
+        buffer.append(b"[")
+    for row in rows:
+        data = encode(row)
+        if fmt == "json" and not first:
+            data = b"," + data
+        buffer.append(data)
+        buffer_size += len(data)
+        if first or buffer_size >= flush_bytes:
+            yield b"".join(buffer)
+            buffer = []
+            buffer_size = 0
+            first = False
+    if fmt == "json":
+        buffer.append(b"]")
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_csv_bytes(rows, flush_bytes=64 * 1024):
+    # csv.writer 只能写文本流，攒够一块后取出内容再清空，内存里只保留一块
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    first = True
+    for row in rows:
+        if first:
+            writer.writerow(row.keys())
+        writer.writerow(row.values())
+        if first or buffer.tell() >= flush_bytes:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            first = False
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_response(query, fmt="ndjson", filename=None, attr_dict=None, chunk_size=1000, flush_bytes=64 * 1024):
+    """
+    流式导出：分批读取 DORM 查询或 SQL 的结果，边编码边返回分块的 Response，内存占用与结果行数无关
+    :param query: DORM 查询对象或 SELECT 语句
+    :param fmt: ndjson/csv/json(JSON 数组)
+    :param filename: 传入时以附件形式下载
+    :param chunk_size: 每次从游标读取的行数
+    :param flush_bytes: 每次输出给客户端的字节数
+    """
+    if fmt not in EXPORT_MIMETYPES:
+        raise StandardError("不支持的导出格式[%s]，只能是 ndjson/csv/json" % fmt)
+
+    def generate():
+        rows = iter_export_rows(query, attr_dict=attr_dict, chunk_size=chunk_size)
+        try:
+            yield from iter_export_bytes(rows, fmt=fmt, flush_bytes=flush_bytes)
+        except Exception:
+            # 响应头已经发出，无法再返回错误码，只能记录日志并中断
+            logger.error("export_response failed: %s" % traceback.format_exc())
+            raise
+        finally:
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = 'attachment; filename="%s"' % filename
+    return Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
@@ -0,0 +1,133 @@
+from flask import g, has_app_context
+
+from tools.exception import StandardError
+
+
+class LoaderResult(object):
+    """
+    BatchLoader.load 返回的延迟结果，第一次取值时把同一个 loader 上所有待查的 key 一次查出来。
+    可以直接当结果用：属性和下标访问都会转发到查出来的对象上。
+    """
+    __slots__ = ("_loader", "_key")
+
+    def __init__(self, loader, key):
+        self._loader = loader
+        self._key = key
+
+    def result(self):
+        return self._loader.get(self._key)
+
+    def __getattr__(self, name):
+        return getattr(self.result(), name)
+
+    def __getitem__(self, item):
+        return self.result()[item]
+
+    def __bool__(self):
+        return bool(self.result())
+
+    def __repr__(self):
+        return repr(self.result())
+
+
+class BatchLoader(object):
+    """
+    请求内批量加载，消除循环里逐个 DORM(table).query().where(id=x).execute(fetch="one") 的 N+1 查询。
+    load 只登记 key，真正取值(或调用 get/load_many/dispatch)时用分块的 IN 查询一次查出所有待查的 key，
+    结果在本次请求内缓存，同一个 key 不会重复查询。
+    :param key: 按哪一列查，默认主键 id，也可以是任意列
+    :param many: 该列不唯一时传 True，每个 key 返回列表
+    :param obj_type: orm 返回 DORM 对象，dict 返回字典
+    """
+
+    def __init__(self, table_name, key="id", many=False, obj_type="orm", chunk_size=500, **execute_kwargs):
+        if obj_type not in ("orm", "dict"):
+            raise StandardError("错误的 obj_type，只能是 orm/dict。")
+        self.table_name = table_name
+        self.key = key
+        self.many = many
+        self.obj_type = obj_type
+        self.chunk_size = chunk_size
+        self.execute_kwargs = execute_kwargs
+        self._cache = {}
+        self._pending = []
+        self._pending_set = set()
+        self.query_count = 0
+
+    def load(self, key_value):
+        if key_value not in self._cache and key_value not in self._pending_set:
+            self._pending.append(key_value)
+            self._pending_set.add(key_value)
+        return LoaderResult(self, key_value)
+
+    def get(self, key_value):
+        """
+        立即取值，会把所有待查的 key 一起查出来；查不到时 many=False 返回 None，many=True 返回空列表
+        """
+        if key_value not in self._cache:
+            self.load(key_value)
+            self.dispatch()
+        return self._cache[key_value]
+
+    def load_many(self, key_values):
+        """
+        :return: 与 key_values 顺序一致的结果列表
+        """
+        for key_value in key_values:
+            self.load(key_value)
+        self.dispatch()
+        return [self._cache[key_value] for key_value in key_values]
+
+    def prime(self, key_value, value):
+        self._cache[key_value] = value
+
+    def clear(self, key_value=None):
+        if key_value is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key_value, None)
+
+    def dispatch(self):
+        from tools.db_tool.orm import DORM
+
+        pending, self._pending, self._pending_set = self._pending, [], set()
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = [key_value for key_value in pending[start:start + self.chunk_size] if key_value is not None]
+            if not chunk:
+                continue
+            rows = DORM(self.table_name, use_bind_params=True).query().where(**{f"{self.key}__in": chunk}) \
+                .execute(obj_type=self.obj_type, **self.execute_kwargs)
+            self.query_count += 1
+            for row in rows:
+                row_key = row.get(self.key) if self.obj_type == "dict" else getattr(row, self.key, None)
+                if self.many:
+                    self._cache.setdefault(row_key, []).append(row)
+                else:
+                    self._cache[row_key] = row
+        for key_value in pending:
+            if key_value not in self._cache:
+                self._cache[key_value] = [] if self.many else None
+
+    @staticmethod
+    def get_request_loader(table_name, key="id", many=False, obj_type="orm", **kwargs):
+        """
+        获取当前请求(应用上下文)内共享的 loader，没有应用上下文时每次返回新的 loader
+        """
+        if not has_app_context():
+            return BatchLoader(table_name, key=key, many=many, obj_type=obj_type, **kwargs)
+        loaders = g.setdefault("_dorm_batch_loaders", {})
+        loader_key = (table_name, key, many, obj_type)
+        loader = loaders.get(loader_key)
+        if loader is None:
+            loader = loaders[loader_key] = BatchLoader(table_name, key=key, many=many, obj_type=obj_type, **kwargs)
+        return loader
+
+    @staticmethod
+    def clear_table(table_name):
+        # 请求内写了某张表后，丢弃该表的缓存结果
+        if not table_name or not has_app_context():
+            return
+        table_name = table_name.strip("`").lower()
+        for loader in g.get("_dorm_batch_loaders", {}).values():
+            if loader.table_name.lower() == table_name:
+                loader.clear()
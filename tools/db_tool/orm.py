@@ -1,20 +1,30 @@
 import datetime
 import decimal
 
+from tools.db_tool.export import export_response
+from tools.db_tool.loader import BatchLoader
 from tools.db_tool.orm_base import BaseOrm
+from tools.db_tool.query_cache import QueryCache
+from tools.db_tool.row_types import COMPACT_OBJ_TYPES, RowTypeFactory
+from tools.db_tool.sql_cache import SqlSkeletonCache, in_arity_bucket
 from tools.util import JsonTool
 from tools.exception import StandardError
 from tools.util import get_sub_string
 
 
 class DORM(BaseOrm):
+    # 绑定参数模式下，按查询形状缓存的 SQL 骨架
+    skeleton_cache = SqlSkeletonCache()
+    # obj_type 为 row/namedtuple 时按查询列生成的行类
+    row_types = RowTypeFactory()
 
     # 构造函数 初始化方法
     def __init__(self, table_name, table_alias="", logger_errors=True, fields=None,
                  values=None, start_transaction=False, force_execute=False,
-                 **kwargs):
+                 use_bind_params=False, **kwargs):
         # table_name 表名
         # id 表示主键
+        # use_bind_params 为True时，where/insert/update 生成 :p0 这样的绑定参数，值通过 attr_dict 传给数据库
         self.table_name = table_name
         self.table_alias = table_alias
         self.logger_errors = logger_errors
@@ -24,6 +34,7 @@ class DORM(BaseOrm):
         self.fields = fields
         self.values = values
         self.start_transaction = start_transaction
+        self.use_bind_params = use_bind_params
 
     def __repr__(self):
         return JsonTool.to_json(self.get_attrs(whether_jsonable=True))
@@ -58,14 +69,26 @@ class DORM(BaseOrm):
             "limit": "",
             "lock": "",
             "join_list": [],
+            "params": {},
         }
 
+    @property
+    def sql_params(self):
+        # 绑定参数模式下已生成的参数，可以传给 BaseOrm.get_condition(bind_params=...) 继续编号
+        return self._sql_info["params"]
+
+    def add_bind_param(self, value):
+        params = self._sql_info["params"]
+        name = "p%s" % len(params)
+        params[name] = value
+        return ":%s" % name
+
     def validate_saveable(self):
         pass
 
     def except_attr_list(self):
         return ["table_name", "table_alias", "_sql_info", "logger_errors", "fields", "values", "start_transaction",
-                'force_execute']
+                'force_execute', 'use_bind_params']
 
     def clear_attrs(self):
         dict_keys = list(self.__dict__.keys())
@@ -89,6 +112,9 @@ class DORM(BaseOrm):
         wherestr = ""
         if not condition_dict:
             return wherestr
+        if self.use_bind_params:
+            return self.set_where_str_bind(condition_dict, table_alias=table_alias, specify_table=specify_table,
+                                           condition_tag=condition_tag)
         for col, value in condition_dict.items():
             collist = DORM.escape_string_for_sql(col).split("__")
             col = collist[0]
@@ -203,17 +229,178 @@ class DORM(BaseOrm):
         if condition_tag == "OR":
             # 如果是OR的时候，需要加外括号
             wherestr = f"({wherestr})"
+        self.append_where_str(wherestr)
+        return wherestr
+
+    def append_where_str(self, wherestr):
         if not self._sql_info["where"]:
             self._sql_info["where"] = wherestr if wherestr == "" else "WHERE %s" % wherestr
         else:
             # 说明已经有where了，补充条件
             self._sql_info["where"] += f" AND {wherestr}" if wherestr else ""
+
+    # 绑定参数模式下，where 条件后缀对应的判断符号
+    WHERE_SUFFIX_MAP = {
+        "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "ne": "!=",
+        "in": "IN", "notin": "NOT IN",
+        "contains": "LIKE", "like": "LIKE", "notlike": "NOT LIKE", "rlike": "RLIKE", "llike": "LLIKE",
+    }
+
+    @staticmethod
+    def get_bind_value_kind(value):
+        if isinstance(value, int) or isinstance(value, float):
+            return "num"
+        elif isinstance(value, str):
+            return "str"
+        elif isinstance(value, datetime.datetime):
+            return "datetime"
+        elif isinstance(value, datetime.date):
+            return "date"
+        elif isinstance(value, list):
+            return "list"
+        elif isinstance(value, dict):
+            return "dict"
+        elif value is None:
+            return "none"
+        raise ValueError("不支持的值类型(%s)" % type(value))
+
+    def set_where_str_bind(self, condition_dict, table_alias="", specify_table=False, condition_tag="AND"):
+        """
+        set_where_str 的绑定参数版本，条件值不再拼进SQL，而是生成 :p0、:p1 … 放到 self._sql_info["params"]。
+        SQL 骨架按 (表、列、判断符、值类型、IN列表长度分桶、参数起始编号) 缓存，形状相同的查询不再拼接字符串。
+        """
+        except_attrs = set(self.except_attr_list())
+        items = []
+        shape = []
+        for col, value in condition_dict.items():
+            # 形状里放原始列名，转义只在生成骨架时做一次
+            if col.split("__")[0] in except_attrs:
+                continue
+            kind = DORM.get_bind_value_kind(value)
+            if kind == "list" and col.rsplit("__", 1)[-1] in ("in", "notin") and "__" in col:
+                # 与 set_where_str 一致，IN 列表只保留数字、字符串和 None；其他判断符的列表按 JSON 整体绑定
+                value = [v for v in value if v is None or isinstance(v, (int, float, str))]
+                shape.append((col, kind, in_arity_bucket(len(value))))
+            else:
+                shape.append((col, kind))
+            items.append(value)
+        if not items:
+            return ""
+
+        params = self._sql_info["params"]
+        cache_key = ("WHERE", self.__class__, self.table_name, table_alias, specify_table, condition_tag,
+                     len(params), tuple(shape))
+        skeleton = DORM.skeleton_cache.get(cache_key)
+        if skeleton is None:
+            skeleton = self.build_where_skeleton(shape, len(params), table_alias, specify_table, condition_tag)
+            DORM.skeleton_cache.set(cache_key, skeleton)
+
+        wherestr, value_plan = skeleton
+        index = len(params)
+        for value, (transform, arity) in zip(items, value_plan):
+            if transform is None:
+                continue
+            if transform == "in":
+                if not value:
+                    raise ValueError("IN查询的列表不能为空！")
+                # 按分桶长度补齐，重复最后一个值不影响IN的结果
+                value = value + [value[-1]] * (arity - len(value))
+                for tmpvalue in value:
+                    params["p%s" % index] = tmpvalue
+                    index += 1
+            else:
+                params["p%s" % index] = transform(value)
+                index += 1
+
+        self.append_where_str(wherestr)
         return wherestr
 
+    def build_where_skeleton(self, shape, start_index, table_alias, specify_table, condition_tag):
+        condition_in_list = ["IN", "NOT IN"]
+        condition_like_list = ["LIKE", "NOT LIKE", "RLIKE", "LLIKE"]
+        wherestr = ""
+        value_plan = []
+        index = start_index
+        for shape_item in shape:
+            col_key, kind = DORM.escape_string_for_sql(shape_item[0]), shape_item[1]
+            collist = col_key.split("__")
+            col = collist[0]
+            judge_value = "="
+            if len(collist) >= 2 and collist[-1] in DORM.WHERE_SUFFIX_MAP:
+                col = "__".join(collist[:-1])
+                judge_value = DORM.WHERE_SUFFIX_MAP[collist[-1]]
+            if not specify_table:
+                col = f"`{self.table_name}`.`{col}`" if not table_alias else f"`{table_alias}`.`{col}`"
+
+            if kind == "none":
+                if judge_value in condition_in_list or judge_value in condition_like_list:
+                    raise ValueError("值为int类型的条件不可进行IN或者LIKE查询！")
+                wherestr += f"{col} {judge_value} NULL {condition_tag} "
+                value_plan.append((None, 0))
+                continue
+
+            if kind == "list" and judge_value in condition_in_list:
+                arity = shape_item[2]
+                placeholders = ",".join(":p%s" % i for i in range(index, index + arity))
+                index += arity
+                wherestr += f"{col} {judge_value} ({placeholders}) {condition_tag} "
+                value_plan.append(("in", arity))
+                continue
+
+            if kind in ("num", "datetime", "date") and \
+                    (judge_value in condition_in_list or judge_value in condition_like_list):
+                raise ValueError("值为%s类型的条件不可进行IN或者LIKE查询！" % ("int" if kind == "num" else kind))
+            if kind in ("str", "dict") and judge_value in condition_in_list:
+                raise ValueError(f"值为{kind}类型的条件不可进行IN查询！")
+
+            placeholder = ":p%s" % index
+            index += 1
+            if kind == "str":
+                to_value = DORM.escape_like_value if judge_value in condition_like_list else DORM.identity_value
+            elif kind in ("list", "dict"):
+                to_value = JsonTool.to_json
+            else:
+                to_value = DORM.normalize_bind_value
+
+            if judge_value in ["LIKE", "NOT LIKE"]:
+                wherestr += f"{col} {judge_value} {placeholder} {condition_tag} "
+                transform = DORM.wrap_like(to_value, "%", "%")
+            elif judge_value == "RLIKE":
+                wherestr += f"{col} LIKE {placeholder} {condition_tag} "
+                transform = DORM.wrap_like(to_value, "", "%")
+            elif judge_value == "LLIKE":
+                wherestr += f"{col} LIKE {placeholder} {condition_tag} "
+                transform = DORM.wrap_like(to_value, "%", "")
+            else:
+                wherestr += f"{col} {judge_value} {placeholder} {condition_tag} "
+                transform = to_value
+            value_plan.append((transform, 1))
+
+        wherestr = wherestr.strip()[:-1 * len(condition_tag)] if wherestr else ""
+        if condition_tag == "OR":
+            wherestr = f"({wherestr})"
+        return wherestr, value_plan
+
+    @staticmethod
+    def identity_value(value):
+        return value
+
+    @staticmethod
+    def escape_like_value(value):
+        return value.replace("%", "\\%")
+
+    @staticmethod
+    def wrap_like(to_value, prefix, suffix):
+        def transform(value):
+            return f"{prefix}{to_value(value)}{suffix}"
+        return transform
+
     def get_update_str(self, update_dict):
         # 进入where更新
         if not isinstance(update_dict, dict):
             raise ValueError("执行条件更新时update_dict必须是字典！")
+        if self.use_bind_params:
+            return self.get_update_str_bind(update_dict)
         udpatestr = ""
         for col, value in update_dict.items():
             col = DORM.escape_string_for_sql(col)
@@ -240,6 +427,27 @@ class DORM(BaseOrm):
         udpatestr = udpatestr.strip(",")
         return udpatestr
 
+    def get_update_str_bind(self, update_dict):
+        # None 值与字面量模式一样不更新
+        except_attrs = self.except_attr_list()
+        cols, values = [], []
+        for col, value in update_dict.items():
+            col = DORM.escape_string_for_sql(col)
+            if col in except_attrs or value is None:
+                continue
+            cols.append(col)
+            values.append(DORM.normalize_bind_value(value))
+
+        params = self._sql_info["params"]
+        cache_key = ("UPDATE", tuple(cols), len(params))
+        udpatestr = DORM.skeleton_cache.get(cache_key)
+        if udpatestr is None:
+            udpatestr = ",".join("`%s`=:p%s" % (col, len(params) + i) for i, col in enumerate(cols))
+            DORM.skeleton_cache.set(cache_key, udpatestr)
+        for value in values:
+            params["p%s" % len(params)] = value
+        return udpatestr
+
     def sync_attr_to_self(self, other_orm_model):
         for k, v in other_orm_model.__dict__.items():
             setattr(self, k, v)
@@ -328,6 +536,8 @@ class DORM(BaseOrm):
         self.validate_saveable()
         clostr, valuestr = "", ""
         self.__dict__.update(insert_attrs)
+        if self.use_bind_params:
+            return self.insert_bind()
         for col, value in self.__dict__.items():
             if col in self.except_attr_list():
                 continue
@@ -356,6 +566,27 @@ class DORM(BaseOrm):
         self._sql_info["do"] = f"INSERT INTO {self.table_name}({clostr}) VALUES ({valuestr})"
         return self
 
+    def insert_bind(self):
+        except_attrs = self.except_attr_list()
+        cols, values = [], []
+        for col, value in self.__dict__.items():
+            if col in except_attrs:
+                continue
+            cols.append(DORM.escape_string_for_sql(col))
+            values.append(DORM.normalize_bind_value(value))
+
+        cache_key = ("INSERT", self.table_name, tuple(cols))
+        sql = DORM.skeleton_cache.get(cache_key)
+        if sql is None:
+            clostr = ",".join("`%s`" % col for col in cols)
+            valuestr = ",".join(":p%s" % i for i in range(len(cols)))
+            sql = f"INSERT INTO {self.table_name}({clostr}) VALUES ({valuestr})"
+            DORM.skeleton_cache.set(cache_key, sql)
+        for value in values:
+            self.add_bind_param(value)
+        self._sql_info["do"] = sql
+        return self
+
     def batch_insert(self, fields=None, values=None):
         """
 
@@ -365,7 +596,6 @@ class DORM(BaseOrm):
         """
         self.reset_sql_info()
         self.validate_saveable()
-        colstr, valuestr = "", ""
         if not self.fields:
             if not fields:
                 raise ValueError("必须要有 fields 且 不能为空")
@@ -377,35 +607,85 @@ class DORM(BaseOrm):
             else:
                 self.values = values
 
-        for field in self.fields:
-            colstr += "`%s`," % field
+        colstr = ",".join("`%s`" % field for field in self.fields)
+        # 逐行拼好后一次 join，避免大批量时字符串反复 += 的平方级开销
+        value_parts = []
         for value in self.values:
             if len(value) != len(self.fields):
                 raise ValueError("字段长度与值长度不一致")
-            paramstr = ""
+            param_parts = []
             for index, param in enumerate(value):
                 if isinstance(param, int) or isinstance(param, float):
-                    paramstr += "%s," % param
+                    param_parts.append("%s" % param)
                 elif isinstance(param, str):
-                    paramstr += "'%s'," % DORM.escape_string_for_sql(param)
+                    param_parts.append("'%s'" % DORM.escape_string_for_sql(param))
                 elif isinstance(param, datetime.datetime):
-                    paramstr += "'%s'," % param.strftime('%Y-%m-%d %H:%M:%S')
+                    param_parts.append("'%s'" % param.strftime('%Y-%m-%d %H:%M:%S'))
                 elif isinstance(param, datetime.date):
-                    paramstr += "'%s'," % param.strftime('%Y-%m-%d')
+                    param_parts.append("'%s'" % param.strftime('%Y-%m-%d'))
                 elif isinstance(param, list) or isinstance(param, dict):
-                    paramstr += "'%s'," % DORM.escape_string_for_sql(JsonTool.to_json(param))
+                    param_parts.append("'%s'" % DORM.escape_string_for_sql(JsonTool.to_json(param)))
                 elif isinstance(param, type(None)):
-                    paramstr += "NULL,"
+                    param_parts.append("NULL")
                 elif isinstance(param, decimal.Decimal):
-                    paramstr += "%s," % (float(param))
+                    param_parts.append("%s" % (float(param)))
                 else:
                     raise ValueError(f"不支持的值类型({type(param)}). field: {self.fields[index]}. value: {param}")
-            valuestr += "(%s)," % paramstr.strip(",")
-        colstr = colstr.strip(",")
-        valuestr = valuestr.strip(",")
+            value_parts.append("(%s)" % ",".join(param_parts))
+        valuestr = ",".join(value_parts)
         self._sql_info["do"] = "INSERT INTO %s(%s) VALUES %s" % (self.table_name, colstr, valuestr)
         return self
 
+    def bulk_insert(self, fields, rows, chunk_rows=1000, chunk_bytes=4 * 1024 * 1024, commit_per_chunk=True):
+        """
+        大批量插入，rows 可以是任意可迭代对象/生成器，按行数和字节数分块执行参数化 executemany。
+        在事务中(start_transaction)时不会分块提交。
+        :return: 同 BaseOrm.bulk_insert_sql
+        """
+        self.validate_saveable()
+        return DORM.bulk_insert_sql(self.table_name, fields, rows, chunk_rows=chunk_rows, chunk_bytes=chunk_bytes,
+                                    commit_per_chunk=commit_per_chunk, start_transaction=self.start_transaction,
+                                    logger_errors=self.logger_errors)
+
+    def explain(self, **kwargs):
+        """
+        当前查询的执行计划，先构造好查询再调用：DORM("user").query().where(age__gt=18).order_by("name").explain()
+        :return: 同 BaseOrm.explain_sql
+        """
+        if not self.check_sql_is_select():
+            raise StandardError("只有SELECT才可以查看执行计划")
+        sql = self.get_sql()
+        if self._sql_info["params"] and "attr_dict" not in kwargs:
+            kwargs["attr_dict"] = dict(self._sql_info["params"])
+        return DORM.explain_sql(sql, logger_errors=self.logger_errors, start_transaction=self.start_transaction,
+                                **kwargs)
+
+    def bulk_upsert(self, fields, rows, update_fields=None, conflict_fields=None, chunk_rows=1000,
+                    chunk_bytes=4 * 1024 * 1024, commit_per_chunk=True):
+        """
+        大批量插入或更新，主键/唯一键已存在的行更新 update_fields，代替逐行 SELECT 再 INSERT/UPDATE 的同步写法。
+        MySQL 用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite(本地测试)用 INSERT ... ON CONFLICT DO UPDATE
+            DORM("user").bulk_upsert(["id", "name", "age"], rows, update_fields=["name", "age"])
+        :return: 同 BaseOrm.bulk_upsert_sql，包含每块的插入、更新行数
+        """
+        self.validate_saveable()
+        return DORM.bulk_upsert_sql(self.table_name, fields, rows, update_fields=update_fields,
+                                    conflict_fields=conflict_fields, chunk_rows=chunk_rows, chunk_bytes=chunk_bytes,
+                                    commit_per_chunk=commit_per_chunk, start_transaction=self.start_transaction,
+                                    logger_errors=self.logger_errors)
+
+    def bulk_update(self, rows, key="id", chunk_rows=500, commit_per_chunk=True):
+        """
+        大批量更新，每行可以更新为不同的值，代替逐行 DORM.update：
+            DORM("user").bulk_update(key="id", rows=[{"id": 1, "age": 20}, {"id": 2, "age": 31, "name": "liu"}])
+        每 chunk_rows 行编译成一条 UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...)
+        :return: 同 BaseOrm.bulk_update_sql，包含每块的影响行数
+        """
+        self.validate_saveable()
+        return DORM.bulk_update_sql(self.table_name, rows, key=key, chunk_rows=chunk_rows,
+                                    commit_per_chunk=commit_per_chunk, start_transaction=self.start_transaction,
+                                    logger_errors=self.logger_errors)
+
     def update(self, **update_attrs):
         self.reset_sql_info()
         if update_attrs:
@@ -422,7 +702,10 @@ class DORM(BaseOrm):
                 del self.__dict__["mod_time"]
             udpatestr = self.get_update_str(self.__dict__)
             self._sql_info["do"] = "UPDATE %s SET %s" % (self.table_name, udpatestr)
-            self._sql_info["where"] = "WHERE id = %s" % self.id
+            if self.use_bind_params:
+                self._sql_info["where"] = "WHERE id = %s" % self.add_bind_param(self.id)
+            else:
+                self._sql_info["where"] = "WHERE id = %s" % self.id
         return self
 
     def where(self, **conditions):
@@ -434,7 +717,10 @@ class DORM(BaseOrm):
         self.set_where_str(conditions, specify_table=specify_table)
         return self
 
-    def where_costomize_condition(self, where_str: str):
+    def where_costomize_condition(self, where_str: str, bind_params=None):
+        # bind_params: where_str 中使用的绑定参数，会合并到当前语句的参数里
+        if bind_params:
+            self._sql_info["params"].update(bind_params)
         if self.check_sql_is_insert():
             raise ValueError("INSERT不需要使用where子句！")
         # 定制where 条件 直接把定制的where条件 AND 到现有where中。
@@ -488,13 +774,55 @@ class DORM(BaseOrm):
         return self
 
     def pagination(self, **kwargs):
+        if kwargs.get("keyset_key"):
+            return self.keyset_pagination(**kwargs)
         sql = self.get_sql()
         if not sql.lower().startswith("select "):
             raise ValueError("必须是查询语句才可以进行分页操作")
+        if self._sql_info["params"]:
+            kwargs["attr_dict"] = {**self._sql_info["params"], **(kwargs.get("attr_dict") or {})}
         return BaseOrm.pagination_sql(
             sql, **kwargs
         )
 
+    def keyset_pagination(self, keyset_key="id", limit=20, cursor=None, desc=False, with_total=False, **kwargs):
+        """
+        游标分页，条件直接加到当前查询的 where/order by/limit 上，可以走排序键上的索引。
+        不带表名的排序键会补上当前表名(或别名)，排序键必须出现在查询结果中。
+        :return: 同 BaseOrm.keyset_pagination_sql
+        """
+        if self.check_sql_is_select() is False:
+            raise ValueError("必须是查询语句才可以进行分页操作")
+        limit = int(limit)
+        if limit <= 0:
+            raise StandardError("limit必须大于0")
+        table_ref = self.table_alias or self.table_name
+        key_list = [(key if "." in key else f"`{table_ref}`.`{key.strip('`')}`", colname)
+                    for key, colname in DORM.parse_keyset_key(keyset_key)]
+
+        # 连表条件在 get_sql 中加到 where 上，只生成一次，总数和数据用同一份条件和绑定参数
+        base_sql = self.get_sql()
+        count_total_num = None
+        if with_total:
+            count_sql = "SELECT COUNT(*) AS totalcount FROM ({}) tmp ".format(base_sql)
+            count_data = DORM.execute_select_sql(count_sql, dict(self._sql_info["params"]),
+                                                 logger_errors=self.logger_errors,
+                                                 start_transaction=self.start_transaction, **kwargs)
+            count_total_num = count_data[0]["totalcount"] if count_data else 0
+
+        if cursor:
+            keyset_condition = DORM.get_keyset_condition([key for key, _ in key_list], cursor,
+                                                         self._sql_info["params"], desc=desc)
+            self.where_costomize_condition(f"AND {keyset_condition}")
+        self.order_by(",".join(f"{key} DESC" if desc else key for key, _ in key_list))
+        self.limit(limit + 1)
+
+        page_sql = self.get_sql()
+        if self._sql_info["params"] and "attr_dict" not in kwargs:
+            kwargs["attr_dict"] = dict(self._sql_info["params"])
+        page_data = self.execute(sql=page_sql, obj_type="dict", **kwargs)
+        return DORM.build_keyset_page(page_data, key_list, limit, count_total_num)
+
     def join(self, table_name, table_alias="", join_type="", join_on="", col_str="",
              query_where_condition_dict=None,
              query_where_condition_or_list=None):
@@ -626,7 +954,10 @@ class DORM(BaseOrm):
                     # 处理Join str
                     join_str += f'{tmp_join_dict.get("join_type").upper()} JOIN {tmp_join_dict.get("table_name")} ' \
                                 f'{tmp_join_dict.get("table_alias")} ON {tmp_join_dict.get("join_on")} '
-                    # 处理where
+                    # 处理where，连表条件只加一次，多次调用 get_sql(如分页先查总数再查数据)不会重复
+                    if tmp_join_dict.get("where_applied"):
+                        continue
+                    tmp_join_dict["where_applied"] = True
                     self.set_where_str(tmp_join_dict.get("query_where_condition_dict"),
                                        table_alias=tmp_join_dict.get("table_alias")
                                        if tmp_join_dict.get("table_alias")
@@ -669,27 +1000,58 @@ class DORM(BaseOrm):
 
         return sql
 
-    def execute(self, sql=None, fetch="list", obj_type="orm", force_execute=False, **kwargs):
+    def execute(self, sql=None, fetch="list", obj_type="orm", force_execute=False, use_cache=False, cache_ttl=None,
+                **kwargs):
         """
 
         :param sql:
-        :param fetch: list/one/first/last 默认list返回列表
-        :param obj_type: 默认orm，返回dorm对象，可以传入dict，会把对象转为dict
+        :param fetch: list/one/first/last 默认list返回列表，iter 返回逐行读取的生成器(服务端游标，内存占用恒定)，
+                      columns 返回 {列名: 整列的值}(安装了 numpy 时为数组)，用于统计报表的向量化计算
+        :param obj_type: 默认orm，返回dorm对象，可以传入dict，会把对象转为dict；
+                         row 返回按查询列生成的 __slots__ 行对象，namedtuple 返回命名元组，两者都支持属性访问和 get_attrs，
+                         tuple 返回按查询列顺序的元组，这三种比每行一个 DORM 对象省内存，也不会修改当前对象
+        :param use_cache: 查询结果是否走 Redis 缓存(事务中和 fetch=iter 时不走)，写表时自动失效
+        :param cache_ttl: 缓存秒数，默认取配置 DORM_QUERY_CACHE_TTL
         :param kwargs: execute_select_sql 或者 execute_update_sql 函数的可选参数
         :return:
         """
+        cache_tables = None
         if not sql:
             sql = self.get_sql()
+            if self._sql_info["params"] and "attr_dict" not in kwargs:
+                kwargs["attr_dict"] = dict(self._sql_info["params"])
+            cache_tables = [self.table_name] + [join["table_name"] for join in self._sql_info["join_list"]]
 
         if sql.upper().startswith("SELECT "):
-            all_data = DORM.execute_select_sql(sql, logger_errors=self.logger_errors,
+            if fetch == "iter":
+                if obj_type not in ("orm", "dict"):
+                    raise StandardError("错误的 obj_type，只能是 orm/dict。")
+                stream = DORM.execute_select_sql(sql, return_type="stream", logger_errors=self.logger_errors,
+                                                 start_transaction=self.start_transaction, **kwargs)
+                return self.iter_result(stream, obj_type)
+            if fetch == "columns":
+                return DORM.execute_select_sql(sql, return_type="columns", logger_errors=self.logger_errors,
                                                start_transaction=self.start_transaction, **kwargs)
+            if obj_type in COMPACT_OBJ_TYPES:
+                return self.execute_compact(sql, fetch, obj_type, use_cache, cache_ttl, cache_tables, **kwargs)
+            if use_cache and not self.start_transaction:
+                all_data = QueryCache.get_or_load(
+                    sql, kwargs.get("attr_dict"),
+                    cache_tables if cache_tables is not None else QueryCache.get_read_tables(sql),
+                    lambda: DORM.execute_select_sql(sql, logger_errors=self.logger_errors,
+                                                    start_transaction=self.start_transaction, **kwargs),
+                    ttl=cache_ttl,
+                    options={k: kwargs.get(k) for k in ("json_list_keys", "json_dict_keys", "decimal_to_float")})
+            else:
+                all_data = DORM.execute_select_sql(sql, logger_errors=self.logger_errors,
+                                                   start_transaction=self.start_transaction, **kwargs)
             if fetch == "list":
                 result = []
                 for tmp_data_dict in all_data:
                     if obj_type == "orm":
                         tmporm = DORM(self.table_name, logger_errors=self.logger_errors,
-                                      start_transaction=self.start_transaction)
+                                      start_transaction=self.start_transaction,
+                                      use_bind_params=self.use_bind_params)
                         tmporm.set_attrs(**tmp_data_dict)
                         result.append(tmporm)
                     elif obj_type == "dict":
@@ -745,8 +1107,84 @@ class DORM(BaseOrm):
         else:
             raise ValueError(f"不合法的sql语句：{sql}")
 
+    def execute_compact(self, sql, fetch, obj_type, use_cache, cache_ttl, cache_tables, **kwargs):
+        if use_cache and not self.start_transaction:
+            all_data = QueryCache.get_or_load(
+                sql, kwargs.get("attr_dict"),
+                cache_tables if cache_tables is not None else QueryCache.get_read_tables(sql),
+                lambda: DORM.execute_select_sql(sql, logger_errors=self.logger_errors,
+                                                start_transaction=self.start_transaction, **kwargs),
+                ttl=cache_ttl,
+                options={k: kwargs.get(k) for k in ("json_list_keys", "json_dict_keys", "decimal_to_float")})
+            col_names = list(all_data[0].keys()) if all_data else []
+            rows = [tuple(row_dict.values()) for row_dict in all_data]
+        else:
+            col_names, rows = DORM.execute_select_sql(sql, return_type="tuple", logger_errors=self.logger_errors,
+                                                      start_transaction=self.start_transaction, **kwargs)
+        if fetch == "list":
+            return DORM.row_types.build_rows(obj_type, self.table_name, col_names, rows)
+        if not rows:
+            raise StandardError("query fetch 非list时没有查询到值")
+        if fetch == "first":
+            row = rows[0]
+        elif fetch == "last":
+            row = rows[-1]
+        elif fetch == "one":
+            if len(rows) != 1:
+                raise StandardError("query fetch one时 返回多个值")
+            row = rows[0]
+        else:
+            raise StandardError("query fetch 只能是list/one/first/last")
+        return DORM.row_types.build_rows(obj_type, self.table_name, col_names, [row])[0]
+
+    async def aexecute(self, sql=None, fetch="list", obj_type="orm", **kwargs):
+        """
+        execute 的 asyncio 版本，参数和返回值相同，不支持 fetch=iter。
+        语句在查询线程池的独立连接上执行，多个 DORM 可以 asyncio.gather 并发；事务中的 DORM 在当前线程执行
+        """
+        if fetch == "iter":
+            raise StandardError("aexecute 不支持 fetch=iter")
+        if self.start_transaction:
+            return self.execute(sql, fetch, obj_type, **kwargs)
+        return await BaseOrm.run_async(self.execute, sql, fetch, obj_type, **kwargs)
+
+    def iter_result(self, stream, obj_type="orm"):
+        for tmp_data_dict in stream:
+            if obj_type == "orm":
+                tmporm = DORM(self.table_name, logger_errors=self.logger_errors,
+                              start_transaction=self.start_transaction,
+                              use_bind_params=self.use_bind_params)
+                tmporm.set_attrs(**tmp_data_dict)
+                yield tmporm
+            else:
+                yield tmp_data_dict
+
     def dict_query(self, sql=None, fetch="list", **kwargs):
         return self.execute(sql, fetch, obj_type='dict', **kwargs)
 
+    def export(self, fmt="ndjson", filename=None, **kwargs):
+        """
+        流式导出当前查询，返回分块的 Response，见 export.export_response
+        """
+        return export_response(self, fmt=fmt, filename=filename, **kwargs)
+
+    @staticmethod
+    def loader(table_name, key="id", many=False, obj_type="orm", **kwargs):
+        """
+        当前请求内共享的批量加载器，见 BatchLoader
+        """
+        return BatchLoader.get_request_loader(table_name, key=key, many=many, obj_type=obj_type, **kwargs)
+
+    def load(self, obj_type="orm", **condition):
+        """
+        替代循环里的 DORM(table).query().where(id=x).execute(fetch="one")：
+        返回延迟结果，第一次取值时同一请求内登记过的 key 用一次 IN 查询查出；查不到时结果为 None
+        :param condition: 只能有一个条件，如 id=1、user_id=2
+        """
+        if len(condition) != 1:
+            raise StandardError("load 只能按一个字段加载")
+        (key, value), = condition.items()
+        return DORM.loader(self.table_name, key=key, obj_type=obj_type).load(value)
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -1,22 +1,33 @@
+import base64
+import concurrent.futures as futures
 import datetime
 import decimal
 import math
 import random
 import re
+import threading
 import time
 import traceback
 import logging
 from contextlib import ContextDecorator
 from pymysql.err import IntegrityError
-from tools.time_tool import get_current_time
-from tools.util import md5
+from flask import has_app_context
+from sqlalchemy import text
 from tools.exception import StandardError
 from tools.util import JsonTool
 from tools.util import get_global_trace_id
-from project import db
-
-DEFAULT_DATE = "1970-01-02"
-DEFAULT_TIME = "1970-01-02 00:00:00"
+from tools.db_tool import columnar
+from tools.db_tool import row_converter
+from tools.db_tool.executor import QueryExecutor
+from tools.db_tool.explain import PlanCapture, get_explain_prefix, parse_plan
+from tools.db_tool.loader import BatchLoader
+from tools.db_tool.query_cache import QueryCache
+from tools.db_tool.replica import ReplicaRouter
+from tools.db_tool.row_converter import DEFAULT_DATE, DEFAULT_TIME
+from tools.db_tool.sql_log import SqlLogPipeline
+from tools.db_tool.sql_metrics import SqlMetrics
+from project import get_app, get_default_app
+from project.extensions import db, pool_stats, redis_client
 
 
 logging.basicConfig()
@@ -24,27 +35,65 @@ logger = logging.getLogger(__name__)
 
 
 class Atomic(ContextDecorator):
+    # 当前线程是否在 Atomic 块中，块中的读都走主库
+    state = threading.local()
 
     def __init__(self, **dorm_dict):
         self.db = db
         self.dorm_dict = dorm_dict
 
+    @staticmethod
+    def in_atomic():
+        return getattr(Atomic.state, "depth", 0) > 0
+
     def __enter__(self):
+        Atomic.state.depth = getattr(Atomic.state, "depth", 0) + 1
         for k, v in self.dorm_dict.items():
             v.start_transaction = True
         return self.dorm_dict
 
     def __exit__(self, exc_typ, exc_val, tb):
+        Atomic.state.depth = getattr(Atomic.state, "depth", 1) - 1
         if exc_typ:
             self.db.session.rollback()
         else:
             self.db.session.commit()
+        QueryCache.flush_pending()
+
+
+class SessionDescriptor(object):
+    """
+    BaseOrm.connection：每次访问时才取 db.session，不在 import 时绑定 app。
+    没有 app 上下文时(脚本、后台线程)先创建默认 app
+    """
+
+    def __get__(self, instance, owner):
+        if not has_app_context():
+            get_default_app()
+        return db.session
 
 
 class BaseOrm(object):
-    connection = db.session
+    connection = SessionDescriptor()
+    replica_router = ReplicaRouter(db, app_getter=get_app)
+    # SQL日志后台写入队列，队列长度在第一次写日志时读取配置
+    sql_log_pipeline = SqlLogPipeline(lambda *args: BaseOrm.write_sql_log(*args),
+                                      config_getter=lambda: get_app().config)
+    # asyncio/并发查询使用的线程池
+    query_executor = QueryExecutor(app_getter=get_app)
+    # 按SQL指纹统计耗时
+    sql_metrics = SqlMetrics(redis_getter=lambda: redis_client, config_getter=lambda: get_app().config)
+    # 慢查询执行计划采集，在执行慢查询的库上 EXPLAIN
+    plan_capture = PlanCapture(lambda app, database: db.get_engine(
+        app, bind=database if database and database != "default" else None))
 
     DEFAULT_DATE = DEFAULT_DATE
+    # pagination_sql 的 count_strategy
+    COUNT_STRATEGIES = ("regex", "derived", "window", "explain", "cached")
+    WINDOW_COUNT_COLUMN = "_dorm_total_count"
+    # execute_parallel 中只传给 DORM.execute / 只传给 execute_select_sql 的参数
+    PARALLEL_DORM_ONLY_KWARGS = ("obj_type", "fetch", "use_cache", "cache_ttl", "force_execute")
+    PARALLEL_SQL_ONLY_KWARGS = ("start_transaction", "logger_errors", "return_type")
     DEFAULT_TIME = DEFAULT_TIME
 
     @staticmethod
@@ -92,31 +141,87 @@ class BaseOrm(object):
         else:
             return BaseOrm.escape_all_for_sql(value)
 
+    @staticmethod
+    def normalize_bind_value(value):
+        # 与字面量拼接时的取值保持一致，只是不再转义，直接交给驱动
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        elif isinstance(value, datetime.datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(value, datetime.date):
+            return value.strftime('%Y-%m-%d')
+        elif isinstance(value, list) or isinstance(value, dict):
+            return JsonTool.to_json(value)
+        elif isinstance(value, decimal.Decimal):
+            return float(value)
+        else:
+            raise ValueError("不支持的值类型(%s)" % type(value))
+
     @staticmethod
     def log_sql_result(sql_str, attr_dict, t_start, tsqlend, t_allend,
                        traceback_str, return_value, log_trace_id=None,
-                       database=None, database_errmsg="", with_val=True):
+                       database=None, database_errmsg="", with_val=True, rows=None):
+        """
+        记录SQL日志。请求线程只做采样判断，格式化和输出交给后台线程(SQL_LOG_ASYNC)。
+        按 SQL_LOG_SAMPLE_RATE 采样，异常和慢查询(>= SQL_LOG_SLOW_THRESHOLD 秒)一定记录；
+        with_val 为 False 时不携带结果。
+        指纹耗时统计不受采样影响，每条SQL都会记录。
+        开启 SQL_EXPLAIN_SLOW 时，慢查询的指纹第一次出现会在后台采集执行计划，之后的慢查询日志带上计划摘要。
+        :param rows: 返回行数，默认取 return_value 列表的长度
+        """
         try:
+            # 执行前或执行中出错时 t_start/tsqlend 还是 0，用结束时间补上，耗时不能为负
+            t_start = t_start or t_allend
+            tsqlend = max(tsqlend or t_allend, t_start)
+            app = get_app()
+            config = app.config
+            if rows is None:
+                rows = len(return_value) if isinstance(return_value, list) else 0
+            if config.get("SQL_METRICS_ENABLED", True):
+                BaseOrm.sql_metrics.record(sql_str, tsqlend - t_start, rows, bool(traceback_str))
+
+            all_elapsed_time = t_allend - t_start
+            keep = traceback_str or tsqlend - t_start > 3 \
+                or all_elapsed_time >= config.get("SQL_LOG_SLOW_THRESHOLD", 0.6)
+            if not keep:
+                if not logger.isEnabledFor(logging.INFO):
+                    # INFO 不输出时，只有慢查询报警会输出，这里不是慢查询
+                    return
+                sample_rate = config.get("SQL_LOG_SAMPLE_RATE", 1.0)
+                if sample_rate < 1 and random.random() >= sample_rate:
+                    BaseOrm.sql_log_pipeline.sampled_out += 1
+                    return
+
             if log_trace_id is None:
                 log_trace_id = get_global_trace_id()
+            if not with_val:
+                return_value = None
+            elif isinstance(return_value, list):
+                # 浅拷贝，避免调用方后续修改列表影响日志
+                return_value = list(return_value)
+            plan = None
+            if config.get("SQL_EXPLAIN_SLOW", False) and not traceback_str \
+                    and tsqlend - t_start >= config.get("SQL_LOG_SLOW_THRESHOLD", 0.6):
+                plan = BaseOrm.plan_capture.get_or_schedule(app, sql_str, attr_dict, database, tsqlend - t_start,
+                                                            trace_id=log_trace_id)
+            args = (sql_str, attr_dict, t_start, tsqlend, t_allend, traceback_str, return_value,
+                    log_trace_id, database, database_errmsg, with_val, pool_stats.brief(database or "default"), plan,
+                    rows)
+            if config.get("SQL_LOG_ASYNC", True):
+                BaseOrm.sql_log_pipeline.submit(args)
+            else:
+                BaseOrm.write_sql_log(*args)
+        except:
+            logger.error("execute_select_sql logging failed: %s" % traceback.format_exc())
 
+    @staticmethod
+    def write_sql_log(sql_str, attr_dict, t_start, tsqlend, t_allend,
+                      traceback_str, return_value, log_trace_id=None,
+                      database=None, database_errmsg="", with_val=True, pool_status=None, plan=None, rows=None):
+        try:
             sql_elapsed_time = tsqlend - t_start
             all_elapsed_time = t_allend - t_start
 
-            max_respones_size = int(1024 * 1024 * 1.5)
-            # max_respones_size = 10
-            if isinstance(return_value, list):
-                output_return_value = []
-                if return_value:
-                    if len(JsonTool.to_json(return_value)) <= max_respones_size:
-                        output_return_value = return_value
-                    else:
-                        output_return_value.append(return_value[0])
-            else:
-                return_value = str(return_value)
-                output_return_value = return_value if len(return_value) <= max_respones_size \
-                    else return_value[:max_respones_size]
-
             sql_res_dict = {
                 "type": sql_str.strip().split(" ")[0].upper(),
                 "elapsed_range": "",
@@ -132,10 +237,29 @@ class BaseOrm(object):
                 # "return_value": output_return_value,
                 "result": "",
                 "sql_elapsed_time_ms": sql_elapsed_time * 1000,
+                # 返回(或写入)的行数，flask sql-report 汇总使用
+                "rows": rows,
                 "database": database,
                 "database_errmsg": database_errmsg,
+                # 记录日志时该库连接池的占用情况
+                "pool": pool_status,
             }
+            if plan is not None:
+                # 慢查询的执行计划摘要，flags 里有 full_scan/full_index_scan/filesort/temporary
+                sql_res_dict["plan"] = plan
             if with_val:
+                max_respones_size = int(1024 * 1024 * 1.5)
+                if isinstance(return_value, list):
+                    output_return_value = []
+                    if return_value:
+                        if len(JsonTool.to_json(return_value)) <= max_respones_size:
+                            output_return_value = return_value
+                        else:
+                            output_return_value.append(return_value[0])
+                else:
+                    return_value = str(return_value)
+                    output_return_value = return_value if len(return_value) <= max_respones_size \
+                        else return_value[:max_respones_size]
                 sql_res_dict['return_value'] = output_return_value
 
             if traceback_str:
@@ -169,20 +293,63 @@ class BaseOrm(object):
             # sql_res_dict["result"] = "ERROR"
             if sql_elapsed_time > 3:
                 logger.warning(
-                    "慢查询报警：SQL执行时间[%s]秒过长，详情：\n%s" % (int(sql_elapsed_time), sql_res_dict_jsonstr)
+                    "慢查询报警：SQL执行时间[%s]秒过长%s，详情：\n%s"
+                    % (int(sql_elapsed_time), "，执行计划：%s" % plan["flags"] if plan else "", sql_res_dict_jsonstr)
                 )
 
         except:
-            logger.error("execute_select_sql logging failed: %s" % traceback.format_exc())
+            logger.error("write_sql_log failed: %s" % traceback.format_exc())
+
+    @staticmethod
+    def convert_rows(col_names, rows, json_list_keys=None, json_dict_keys=None, decimal_to_float=False):
+        """
+        把数据库返回的行转换为dict列表，处理json列、默认时间和decimal
+        """
+        return row_converter.convert_rows(col_names, rows, json_list_keys=json_list_keys,
+                                          json_dict_keys=json_dict_keys, decimal_to_float=decimal_to_float)
+
+    @staticmethod
+    def get_read_connection(sql_str, start_transaction=False):
+        """
+        选择执行查询的连接：事务中(start_transaction 或 Atomic 块)和 FOR UPDATE 走主库，其余轮询健康的从库
+        :return: (connection, 节点名)，主库节点名为 default
+        """
+        if start_transaction or Atomic.in_atomic() or not get_app().config.get("DB_READ_FROM_REPLICA", True) \
+                or "for update" in sql_str[-32:].lower():
+            return BaseOrm.connection, "default"
+        node = BaseOrm.replica_router.choose()
+        if node is None:
+            return BaseOrm.connection, "default"
+        return BaseOrm.replica_router.get_engine(node), node.name
+
+    @staticmethod
+    def execute_read(use_connection, used_database, statement, attr_dict):
+        """
+        执行查询，从库执行失败时标记该从库不可用并在主库重试一次
+        :return: (cursor_result, 实际执行的节点名)
+        """
+        try:
+            return use_connection.execute(statement, attr_dict), used_database
+        except Exception:
+            if not used_database.startswith(ReplicaRouter.BIND_PREFIX):
+                raise
+            logger.warning("从库[%s]查询失败，切回主库重试：%s" % (used_database, traceback.format_exc()))
+            BaseOrm.replica_router.mark_down(used_database)
+            return BaseOrm.connection.execute(statement, attr_dict), "default"
 
     @staticmethod
     def execute_select_sql(sql_str, attr_dict=None, return_type='list', json_list_keys=None, json_dict_keys=None,
                            log_trace_id=None, logger_errors=True, use_connection=None, decimal_to_float=False,
-                           start_transaction=False, log_result=False):
+                           start_transaction=False, log_result=False, chunk_size=1000):
         """
 
         :param sql_str:
-        :param return_type: list 就是返回列表，否则是返回 cursor指针，不耗费内存
+        :param return_type: list 就是返回列表，stream 返回按 chunk_size 分批读取的生成器(服务端游标)，
+                            tuple 返回 (列名列表, 元组列表)，不为每行创建 dict，
+                            columns 返回 {列名: 整列的值}，安装了 numpy 时为数组，各值的转换与 list 相同，
+                            见 columnar.convert_columns，
+                            否则是返回 cursor指针，不耗费内存
+        :param chunk_size: return_type 为 stream 时每次从游标取的行数
         :param check_datetime:
         :param json_keys:
         :param json_default:
@@ -197,78 +364,55 @@ class BaseOrm(object):
         :param use_connection:
         :return:
         """
+        if return_type == "stream":
+            return BaseOrm.stream_select_sql(sql_str, attr_dict, chunk_size=chunk_size,
+                                             json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
+                                             log_trace_id=log_trace_id, logger_errors=logger_errors,
+                                             use_connection=use_connection, decimal_to_float=decimal_to_float,
+                                             start_transaction=start_transaction)
+
         t_start, tsqlend = 0, 0
         traceback_str = None
         return_value = None
+        row_count = None
         used_database = ""
         database_errmsg = ""
         try:
             if use_connection is None:
-                # 写走主库，查走从库功能，如果上线有问题，迅速回滚到connection
-                use_connection = BaseOrm.connection
+                # 写走主库，查走从库功能，如果上线有问题，DB_READ_FROM_REPLICA=0 迅速回滚到connection
+                use_connection, used_database = BaseOrm.get_read_connection(sql_str, start_transaction)
+            elif use_connection == BaseOrm.connection:
+                used_database = "default"
+            else:
+                used_database = "unknown"
 
             if not isinstance(attr_dict, dict):
                 attr_dict = {}
             t_start = time.time()
-            cursor_result = use_connection.execute(sql_str, attr_dict)
+            cursor_result, used_database = BaseOrm.execute_read(use_connection, used_database, text(sql_str),
+                                                                attr_dict)
             tsqlend = time.time()
 
-            if use_connection == BaseOrm.connection:
-                used_database = "default"
-            else:
-                used_database = "unknown"
-
-            if return_type != "list":
+            if return_type not in ("list", "tuple", "columns"):
                 return cursor_result
 
             # 如果是返回列表
-            all_data = cursor_result.fetchall()
             col_names = list(cursor_result.keys())
-            result = []
-            for row_data in all_data:
-                obj_dict = {}
-                # 把每一行的数据遍历出来放到Dict中
-                for index_colname in range(0, len(col_names)):
-                    colname = col_names[index_colname]
-                    rowvalue = row_data[index_colname]
-                    # 处理 json_list_keys ，如果为空或者不合法，就是空列表
-                    if isinstance(json_list_keys, list) and colname in json_list_keys:
-                        if rowvalue:
-                            rowvalue = JsonTool.to_dict_or_list(rowvalue)
-                        else:
-                            rowvalue = []
-
-                    # 处理 json_dict_keys ，如果为空或者不合法，就是空字典
-                    if isinstance(json_dict_keys, list) and colname in json_dict_keys:
-                        if rowvalue:
-                            rowvalue = JsonTool.to_dict_or_list(rowvalue)
-                        else:
-                            rowvalue = {}
-
-                    # 处理默认时间，如果类型是data或者datetime，进行处理
-                    if isinstance(rowvalue, datetime.datetime):
-                        rowvalue_str = TimeTool.format_datetime_to_str(rowvalue)
-                        if rowvalue_str == DEFAULT_TIME:
-                            rowvalue = ""
-                        else:
-                            rowvalue = rowvalue_str
-
-                    elif isinstance(rowvalue, datetime.date):
-                        rowvalue_str = TimeTool.format_date_to_str(rowvalue)
-                        if rowvalue_str == DEFAULT_DATE:
-                            rowvalue = ""
-                        else:
-                            rowvalue = rowvalue_str
-
-                    elif isinstance(rowvalue, str) and (colname.endswith("_date") or colname.endswith("_time")) and rowvalue.startswith("0000-00-00"):
-                        rowvalue = ""
-
-                    # 如果是decimal
-                    if decimal_to_float and isinstance(rowvalue, decimal.Decimal):
-                        rowvalue = float(rowvalue)
-
-                    obj_dict[colname] = rowvalue
-                result.append(obj_dict)
+            if return_type == "columns":
+                # text() 查询没有结果类型处理，直接从 DBAPI 游标取元组，省去每行构造 Row 对象
+                all_data = cursor_result.cursor.fetchall() if cursor_result.cursor is not None else []
+                cursor_result.close()
+                row_count = len(all_data)
+                return columnar.convert_columns(col_names, all_data, json_list_keys=json_list_keys,
+                                                json_dict_keys=json_dict_keys, decimal_to_float=decimal_to_float)
+            all_data = cursor_result.fetchall()
+            if return_type == "tuple":
+                return_value = row_converter.convert_tuples(col_names, all_data, json_list_keys=json_list_keys,
+                                                            json_dict_keys=json_dict_keys,
+                                                            decimal_to_float=decimal_to_float)
+                return col_names, return_value
+            result = BaseOrm.convert_rows(col_names, all_data, json_list_keys=json_list_keys,
+                                          json_dict_keys=json_dict_keys, decimal_to_float=decimal_to_float)
 
             # 返回列表的处理完毕
             return_value = result
@@ -289,7 +433,64 @@ class BaseOrm(object):
                                    return_value, log_trace_id=log_trace_id,
                                    database=used_database,
                                    database_errmsg=database_errmsg,
-                                   with_val=log_result)
+                                   with_val=log_result, rows=row_count)
+
+    @staticmethod
+    def stream_select_sql(sql_str, attr_dict=None, chunk_size=1000, json_list_keys=None, json_dict_keys=None,
+                          log_trace_id=None, logger_errors=True, use_connection=None, decimal_to_float=False,
+                          start_transaction=False):
+        """
+        流式查询：使用服务端游标，每次 fetchmany(chunk_size) 行并逐行 yield 转换后的 dict，
+        内存占用只和 chunk_size 有关，与总行数无关。
+        SQL日志在游标读完(或生成器被关闭)时记录，sql_elapsed_time 为从执行到读完全部数据的耗时。
+        """
+        t_start, tsqlend = 0, 0
+        traceback_str = None
+        row_count = 0
+        used_database = ""
+        cursor_result = None
+        try:
+            if use_connection is None:
+                use_connection, used_database = BaseOrm.get_read_connection(sql_str, start_transaction)
+            else:
+                used_database = "default" if use_connection == BaseOrm.connection else "unknown"
+
+            if not isinstance(attr_dict, dict):
+                attr_dict = {}
+            t_start = time.time()
+            cursor_result, used_database = BaseOrm.execute_read(
+                use_connection, used_database, text(sql_str).execution_options(stream_results=True), attr_dict)
+
+            col_names = list(cursor_result.keys())
+            while True:
+                rows = cursor_result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                for row_dict in BaseOrm.convert_rows(col_names, rows, json_list_keys=json_list_keys,
+                                                     json_dict_keys=json_dict_keys,
+                                                     decimal_to_float=decimal_to_float):
+                    yield row_dict
+            tsqlend = time.time()
+        except Exception as e:
+            if logger_errors:
+                traceback_str = str(traceback.format_exc())
+                logger.error("stream_select_sql:【异常_EXCEPTION_错误_ERROR】 | %s | attr_dict：(%s) | 异常信息: (%s)"
+                             % (sql_str, attr_dict, traceback.format_exc()))
+            raise e
+        finally:
+            if not tsqlend:
+                # 没读完就被关闭(或异常)，按关闭时间记录
+                tsqlend = time.time()
+            if cursor_result is not None:
+                cursor_result.close()
+            if not start_transaction:
+                BaseOrm.connection.commit()
+            BaseOrm.log_sql_result(sql_str, attr_dict,
+                                   t_start, tsqlend, time.time(), traceback_str,
+                                   "stream %s rows" % row_count, log_trace_id=log_trace_id,
+                                   database=used_database,
+                                   with_val=True, rows=row_count)
 
     @staticmethod
     def execute_update_sql(sql_str, attr_dict=None, logger_errors=True, log_trace_id=None, auto_commit=True,
@@ -305,6 +506,9 @@ class BaseOrm(object):
                 attr_dict = {}
             t_start = time.time()
             cursor_result = BaseOrm.connection.execute(sql_str, attr_dict)
+            # 失效查询缓存，提交(自动提交或事务提交)后会再失效一次
+            QueryCache.invalidate_by_sql(sql_str)
+            BatchLoader.clear_table(QueryCache.get_write_table(sql_str))
             # 如果不在事务中，并且设置了自动提交，才会自动提交。
             if not start_transaction and auto_commit:
                 BaseOrm.commit()
@@ -343,13 +547,139 @@ class BaseOrm(object):
                                    database_errmsg=database_errmsg,
                                    with_val=log_result)
 
+    @staticmethod
+    async def run_async(func, *args, **kwargs):
+        """
+        在查询线程池中执行 func 并 await 结果，多个互不依赖的查询可以用 asyncio.gather 并发执行。
+        事务中、Atomic 块中、指定了连接或不自动提交的语句必须用当前线程的连接，直接在当前线程执行。
+        """
+        if kwargs.get("start_transaction") or kwargs.get("use_connection") is not None \
+                or kwargs.get("auto_commit") is False or Atomic.in_atomic():
+            return func(*args, **kwargs)
+        return await BaseOrm.query_executor.run_async(func, *args, **kwargs)
+
+    @staticmethod
+    async def aexecute_select_sql(sql_str, **kwargs):
+        """
+        execute_select_sql 的 asyncio 版本，参数相同，不支持 return_type=stream
+        """
+        if kwargs.get("return_type") == "stream":
+            raise StandardError("aexecute_select_sql 不支持 return_type=stream")
+        return await BaseOrm.run_async(BaseOrm.execute_select_sql, sql_str, **kwargs)
+
+    @staticmethod
+    async def aexecute_update_sql(sql_str, **kwargs):
+        return await BaseOrm.run_async(BaseOrm.execute_update_sql, sql_str, **kwargs)
+
+    @staticmethod
+    def execute_parallel(queries, timeout=None, max_workers=None, log_trace_id=None, **kwargs):
+        """
+        并发执行互不依赖的查询，每个查询在查询线程池中用独立的连接池连接执行，耗时约等于最慢的一条。
+        :param queries: DORM 对象、SELECT 语句字符串或 (SELECT语句, attr_dict) 的列表
+        :param timeout: 总时限(秒)，默认取配置 DB_PARALLEL_TIMEOUT，超时抛 StandardError
+        :param max_workers: 本次最多同时执行的查询数，默认不超过线程池大小
+        :param kwargs: 查询参数。obj_type、fetch、use_cache、cache_ttl 只作用于 DORM 对象；
+                       SQL 字符串按 execute_select_sql 执行，返回 dict 列表，fetch 只支持 list/columns，
+                       其余参数(json_list_keys、decimal_to_float、start_transaction 等)传给 execute_select_sql
+        :return: 与 queries 顺序一致的结果列表
+        """
+        dorm_kwargs = {key: value for key, value in kwargs.items() if key not in BaseOrm.PARALLEL_SQL_ONLY_KWARGS}
+        sql_kwargs = {key: value for key, value in kwargs.items() if key not in BaseOrm.PARALLEL_DORM_ONLY_KWARGS}
+        fetch = kwargs.get("fetch", "list")
+        calls = []
+        for query in queries:
+            if isinstance(query, BaseOrm):
+                # get_sql 会把连表条件追加到 where 和绑定参数中，只能调用一次，生成的 SQL 直接传给 execute
+                sql_str = query.get_sql()
+                call_kwargs = dict(dorm_kwargs, sql=sql_str)
+                if query._sql_info["params"] and "attr_dict" not in call_kwargs:
+                    call_kwargs["attr_dict"] = dict(query._sql_info["params"])
+                func, args = query.execute, ()
+                in_transaction = query.start_transaction
+            else:
+                sql_str, attr_dict = query if isinstance(query, (tuple, list)) else (query, None)
+                if fetch not in ("list", "columns"):
+                    raise ValueError("execute_parallel 中的 SQL 字符串只支持 fetch=list/columns，"
+                                     "其他 fetch 请使用 DORM 对象：%s" % fetch)
+                call_kwargs = dict(sql_kwargs, return_type="list" if fetch == "list" else "columns")
+                func, args = BaseOrm.execute_select_sql, (sql_str, attr_dict)
+                in_transaction = kwargs.get("start_transaction", False)
+            if not sql_str.strip().upper().startswith("SELECT "):
+                raise ValueError("execute_parallel 只能执行查询语句：%s" % sql_str)
+            calls.append((func, args, call_kwargs, in_transaction))
+
+        if log_trace_id is None:
+            log_trace_id = get_global_trace_id()
+        t_start = time.time()
+        elapsed_list = [None] * len(calls)
+
+        def timed(index, func, args, call_kwargs):
+            t_query = time.time()
+            try:
+                return func(*args, log_trace_id=log_trace_id, **call_kwargs)
+            finally:
+                elapsed_list[index] = time.time() - t_query
+
+        # 事务中的查询必须和事务用同一个连接，按顺序在当前线程执行
+        if Atomic.in_atomic() or any(in_transaction for _, _, _, in_transaction in calls):
+            results = [timed(index, func, args, call_kwargs)
+                       for index, (func, args, call_kwargs, _) in enumerate(calls)]
+            BaseOrm.log_parallel_result(log_trace_id, t_start, elapsed_list, 1)
+            return results
+
+        if timeout is None:
+            timeout = get_app().config.get("DB_PARALLEL_TIMEOUT", 10)
+        pool_width = BaseOrm.query_executor.get_max_workers()
+        width = min(max_workers or pool_width, pool_width) or 1
+        deadline = t_start + timeout
+        results = [None] * len(calls)
+        running = {}
+        next_index = 0
+        try:
+            while next_index < len(calls) or running:
+                while next_index < len(calls) and len(running) < width:
+                    func, args, call_kwargs, _ = calls[next_index]
+                    running[BaseOrm.query_executor.submit(timed, next_index, func, args, call_kwargs)] = next_index
+                    next_index += 1
+                done, _ = futures.wait(running, timeout=max(deadline - time.time(), 0),
+                                       return_when=futures.FIRST_COMPLETED)
+                if not done:
+                    raise StandardError("并发查询超过时限[%s]秒，还有%s条未完成" % (timeout, len(calls) - sum(
+                        elapsed is not None for elapsed in elapsed_list)))
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+            BaseOrm.log_parallel_result(log_trace_id, t_start, elapsed_list, width)
+        return results
+
+    @staticmethod
+    def log_parallel_result(log_trace_id, t_start, elapsed_list, width):
+        # 每条查询自己的 SQL 日志照常记录，这里只记一条汇总
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        all_elapsed_time = time.time() - t_start
+        logger.info(JsonTool.to_json({
+            "type": "PARALLEL",
+            "trace_id": log_trace_id,
+            "query_count": len(elapsed_list),
+            "width": width,
+            "all_elapsed_time": "%.2f ms" % (all_elapsed_time * 1000),
+            "sum_elapsed_time": "%.2f ms" % (sum(elapsed or 0 for elapsed in elapsed_list) * 1000),
+            "query_elapsed_time_ms": [None if elapsed is None else round(elapsed * 1000, 2)
+                                      for elapsed in elapsed_list],
+        }))
+
     @staticmethod
     def commit():
         BaseOrm.connection.commit()
+        QueryCache.flush_pending()
 
     @staticmethod
     def rollback():
         BaseOrm.connection.rollback()
+        QueryCache.flush_pending()
 
     @staticmethod
     def get_select_sql_count(sql_str, attr_dict=None):
@@ -375,58 +705,103 @@ class BaseOrm(object):
     @staticmethod
     def pagination_sql(sql, page=1, limit=1, attr_dict=None, whether_groupby=False,
                        json_list_keys=None, json_dict_keys=None, log_trace_id=None, offset=None,
-                       count_sql=None, count_derived_sql=None, use_connection=None, **kwargs):
+                       count_sql=None, count_derived_sql=None, use_connection=None,
+                       keyset_key=None, cursor=None, desc=False, with_total=True,
+                       count_strategy=None, count_cache_ttl=None, **kwargs):
+        """
+        分页查询，默认 LIMIT offset,count 分页。
+        传入 keyset_key 时使用游标分页(seek)，见 keyset_pagination_sql，page/offset 不再生效。
+        :param with_total: 是否查询总数，无限滚动等不需要总数的场景传 False，省掉 COUNT(*)
+        :param count_strategy: 总数的查法，默认取配置 PAGINATION_COUNT_STRATEGY
+            regex: 把 SELECT 列表改写为 COUNT(*)(原有方式)，GROUP BY/DISTINCT 的查询要用 derived
+            derived: SELECT COUNT(*) FROM (sql)，任何查询都准确
+            window: 分页查询里带上 COUNT(*) OVER()，一次往返拿到数据和总数(MySQL 8+)
+            explain: 单表查询用 EXPLAIN 的 rows * filtered 估算，不扫描，结果带 totalcount_estimated=True，
+                     是估算值不是精确总数；连表、子查询等 EXPLAIN 有多行或拿不到估算值时退回 derived
+            cached: derived 的结果缓存在 Redis，count_cache_ttl 秒内不再 COUNT
+        """
+        if keyset_key:
+            return BaseOrm.keyset_pagination_sql(sql, keyset_key, limit=limit, cursor=cursor, desc=desc,
+                                                 with_total=with_total, attr_dict=attr_dict,
+                                                 json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
+                                                 log_trace_id=log_trace_id, use_connection=use_connection,
+                                                 **kwargs)
         page, limit = int(page), int(limit)
         if not page:
             raise StandardError('page不能为0')
 
         if log_trace_id is None:
-            log_trace_id = md5(get_current_time() + str(random.randint(0, 1000000000)))
+            log_trace_id = get_global_trace_id()
         if attr_dict is None:
             attr_dict = {}
-
-        # 获取总得data列表 获取countcou
-        if count_derived_sql:
-            count_sql = "SELECT COUNT(*) FROM ({}) tmp ".format(sql)
-            whether_groupby = False
-
-        if not count_sql:
+        if count_strategy is None:
+            count_strategy = get_app().config.get("PAGINATION_COUNT_STRATEGY", "regex")
+        if count_strategy not in BaseOrm.COUNT_STRATEGIES:
+            raise StandardError("count_strategy 只能是 %s" % "/".join(BaseOrm.COUNT_STRATEGIES))
+        # 分组查询的行数不能改写 SELECT 列表来数，原先取回全部行再 len()，现在用派生表 COUNT
+        if (count_derived_sql or whether_groupby) and count_strategy == "regex":
+            count_strategy = "derived"
+        start_index = (page * limit - limit) if offset is None else offset
+        empty_result = {"datalist": [], "page": page, "limit": limit, "pagecount": 0, "totalcount": 0, 'offset': 0}
+
+        count_total_num = None
+        estimated = False
+        if not with_total:
+            pass
+        elif count_sql:
+            exec_data = BaseOrm.execute_select_sql(count_sql.lower(), attr_dict,
+                                                   log_trace_id=log_trace_id,
+                                                   use_connection=use_connection, **kwargs)
+            if not exec_data:
+                return empty_result
+            count_total_num = exec_data[0]['count(*)']
+        elif count_strategy == "regex":
             pattern = re.compile(r'^select\s(.*?)\sfrom\s', re.IGNORECASE)
             count_sql_str = re.sub(pattern, 'SELECT COUNT(*) FROM ', sql.replace("\n", "").strip())
-        else:
-            count_sql_str = count_sql
-
-        if whether_groupby:
-            cursor = BaseOrm.execute_select_sql(sql, attr_dict,
-                                                return_type="cursor", log_trace_id=log_trace_id,
-                                                use_connection=use_connection, **kwargs)
-            all_data = cursor.fetchall()
-            count_total_num = len(all_data)
-            if count_total_num == 0:
-                return {"datalist": [], "page": page, "limit": limit, "pagecount": 0, "totalcount": 0, 'offset': 0}
-        else:
             exec_data = BaseOrm.execute_select_sql(count_sql_str.lower(), attr_dict,
                                                    log_trace_id=log_trace_id,
                                                    use_connection=use_connection, **kwargs)
             if not exec_data:
-                return {"datalist": [], "page": page, "limit": limit, "pagecount": 0, "totalcount": 0, 'offset': 0}
-            else:
-                count_total_num = exec_data[0]['count(*)']
+                return empty_result
+            count_total_num = exec_data[0]['count(*)']
+        elif count_strategy != "window":
+            count_total_num, estimated = BaseOrm.get_pagination_total(
+                sql, attr_dict, count_strategy, log_trace_id=log_trace_id, use_connection=use_connection,
+                count_cache_ttl=count_cache_ttl, **kwargs)
+        if count_total_num == 0:
+            return empty_result
 
         # 分页处理
-        sql += "  LIMIT :limit_first_start_index,:limit_second_page_items_count "
-        page_count = math.ceil(count_total_num / limit)
-
-        attr_dict["limit_first_start_index"] = (page * limit - limit) if offset is None else offset
-        attr_dict["limit_second_page_items_count"] = limit
+        page_attr_dict = dict(attr_dict)
+        page_attr_dict["limit_first_start_index"] = start_index
+        page_attr_dict["limit_second_page_items_count"] = limit
+        if with_total and count_strategy == "window" and not count_sql:
+            page_sql = "SELECT window_tmp.*, COUNT(*) OVER() AS " + BaseOrm.WINDOW_COUNT_COLUMN + \
+                       " FROM (" + sql + ") window_tmp LIMIT :limit_first_start_index,:limit_second_page_items_count"
+        else:
+            page_sql = sql + "  LIMIT :limit_first_start_index,:limit_second_page_items_count "
 
         # 获取分页查出的data列表
-        page_data = BaseOrm.execute_select_sql(sql, attr_dict,
+        page_data = BaseOrm.execute_select_sql(page_sql, page_attr_dict,
                                                json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
                                                log_trace_id=log_trace_id,
                                                use_connection=use_connection, **kwargs)
+        if with_total and count_strategy == "window" and not count_sql:
+            if page_data:
+                count_total_num = page_data[0][BaseOrm.WINDOW_COUNT_COLUMN]
+                for row in page_data:
+                    del row[BaseOrm.WINDOW_COUNT_COLUMN]
+            elif start_index == 0:
+                count_total_num = 0
+            else:
+                # 页码超出范围时窗口函数拿不到总数，补一次 COUNT
+                count_total_num, _ = BaseOrm.get_pagination_total(
+                    sql, attr_dict, "derived", log_trace_id=log_trace_id, use_connection=use_connection, **kwargs)
+            if count_total_num == 0:
+                return empty_result
+        page_count = math.ceil(count_total_num / limit) if count_total_num is not None else None
 
-        return {
+        result = {
             "datalist": page_data,
             "page": page,
             "limit": limit,
@@ -434,10 +809,170 @@ class BaseOrm(object):
             "totalcount": count_total_num,
             'offset': 0 if offset is None else (offset + len(page_data)),
         }
+        if estimated:
+            result["totalcount_estimated"] = True
+        return result
+
+    @staticmethod
+    def get_pagination_total(sql, attr_dict, count_strategy="derived", log_trace_id=None, use_connection=None,
+                             count_cache_ttl=None, **kwargs):
+        """
+        :return: (总数, 是否估算值)
+        """
+        derived_sql = "SELECT COUNT(*) AS total_count FROM (" + sql + ") count_tmp "
+
+        def count_derived():
+            exec_data = BaseOrm.execute_select_sql(derived_sql, attr_dict, log_trace_id=log_trace_id,
+                                                   use_connection=use_connection, **kwargs)
+            return exec_data[0]["total_count"] if exec_data else 0
+
+        if count_strategy == "explain":
+            try:
+                plan = BaseOrm.execute_select_sql("EXPLAIN " + sql, attr_dict, log_trace_id=log_trace_id,
+                                                  use_connection=use_connection, **kwargs)
+            except Exception:
+                plan = []
+            estimated_total = BaseOrm.estimate_plan_rows(plan)
+            if estimated_total is not None:
+                return estimated_total, True
+            return count_derived(), False
+        if count_strategy == "cached" and not kwargs.get("start_transaction"):
+            ttl = count_cache_ttl if count_cache_ttl is not None \
+                else get_app().config.get("PAGINATION_COUNT_CACHE_TTL", 60)
+            # 缓存的值必须是 list/dict
+            cached = QueryCache.get_or_load(derived_sql, attr_dict, QueryCache.get_read_tables(sql),
+                                            lambda: [count_derived()], ttl=ttl, force=True)
+            return cached[0], False
+        return count_derived(), False
+
+    @staticmethod
+    def estimate_plan_rows(plan):
+        """
+        用 MySQL EXPLAIN 的结果估算查询结果的行数：rows(优化器估算的扫描行数) * filtered(条件过滤后剩余的百分比)。
+        连表、子查询、派生表时 EXPLAIN 有多行，第一行只是驱动表，与结果行数可能差几个数量级，
+        也无法可靠地相乘得到结果行数，这些情况返回 None，由调用方改用精确的 COUNT
+        :return: 估算的行数，不能估算时返回 None
+        """
+        if not plan or len(plan) != 1:
+            return None
+        row = plan[0]
+        if row.get("rows") is None or (row.get("select_type") or "SIMPLE").upper() != "SIMPLE":
+            return None
+        filtered = row.get("filtered")
+        filtered = 100.0 if filtered is None else float(filtered)
+        return int(round(int(row["rows"]) * filtered / 100))
+
+    @staticmethod
+    def parse_keyset_key(keyset_key):
+        """
+        解析游标分页的排序键，"create_time,id" 或 ["t.create_time", "t.id"]
+        :return: [(排序表达式, 结果中的列名)]
+        """
+        if isinstance(keyset_key, str):
+            keyset_key = keyset_key.split(",")
+        key_list = []
+        for key in keyset_key:
+            key = BaseOrm.validate_orderby_inject(str(key).strip())
+            if not key:
+                raise StandardError("keyset_key不能为空")
+            key_list.append((key, key.split(".")[-1].strip("`")))
+        return key_list
+
+    @staticmethod
+    def encode_keyset_cursor(values):
+        return base64.urlsafe_b64encode(JsonTool.to_json(values).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_keyset_cursor(cursor, key_count):
+        try:
+            values = JsonTool.to_dict_or_list(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        except Exception:
+            raise StandardError("cursor[%s]不合法" % cursor)
+        if not isinstance(values, list) or len(values) != key_count:
+            raise StandardError("cursor[%s]与keyset_key不匹配" % cursor)
+        return values
+
+    @staticmethod
+    def get_keyset_condition(key_exprs, cursor, attr_dict, desc=False):
+        """
+        生成 (k1,k2) > (:keyset_0,:keyset_1)，值写入 attr_dict；倒序时用 <
+        """
+        values = BaseOrm.decode_keyset_cursor(cursor, len(key_exprs))
+        names = []
+        for index, value in enumerate(values):
+            attr_dict["keyset_%s" % index] = value
+            names.append(":keyset_%s" % index)
+        return "(%s) %s (%s)" % (",".join(key_exprs), "<" if desc else ">", ",".join(names))
+
+    @staticmethod
+    def build_keyset_page(page_data, key_list, limit, count_total_num=None):
+        # 多查了一行，用来判断是否还有下一页
+        has_more = len(page_data) > limit
+        page_data = page_data[:limit]
+        next_cursor = ""
+        if has_more:
+            last_row = page_data[-1]
+            try:
+                next_cursor = BaseOrm.encode_keyset_cursor([last_row[colname] for _, colname in key_list])
+            except KeyError:
+                raise StandardError("keyset_key中的列必须在查询结果中")
+        return {
+            "datalist": page_data,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "totalcount": count_total_num,
+        }
+
+    @staticmethod
+    def keyset_pagination_sql(sql, keyset_key, limit=20, cursor=None, desc=False, with_total=False,
+                              attr_dict=None, log_trace_id=None, use_connection=None, **kwargs):
+        """
+        游标分页：用 WHERE (key) > (:last) 代替 LIMIT offset，翻到多深都只扫描一页的数据。
+        原SQL作为派生表，排序键使用结果中的列名，排序键组合必须唯一(一般最后带上主键)。
+        :param keyset_key: 排序键，例如 "id" 或 "create_time,id"
+        :param cursor: 上一页返回的 next_cursor，第一页不传
+        :param desc: 是否倒序
+        :param with_total: 是否查询总数，默认不查
+        :return: {"datalist", "limit", "next_cursor", "has_more", "totalcount"}，没有下一页时 next_cursor 为空
+        """
+        limit = int(limit)
+        if limit <= 0:
+            raise StandardError("limit必须大于0")
+        if log_trace_id is None:
+            log_trace_id = get_global_trace_id()
+        attr_dict = dict(attr_dict) if attr_dict else {}
+        key_list = BaseOrm.parse_keyset_key(keyset_key)
+
+        count_total_num = None
+        if with_total:
+            count_data = BaseOrm.execute_select_sql("SELECT COUNT(*) AS totalcount FROM ({}) tmp ".format(sql),
+                                                    attr_dict, log_trace_id=log_trace_id,
+                                                    use_connection=use_connection, **kwargs)
+            count_total_num = count_data[0]["totalcount"] if count_data else 0
+
+        outer_keys = ["`%s`" % colname for _, colname in key_list]
+        page_sql = "SELECT * FROM ({}) keyset_tmp ".format(sql)
+        if cursor:
+            page_sql += "WHERE %s " % BaseOrm.get_keyset_condition(outer_keys, cursor, attr_dict, desc=desc)
+        page_sql += "ORDER BY %s LIMIT :keyset_limit " % ",".join(
+            "%s DESC" % key if desc else key for key in outer_keys)
+        attr_dict["keyset_limit"] = limit + 1
+
+        page_data = BaseOrm.execute_select_sql(page_sql, attr_dict, log_trace_id=log_trace_id,
+                                               use_connection=use_connection, **kwargs)
+        return BaseOrm.build_keyset_page(page_data, key_list, limit, count_total_num)
+
+    @staticmethod
+    def add_condition_param(bind_params, value):
+        name = "p%s" % len(bind_params)
+        bind_params[name] = value
+        return ":%s" % name
 
     @staticmethod
     def get_condition(condition_dict=None, key=None, table_alias="", col_name=None,
-                      contype="IN-EQ", value_type="STR", sql_condition="AND", condition_value=None, ignore_zero=True, ignore_blank=True):
+                      contype="IN-EQ", value_type="STR", sql_condition="AND", condition_value=None, ignore_zero=True, ignore_blank=True,
+                      bind_params=None):
         """
         自动生成查询条件
         :param condition_dict: 条件dict
@@ -456,6 +991,8 @@ class BaseOrm(object):
         :param value_type: 值类型
                NUM 数字类型，不用加引号
                STR 字符串类型，要加引号
+        :param bind_params: 传入dict时不再内联值，而是生成 :p0 这样的绑定参数并把值写入该dict，
+               执行时把该dict作为 attr_dict 传给 execute_select_sql
         :return:
         """
         table_alias_dot = '.' if table_alias else ''
@@ -477,6 +1014,31 @@ class BaseOrm(object):
         else:
             value_quote = "'"
 
+        def quote_value(tmpvalue):
+            if bind_params is not None:
+                if value_quote:
+                    tmpvalue = BaseOrm.escape_string_for_xss(tmpvalue)
+                else:
+                    tmpvalue = BaseOrm.validate_param_number(tmpvalue)
+                return BaseOrm.add_condition_param(bind_params, tmpvalue)
+            return "%s%s%s" % (value_quote,
+                               BaseOrm.escape_all_for_sql(tmpvalue)
+                               if value_quote
+                               else BaseOrm.validate_param_number(tmpvalue),
+                               value_quote)
+
+        def like_value(tmpvalue):
+            if bind_params is not None:
+                return BaseOrm.add_condition_param(bind_params, "%%%s%%" % BaseOrm.escape_string_for_xss(tmpvalue))
+            return "'%%%s%%'" % BaseOrm.escape_all_for_sql(tmpvalue)
+
+        def date_value(tmpvalue, time_suffix):
+            if bind_params is not None:
+                dt = BaseOrm.escape_string_for_xss(tmpvalue)
+                return BaseOrm.add_condition_param(bind_params, f"{dt} {time_suffix}" if len(dt) == 10 else dt)
+            dt = BaseOrm.escape_all_for_sql(tmpvalue)
+            return f"'{dt} {time_suffix}'" if len(dt) == 10 else f"'{dt}'"
+
         if isinstance(value, str) or isinstance(value, int) or isinstance(value, float):
             # 如果是str，切割
             statuslist = str(value).split(",")
@@ -490,21 +1052,13 @@ class BaseOrm(object):
             if len(statuslist) == 0:
                 return ""
             elif len(statuslist) == 1:
-                return " %s %s%s%s=%s%s%s " % (sql_condition, table_alias, table_alias_dot, col_name,
-                                              value_quote,
-                                              BaseOrm.escape_all_for_sql(str(statuslist[0]))
-                                               if value_quote
-                                               else BaseOrm.validate_param_number(str(statuslist[0])),
-                                              value_quote)
+                return " %s %s%s%s=%s " % (sql_condition, table_alias, table_alias_dot, col_name,
+                                           quote_value(str(statuslist[0])))
             else:
                 incondition = ""
                 for tmpstatus in statuslist:
                     if not ignore_blank or str(tmpstatus).strip() != "":
-                        incondition += "%s%s%s," % (value_quote,
-                                                    BaseOrm.escape_all_for_sql(str(tmpstatus).strip())
-                                                    if value_quote
-                                                    else BaseOrm.validate_param_number(str(tmpstatus).strip()),
-                                                    value_quote)
+                        incondition += "%s," % quote_value(str(tmpstatus).strip())
                 incondition = incondition.strip(",")
                 if incondition != "":
                     return " %s %s%s%s IN (%s) " % (sql_condition, table_alias, table_alias_dot, col_name, incondition)
@@ -512,21 +1066,13 @@ class BaseOrm(object):
             if len(statuslist) == 0:
                 return ""
             elif len(statuslist) == 1:
-                return " %s %s%s%s!=%s%s%s " % (sql_condition, table_alias, table_alias_dot, col_name,
-                                             value_quote,
-                                             BaseOrm.escape_all_for_sql(str(statuslist[0]))
-                                                if value_quote
-                                                else BaseOrm.validate_param_number(str(statuslist[0])),
-                                             value_quote)
+                return " %s %s%s%s!=%s " % (sql_condition, table_alias, table_alias_dot, col_name,
+                                            quote_value(str(statuslist[0])))
             else:
                 incondition = ""
                 for tmpstatus in statuslist:
                     if str(tmpstatus).strip() != "":
-                        incondition += "%s%s%s," % (value_quote,
-                                                    BaseOrm.escape_all_for_sql(str(tmpstatus).strip())
-                                                    if value_quote
-                                                    else BaseOrm.validate_param_number(str(tmpstatus).strip()),
-                                                    value_quote)
+                        incondition += "%s," % quote_value(str(tmpstatus).strip())
                 incondition = incondition.strip(",")
                 if incondition != "":
                     return " %s %s%s%s NOT IN (%s) " % (sql_condition, table_alias, table_alias_dot, col_name, incondition)
@@ -534,10 +1080,10 @@ class BaseOrm(object):
             if statuslist:
                 tmpcondition = " %s (" % sql_condition
                 for tmpfollower in statuslist:
-                    tmpcondition += " %s%s%s LIKE '%%%s%%' OR" \
+                    tmpcondition += " %s%s%s LIKE %s OR" \
                                     % (table_alias, table_alias_dot,
                                        col_name,
-                                       BaseOrm.escape_all_for_sql(str(tmpfollower)))
+                                       like_value(str(tmpfollower)))
                 tmpcondition = tmpcondition[:-2]
                 tmpcondition += ") "
                 return tmpcondition
@@ -550,37 +1096,27 @@ class BaseOrm(object):
                         tmptablename = table_alias[tmpcolindex]
                     else:
                         tmptablename = str(table_alias)
-                    tmpcondition += " %s%s%s LIKE '%%%s%%' OR" \
+                    tmpcondition += " %s%s%s LIKE %s OR" \
                                     % (tmptablename, table_alias_dot,
                                        tmpcolname,
-                                       BaseOrm.escape_all_for_sql(str(value)))
+                                       like_value(str(value)))
                 tmpcondition = tmpcondition[:-2]
                 tmpcondition += ") "
                 return tmpcondition
             elif isinstance(col_name, str):
-                return " %s %s%s%s LIKE '%%%s%%' " % (sql_condition, table_alias, table_alias_dot, col_name,
-                                                         BaseOrm.escape_all_for_sql(str(value)))
+                return " %s %s%s%s LIKE %s " % (sql_condition, table_alias, table_alias_dot, col_name,
+                                                like_value(str(value)))
         elif contype.upper() == "LTE_FORDATE":
-            dt = BaseOrm.escape_all_for_sql(str(value))
-            if len(dt) == 10:
-                return " %s %s%s%s<='%s 23:59:59' " % (sql_condition, table_alias, table_alias_dot, col_name, dt)
-            else:
-                return " %s %s%s%s<='%s' " % (sql_condition, table_alias, table_alias_dot, col_name, dt)
+            return " %s %s%s%s<=%s " % (sql_condition, table_alias, table_alias_dot, col_name,
+                                        date_value(str(value), "23:59:59"))
         elif contype.upper() == "GTE_FORDATE":
-            dt = BaseOrm.escape_all_for_sql(str(value))
-            if len(dt) == 10:
-                return " %s %s%s%s>='%s 00:00:00' " % (sql_condition, table_alias, table_alias_dot, col_name, dt)
-            else:
-                return " %s %s%s%s>='%s' " % (sql_condition, table_alias, table_alias_dot, col_name, dt)
+            return " %s %s%s%s>=%s " % (sql_condition, table_alias, table_alias_dot, col_name,
+                                        date_value(str(value), "00:00:00"))
         else:
-            return " %s %s%s%s %s %s%s%s " % (sql_condition, table_alias, table_alias_dot,
-                                             col_name,
-                                             contype,
-                                             value_quote,
-                                             BaseOrm.escape_all_for_sql(str(value))
-                                              if value_quote
-                                              else BaseOrm.validate_param_number(str(value)),
-                                             value_quote)
+            return " %s %s%s%s %s %s " % (sql_condition, table_alias, table_alias_dot,
+                                          col_name,
+                                          contype,
+                                          quote_value(str(value)))
 
 
     @staticmethod
@@ -591,17 +1127,363 @@ class BaseOrm(object):
         if len(value_list) == 0:
             raise StandardError("必须有value")
 
-        sql = "INSERT INTO `%s`(%s) VALUES" % (table_name, "`" + "`,`".join(colname_list) + "`")
+        sql_parts = []
         for i in range(0, len(value_list)):
             insert_values = value_list[i]
             if len(insert_values) != value_len:
                 raise StandardError("第%s个元素长度与列数不符合" % (i+1))
-            sub_insert_sql = "('" + "','".join([BaseOrm.escape_string_for_sql(str(x)) for x in insert_values]) + "'),"
-            sql += sub_insert_sql
-        sql = sql.strip(",")
-        print(sql)
+            sql_parts.append("('" + "','".join([BaseOrm.escape_string_for_sql(str(x)) for x in insert_values]) + "')")
+        sql = "INSERT INTO `%s`(%s) VALUES%s" % (table_name, "`" + "`,`".join(colname_list) + "`", ",".join(sql_parts))
         return BaseOrm.execute_update_sql(sql_str=sql)
 
+    @staticmethod
+    def iter_bind_chunks(colname_list, param_names, rows, chunk_rows, chunk_bytes):
+        """
+        把 rows(与 colname_list 对应的 list/tuple，或 dict)转为绑定参数字典，按行数和估算字节数切块
+        :return: 每块是 [{param_name: value}, ...] 的生成器
+        """
+        normalize = BaseOrm.normalize_bind_value
+        col_count = len(colname_list)
+        row_index = 0
+        chunk, chunk_size_bytes = [], 0
+        for row in rows:
+            row_index += 1
+            if isinstance(row, dict):
+                row = [row.get(col) for col in colname_list]
+            if len(row) != col_count:
+                raise StandardError("第%s行长度与列数不符合" % row_index)
+            params = {}
+            for name, value in zip(param_names, row):
+                value = normalize(value)
+                params[name] = value
+                # 估算该值在 SQL 中占用的字节数
+                chunk_size_bytes += len(value) + 3 if isinstance(value, str) else 8
+            chunk.append(params)
+            if len(chunk) >= chunk_rows or chunk_size_bytes >= chunk_bytes:
+                yield chunk
+                chunk, chunk_size_bytes = [], 0
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def bulk_insert_sql(table_name, colname_list, rows, chunk_rows=1000, chunk_bytes=4 * 1024 * 1024,
+                        commit_per_chunk=True, start_transaction=False, logger_errors=True, log_trace_id=None):
+        """
+        大批量插入：rows 可以是任意可迭代对象/生成器(每行是与 colname_list 对应的 list/tuple，或 dict)，
+        按行数(chunk_rows)和估算字节数(chunk_bytes)切块，每块执行一次参数化 executemany，
+        PyMySQL 会把 executemany 改写成不超过 max_stmt_length 的多行 INSERT，不会撞到 max_allowed_packet。
+        :param commit_per_chunk: 每块提交一次，False 时全部写完再提交；在事务中时都不提交
+        :return: {"rows": 插入行数, "chunks": 块数, "elapsed": 秒, "rows_per_sec": 每秒行数}
+        """
+        col_count = len(colname_list)
+        if not col_count:
+            raise StandardError("必须传入至少1个列")
+        if log_trace_id is None:
+            log_trace_id = get_global_trace_id()
+        param_names = ["c%s" % i for i in range(col_count)]
+        sql = "INSERT INTO `%s`(%s) VALUES (%s)" % (str(table_name).replace("`", ""),
+                                                    ",".join("`%s`" % str(col).replace("`", "") for col in colname_list),
+                                                    ",".join(":%s" % name for name in param_names))
+        statement = text(sql)
+
+        def flush(chunk):
+            t_start = time.time()
+            tsqlend = 0
+            traceback_str = None
+            try:
+                BaseOrm.connection.execute(statement, chunk)
+                QueryCache.invalidate_by_sql(sql)
+                BatchLoader.clear_table(table_name)
+                if commit_per_chunk and not start_transaction:
+                    BaseOrm.commit()
+                tsqlend = time.time()
+            except Exception as e:
+                if logger_errors:
+                    traceback_str = str(traceback.format_exc())
+                    logger.error("bulk_insert_sql:【异常_EXCEPTION_错误_ERROR】 | %s | rows：(%s) | 异常信息 : (%s)"
+                                 % (sql, len(chunk), traceback.format_exc()))
+                raise e
+            finally:
+                BaseOrm.log_sql_result(sql, {"rows": len(chunk)}, t_start, tsqlend or time.time(), time.time(),
+                                       traceback_str, len(chunk), log_trace_id=log_trace_id, database="default",
+                                       rows=len(chunk))
+
+        t_begin = time.time()
+        total_rows, chunk_count = 0, 0
+        for chunk in BaseOrm.iter_bind_chunks(colname_list, param_names, rows, chunk_rows, chunk_bytes):
+            flush(chunk)
+            total_rows += len(chunk)
+            chunk_count += 1
+        if not commit_per_chunk and not start_transaction and chunk_count:
+            BaseOrm.commit()
+
+        elapsed = time.time() - t_begin
+        return {
+            "rows": total_rows,
+            "chunks": chunk_count,
+            "elapsed": elapsed,
+            "rows_per_sec": total_rows / elapsed if elapsed > 0 else 0,
+        }
+
+    @staticmethod
+    def get_dialect_name():
+        # 主库的数据库类型：mysql/sqlite...
+        return db.engine.dialect.name
+
+    @staticmethod
+    def explain_sql(sql_str, attr_dict=None, use_connection=None, log_trace_id=None, **kwargs):
+        """
+        查看 SELECT 的执行计划(MySQL 为 EXPLAIN，SQLite 为 EXPLAIN QUERY PLAN)，和查询一样走从库路由
+        :return: tools.db_tool.explain.parse_plan 的结果，flags 中标出 full_scan/full_index_scan/filesort/temporary
+        """
+        dialect_name = BaseOrm.get_dialect_name()
+        rows = BaseOrm.execute_select_sql(get_explain_prefix(dialect_name) + sql_str, attr_dict,
+                                          log_trace_id=log_trace_id, use_connection=use_connection, **kwargs)
+        return parse_plan(dialect_name, rows)
+
+    @staticmethod
+    def get_primary_keys(table_name):
+        """
+        SQLite 表的主键列，用作 ON CONFLICT 的冲突列
+        """
+        rows = BaseOrm.connection.execute(text("PRAGMA table_info(`%s`)" % table_name)).fetchall()
+        return [row[1] for row in sorted(rows, key=lambda row: row[5]) if row[5]]
+
+    @staticmethod
+    def bulk_upsert_sql(table_name, colname_list, rows, update_fields=None, conflict_fields=None, chunk_rows=1000,
+                        chunk_bytes=4 * 1024 * 1024, commit_per_chunk=True, start_transaction=False,
+                        logger_errors=True, log_trace_id=None):
+        """
+        大批量插入或更新：MySQL 用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite 用 INSERT ... ON CONFLICT DO UPDATE，
+        分块方式同 bulk_insert_sql，每块一次 executemany，PyMySQL 会改写成多行语句。
+        :param update_fields: 主键/唯一键冲突时更新的列，默认为除 id 和 conflict_fields 外的全部列，为空时冲突的行保持不变
+        :param conflict_fields: 冲突判断的列，只对 SQLite 有效(MySQL 按表上全部主键/唯一键判断)，默认为主键
+        :return: {"rows", "inserted", "updated", "chunks", "chunk_stats": [每块的 {"rows", "inserted", "updated"}],
+                  "elapsed", "rows_per_sec"}。
+                  MySQL 的数字由影响行数推算(插入记 1，更新记 2)，连接开启 CLIENT_FOUND_ROWS(SQLAlchemy 默认开启)时
+                  值没有变化的已有行也记 1，会被算作插入
+        """
+        colname_list = [str(col).replace("`", "") for col in colname_list]
+        col_count = len(colname_list)
+        if not col_count:
+            raise StandardError("必须传入至少1个列")
+        if log_trace_id is None:
+            log_trace_id = get_global_trace_id()
+        table_name = str(table_name).replace("`", "")
+        dialect_name = BaseOrm.get_dialect_name()
+        if dialect_name not in ("mysql", "sqlite"):
+            raise StandardError("bulk_upsert 只支持 MySQL 和 SQLite，当前是 %s" % dialect_name)
+        if dialect_name == "sqlite" and not conflict_fields:
+            conflict_fields = BaseOrm.get_primary_keys(table_name)
+        conflict_fields = [str(col).replace("`", "") for col in conflict_fields or []]
+        if update_fields is None:
+            update_fields = [col for col in colname_list if col != "id" and col not in conflict_fields]
+        update_fields = [str(col).replace("`", "") for col in update_fields]
+        if dialect_name == "sqlite":
+            if not conflict_fields or any(col not in colname_list for col in conflict_fields):
+                raise StandardError("SQLite 的 conflict_fields 必须是插入的列")
+            key_indexes = [colname_list.index(col) for col in conflict_fields]
+
+        param_names = ["c%s" % i for i in range(col_count)]
+        sql = "INSERT INTO `%s`(%s) VALUES (%s)" % (table_name, ",".join("`%s`" % col for col in colname_list),
+                                                    ",".join(":%s" % name for name in param_names))
+        if dialect_name == "mysql":
+            # MySQL 8.0.20 起 VALUES() 不推荐使用但仍然有效，5.7 只支持这种写法
+            update_str = ",".join("`%s`=VALUES(`%s`)" % (col, col) for col in update_fields) \
+                or "`%s`=`%s`" % (colname_list[0], colname_list[0])
+            sql += " ON DUPLICATE KEY UPDATE %s" % update_str
+        elif update_fields:
+            sql += " ON CONFLICT(%s) DO UPDATE SET %s" % (",".join("`%s`" % col for col in conflict_fields),
+                                                          ",".join("`%s`=excluded.`%s`" % (col, col)
+                                                                   for col in update_fields))
+        else:
+            sql += " ON CONFLICT(%s) DO NOTHING" % ",".join("`%s`" % col for col in conflict_fields)
+        statement = text(sql)
+
+        def count_existing(chunk):
+            # SQLite 的影响行数不区分插入和更新，先查出块内已存在的 key
+            keys = list(set(tuple(params[param_names[index]] for index in key_indexes) for params in chunk))
+            existing = 0
+            # 老版本 SQLite 一条语句最多 999 个参数
+            step = max(999 // len(key_indexes), 1)
+            for start in range(0, len(keys), step):
+                key_params, key_parts = {}, []
+                for key_index, key in enumerate(keys[start:start + step]):
+                    names = []
+                    for col_index, value in enumerate(key):
+                        name = "k%s_%s" % (key_index, col_index)
+                        key_params[name] = value
+                        names.append(":" + name)
+                    key_parts.append("(%s)" % ",".join(names))
+                key_sql = "SELECT COUNT(*) FROM `%s` WHERE (%s) IN (VALUES %s)" % (
+                    table_name, ",".join("`%s`" % col for col in conflict_fields), ",".join(key_parts))
+                existing += BaseOrm.connection.execute(text(key_sql), key_params).scalar()
+            return len(keys), existing
+
+        def flush(chunk):
+            t_start = time.time()
+            tsqlend = 0
+            traceback_str = None
+            stats = {"rows": len(chunk), "inserted": 0, "updated": 0}
+            try:
+                if dialect_name == "sqlite":
+                    key_count, existing = count_existing(chunk)
+                    BaseOrm.connection.execute(statement, chunk)
+                    stats["inserted"] = key_count - existing
+                    stats["updated"] = len(chunk) - stats["inserted"] if update_fields else 0
+                else:
+                    affected = BaseOrm.connection.execute(statement, chunk).rowcount
+                    stats["updated"] = min(max(affected - len(chunk), 0), len(chunk))
+                    stats["inserted"] = min(affected, len(chunk)) - stats["updated"]
+                QueryCache.invalidate_by_sql(sql)
+                BatchLoader.clear_table(table_name)
+                if commit_per_chunk and not start_transaction:
+                    BaseOrm.commit()
+                tsqlend = time.time()
+                return stats
+            except Exception as e:
+                if logger_errors:
+                    traceback_str = str(traceback.format_exc())
+                    logger.error("bulk_upsert_sql:【异常_EXCEPTION_错误_ERROR】 | %s | rows：(%s) | 异常信息 : (%s)"
+                                 % (sql, len(chunk), traceback.format_exc()))
+                raise e
+            finally:
+                BaseOrm.log_sql_result(sql, stats, t_start, tsqlend or time.time(), time.time(),
+                                       traceback_str, len(chunk), log_trace_id=log_trace_id, database="default",
+                                       rows=len(chunk))
+
+        t_begin = time.time()
+        chunk_stats = []
+        for chunk in BaseOrm.iter_bind_chunks(colname_list, param_names, rows, chunk_rows, chunk_bytes):
+            chunk_stats.append(flush(chunk))
+        if not commit_per_chunk and not start_transaction and chunk_stats:
+            BaseOrm.commit()
+
+        elapsed = time.time() - t_begin
+        total_rows = sum(stats["rows"] for stats in chunk_stats)
+        return {
+            "rows": total_rows,
+            "inserted": sum(stats["inserted"] for stats in chunk_stats),
+            "updated": sum(stats["updated"] for stats in chunk_stats),
+            "chunks": len(chunk_stats),
+            "chunk_stats": chunk_stats,
+            "elapsed": elapsed,
+            "rows_per_sec": total_rows / elapsed if elapsed > 0 else 0,
+        }
+
+    @staticmethod
+    def build_bulk_update_sql(table_name, key, columns, chunk):
+        """
+        :param chunk: {key值: {列名: 值}}
+        :return: (sql, 绑定参数)，每列一个 CASE `key` WHEN :k0 THEN :v0_0 ... ELSE `列` END，行里没有的列保持原值
+        """
+        params, key_names = {}, []
+        whens = dict((col, []) for col in columns)
+        for row_index, (key_value, row) in enumerate(chunk.items()):
+            key_name = "k%s" % row_index
+            params[key_name] = key_value
+            key_names.append(":" + key_name)
+            for col_index, col in enumerate(columns):
+                if col in row:
+                    value_name = "v%s_%s" % (row_index, col_index)
+                    params[value_name] = row[col]
+                    whens[col].append("WHEN :%s THEN :%s" % (key_name, value_name))
+        set_parts = ["`%s`=CASE `%s` %s ELSE `%s` END" % (col, key, " ".join(whens[col]), col)
+                     for col in columns if whens[col]]
+        sql = "UPDATE `%s` SET %s WHERE `%s` IN (%s)" % (table_name, ",".join(set_parts), key, ",".join(key_names))
+        return sql, params
+
+    @staticmethod
+    def bulk_update_sql(table_name, rows, key="id", chunk_rows=500, commit_per_chunk=True, start_transaction=False,
+                        logger_errors=True, log_trace_id=None):
+        """
+        大批量更新，每行更新为不同的值：按 chunk_rows 分块，每块编译成一条
+        UPDATE t SET col = CASE key WHEN :k0 THEN :v0_0 ... END WHERE key IN (:k0, ...)，值都用绑定参数。
+        同一个 key 出现多次时后面的值覆盖前面的。
+        :param rows: dict 的可迭代对象，每个 dict 必须包含 key 列，其余的列为要更新的值，各行的列可以不同
+        :param key: 定位行的列，通常是主键 id
+        :return: {"rows": 行数, "affected": 影响行数, "chunks": 块数, "chunk_stats": [每块的 {"rows", "affected"}],
+                  "elapsed": 秒, "rows_per_sec": 每秒行数}。
+                  MySQL 连接开启 CLIENT_FOUND_ROWS(SQLAlchemy 默认开启)时影响行数是匹配的行数，包括值没有变化的行
+        """
+        table_name = str(table_name).replace("`", "")
+        key = str(key).replace("`", "")
+        if log_trace_id is None:
+            log_trace_id = get_global_trace_id()
+        normalize = BaseOrm.normalize_bind_value
+        # 各块的行数和列相同时 SQL 相同，复用 text() 对象，省去每块重新解析上千个占位符
+        statements = {}
+
+        def flush(chunk):
+            t_start = time.time()
+            tsqlend = 0
+            traceback_str = None
+            stats = {"rows": len(chunk), "affected": 0}
+            columns = []
+            for row in chunk.values():
+                for col in row:
+                    if col not in columns:
+                        columns.append(col)
+            # 日志里只记录语句的形状，完整语句的参数占位符和行数成正比
+            log_sql = "UPDATE `%s` SET %s WHERE `%s` IN (...)" % (
+                table_name, ",".join("`%s`=CASE `%s` ... END" % (col, key) for col in columns), key)
+            try:
+                if columns:
+                    sql, params = BaseOrm.build_bulk_update_sql(table_name, key, columns, chunk)
+                    statement = statements.get(sql)
+                    if statement is None:
+                        if len(statements) >= 8:
+                            statements.clear()
+                        statement = statements[sql] = text(sql)
+                    stats["affected"] = BaseOrm.connection.execute(statement, params).rowcount
+                    QueryCache.invalidate_by_sql(sql)
+                    BatchLoader.clear_table(table_name)
+                    if commit_per_chunk and not start_transaction:
+                        BaseOrm.commit()
+                tsqlend = time.time()
+                return stats
+            except Exception as e:
+                if logger_errors:
+                    traceback_str = str(traceback.format_exc())
+                    logger.error("bulk_update_sql:【异常_EXCEPTION_错误_ERROR】 | %s | rows：(%s) | 异常信息 : (%s)"
+                                 % (log_sql, len(chunk), traceback.format_exc()))
+                raise e
+            finally:
+                BaseOrm.log_sql_result(log_sql, {"rows": len(chunk)}, t_start, tsqlend or time.time(), time.time(),
+                                       traceback_str, stats["affected"], log_trace_id=log_trace_id,
+                                       database="default", rows=stats["affected"])
+
+        t_begin = time.time()
+        chunk_stats = []
+        chunk = {}
+        row_index = 0
+        for row in rows:
+            row_index += 1
+            if key not in row:
+                raise StandardError("第%s行没有 %s 列" % (row_index, key))
+            key_value = normalize(row[key])
+            values = chunk.setdefault(key_value, {})
+            for col, value in row.items():
+                if col != key:
+                    values[str(col).replace("`", "")] = normalize(value)
+            if len(chunk) >= chunk_rows:
+                chunk_stats.append(flush(chunk))
+                chunk = {}
+        if chunk:
+            chunk_stats.append(flush(chunk))
+        if not commit_per_chunk and not start_transaction and chunk_stats:
+            BaseOrm.commit()
+
+        elapsed = time.time() - t_begin
+        total_rows = sum(stats["rows"] for stats in chunk_stats)
+        return {
+            "rows": total_rows,
+            "affected": sum(stats["affected"] for stats in chunk_stats),
+            "chunks": len(chunk_stats),
+            "chunk_stats": chunk_stats,
+            "elapsed": elapsed,
+            "rows_per_sec": total_rows / elapsed if elapsed > 0 else 0,
+        }
 
 if __name__ == "__main__":
     res = BaseOrm.execute_select_sql("select * from users where id=46")
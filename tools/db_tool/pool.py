@@ -0,0 +1,159 @@
+import bisect
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 等待连接耗时直方图上界(秒)，最后一个桶是 +Inf
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    记录取连接等待时间和失败(等待超时、连接失败)次数的 QueuePool，engine.dispose() 重建连接池后统计从零开始
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        t_start = time.perf_counter()
+        try:
+            connection = super(InstrumentedQueuePool, self)._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.checkout_failures += 1
+            raise
+        elapsed = time.perf_counter() - t_start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_sum += elapsed
+            if elapsed > self.wait_max:
+                self.wait_max = elapsed
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, elapsed)] += 1
+        return connection
+
+
+def build_engine_options(config):
+    """
+    根据 DB_POOL_* 配置生成 SQLALCHEMY_ENGINE_OPTIONS，内存 SQLite 只能用 StaticPool，不设置连接池大小
+    """
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    options.setdefault("pool_pre_ping", config.get("DB_POOL_PRE_PING", True))
+    options.setdefault("pool_recycle", config.get("DB_POOL_RECYCLE", 3600))
+    uri = config.get("SQLALCHEMY_DATABASE_URI") or ""
+    if uri in ("sqlite://", "sqlite:///:memory:"):
+        return options
+    if uri.startswith("sqlite"):
+        # 文件 SQLite 用 QueuePool 时连接会在线程间复用
+        options.setdefault("connect_args", {"check_same_thread": False})
+    options.setdefault("poolclass", InstrumentedQueuePool)
+    options.setdefault("pool_size", config.get("DB_POOL_SIZE", 10))
+    options.setdefault("max_overflow", config.get("DB_POOL_MAX_OVERFLOW", 10))
+    options.setdefault("pool_timeout", config.get("DB_POOL_TIMEOUT", 30))
+    return options
+
+
+class PoolStats(object):
+    """
+    连接池统计：按 bind 名(default、replica_0...)注册 engine，
+    记录新建连接、失效连接，并禁止 fork 出的子进程使用父进程建立的连接(预热发生在 fork 前时)
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.connects = {}
+        self.invalidations = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, engine):
+        with self._lock:
+            if self.engines.get(name) is engine:
+                return
+            self.engines[name] = engine
+            self.connects.setdefault(name, 0)
+            self.invalidations.setdefault(name, 0)
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            connection_record.info["pid"] = os.getpid()
+            self.connects[name] += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            if connection_record.info.get("pid") != os.getpid():
+                # 父进程的连接，丢弃后连接池会重新建立
+                connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+                raise exc.DisconnectionError("connection record belongs to pid %s, attempting to check out in pid %s"
+                                             % (connection_record.info.get("pid"), os.getpid()))
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations[name] += 1
+
+    def warm(self, name, count):
+        """
+        预先建立 count 个连接放回连接池，返回实际建立的个数
+        """
+        engine = self.engines.get(name)
+        if engine is None or count <= 0:
+            return 0
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(engine.connect())
+        except Exception as e:
+            logger.warning("连接池[%s]预热失败：%s" % (name, e))
+        finally:
+            for connection in connections:
+                connection.close()
+        return len(connections)
+
+    @staticmethod
+    def pool_brief(pool):
+        brief = {"pool": type(pool).__name__}
+        for key, method in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"),
+                            ("overflow", "overflow")):
+            if hasattr(pool, method):
+                brief[key] = getattr(pool, method)()
+        return brief
+
+    def brief(self, name):
+        # 写进 SQL 日志的简要信息，只读几个计数，不加锁
+        engine = self.engines.get(name)
+        if engine is None:
+            return None
+        return self.pool_brief(engine.pool)
+
+    def snapshot(self):
+        result = {}
+        for name, engine in list(self.engines.items()):
+            pool = engine.pool
+            stats = self.pool_brief(pool)
+            stats["connects"] = self.connects.get(name, 0)
+            stats["invalidations"] = self.invalidations.get(name, 0)
+            if isinstance(pool, InstrumentedQueuePool):
+                with pool._stats_lock:
+                    stats["checkouts"] = pool.checkouts
+                    stats["checkout_failures"] = pool.checkout_failures
+                    stats["wait_sum_ms"] = round(pool.wait_sum * 1000, 3)
+                    stats["wait_max_ms"] = round(pool.wait_max * 1000, 3)
+                    cumulative = 0
+                    buckets = {}
+                    for index, upper in enumerate(WAIT_BUCKETS + ("+Inf",)):
+                        cumulative += pool.wait_buckets[index]
+                        buckets[str(upper)] = cumulative
+                    stats["wait_seconds_bucket"] = buckets
+            result[name] = stats
+        return result
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+
+from tools.trace_context import get_trace_id
+from tools.util import JsonTool
+from project import get_app
+from project.extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 写语句影响的表：INSERT INTO t / UPDATE t / DELETE FROM t / REPLACE INTO t
+WRITE_TABLE_PATTERN = re.compile(r"^\s*(?:insert\s+(?:ignore\s+)?into|replace\s+into|update|delete\s+from)\s+`?(\w+)`?",
+                                 re.IGNORECASE)
+# 读语句涉及的表：FROM t / JOIN t
+READ_TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+`?(\w+)`?", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class QueryCache(object):
+    """
+    DORM 查询结果缓存(Redis)。
+    每张表有一个版本号 dorm:qc:tag:<table>，缓存key由 SQL、参数 和 所读各表的版本号 共同决定，
+    写表时只需 INCR 版本号，旧缓存自然不再被命中，随 TTL 过期。
+    """
+    KEY_PREFIX = "dorm:qc:"
+    TAG_PREFIX = "dorm:qc:tag:"
+    LOCK_PREFIX = "dorm:qc:lock:"
+
+    # 写过但还没提交的表，提交时再失效一次，避免提交前被并发读回填旧数据
+    _pending = threading.local()
+
+    @staticmethod
+    def enabled():
+        return bool(get_app().config.get("DORM_QUERY_CACHE_ENABLED", False))
+
+    @staticmethod
+    def normalize_sql(sql_str):
+        return WHITESPACE_PATTERN.sub(" ", sql_str).strip()
+
+    @staticmethod
+    def get_read_tables(sql_str):
+        return sorted(set(t.lower() for t in READ_TABLE_PATTERN.findall(sql_str)))
+
+    @staticmethod
+    def get_write_table(sql_str):
+        match = WRITE_TABLE_PATTERN.match(sql_str)
+        return match.group(1).lower() if match else None
+
+    @staticmethod
+    def build_key(sql_str, attr_dict, tables, tag_versions, options=None):
+        raw = JsonTool.to_json([QueryCache.normalize_sql(sql_str), attr_dict or {}, tables, tag_versions,
+                                options or {}])
+        return QueryCache.KEY_PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_or_load(sql_str, attr_dict, tables, loader, ttl=None, options=None,
+                    lock_ttl=10, wait_timeout=3, force=False):
+        """
+        先查缓存，未命中时执行 loader() 并写入缓存。
+        防击穿：同一个key只有拿到锁(SET NX)的请求去查库，其他请求短暂轮询等待结果，等待超时再自己查库。
+        Redis 出任何问题都直接查库，缓存不影响业务。
+        :param tables: 查询涉及的表，用于失效
+        :param ttl: 过期秒数，默认取配置 DORM_QUERY_CACHE_TTL，实际过期时间会加 0~10% 的随机抖动
+        :param options: 影响结果的其他参数(例如 json_list_keys)，参与计算key
+        :param force: 为 True 时不受 DORM_QUERY_CACHE_ENABLED 控制，此时写表不会失效，只靠 TTL 过期(如分页总数)
+        """
+        if not force and not QueryCache.enabled():
+            return loader()
+        if ttl is None:
+            ttl = get_app().config.get("DORM_QUERY_CACHE_TTL", 60)
+        tables = sorted(set(t.lower() for t in tables))
+
+        try:
+            tag_versions = redis_client.mget([QueryCache.TAG_PREFIX + t for t in tables]) if tables else []
+            cache_key = QueryCache.build_key(sql_str, attr_dict, tables, tag_versions, options)
+            cached = redis_client.get(cache_key)
+            if cached is not None:
+                return JsonTool.to_dict_or_list(cached)
+        except Exception:
+            logger.error("QueryCache read failed [trace_id=%s]: %s" % (get_trace_id(), traceback.format_exc()))
+            return loader()
+
+        lock_key = QueryCache.LOCK_PREFIX + cache_key[len(QueryCache.KEY_PREFIX):]
+        try:
+            # 锁的值是持锁请求的 trace id，排查击穿等待时可以直接 GET 锁找到对应请求的 SQL 日志
+            got_lock = redis_client.set(lock_key, get_trace_id(), nx=True, ex=lock_ttl)
+        except Exception:
+            got_lock = False
+
+        if not got_lock:
+            # 别的请求正在查库，等它回填
+            deadline = time.time() + wait_timeout
+            while time.time() < deadline:
+                time.sleep(0.02)
+                try:
+                    cached = redis_client.get(cache_key)
+                except Exception:
+                    break
+                if cached is not None:
+                    return JsonTool.to_dict_or_list(cached)
+            return loader()
+
+        try:
+            result = loader()
+            try:
+                redis_client.set(cache_key, JsonTool.to_json(result), ex=int(ttl * (1 + random.random() * 0.1)) or 1)
+            except Exception:
+                logger.error("QueryCache write failed [trace_id=%s]: %s" % (get_trace_id(), traceback.format_exc()))
+            return result
+        finally:
+            try:
+                redis_client.delete(lock_key)
+            except Exception:
+                pass
+
+    @staticmethod
+    def invalidate(*tables):
+        if not tables or not QueryCache.enabled():
+            return
+        try:
+            pipe = redis_client.pipeline()
+            for table in set(t.lower() for t in tables):
+                pipe.incr(QueryCache.TAG_PREFIX + table)
+            pipe.execute()
+        except Exception:
+            logger.error("QueryCache invalidate failed [trace_id=%s]: %s" % (get_trace_id(), traceback.format_exc()))
+
+    @staticmethod
+    def invalidate_by_sql(sql_str):
+        """
+        写语句执行后调用：立即 INCR 一次版本号，并把表记入待失效，在 commit/rollback(BaseOrm.commit、Atomic)后再 INCR 一次。
+        语句执行到提交之间，并发的读仍会读到提交前的数据，并用新版本号回填缓存，只有提交后的失效才能清掉它，
+        所以自动提交的写也要等提交后再失效
+        """
+        if not QueryCache.enabled():
+            return
+        table = QueryCache.get_write_table(sql_str)
+        if not table:
+            return
+        QueryCache.invalidate(table)
+        pending = getattr(QueryCache._pending, "tables", None)
+        if pending is None:
+            pending = QueryCache._pending.tables = set()
+        pending.add(table)
+
+    @staticmethod
+    def flush_pending():
+        # 事务提交/回滚后调用
+        pending = getattr(QueryCache._pending, "tables", None)
+        if pending:
+            QueryCache._pending.tables = set()
+            QueryCache.invalidate(*pending)
@@ -0,0 +1,103 @@
+import itertools
+import logging
+import threading
+import time
+import traceback
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaNode(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.healthy = True
+        self.lag = None
+        self.checked_at = 0
+
+    def to_dict(self):
+        return {"name": self.name, "healthy": self.healthy, "lag": self.lag, "checked_at": self.checked_at}
+
+
+class ReplicaRouter(object):
+    """
+    读库路由：SQLALCHEMY_BINDS 中 replica_ 开头的 bind 都是从库，SELECT 轮询分配到健康的从库。
+    每个从库最多每 DB_REPLICA_CHECK_INTERVAL 秒用 DB_REPLICA_LAG_SQL 检查一次延迟，
+    延迟超过 DB_REPLICA_MAX_LAG 秒、复制中断或连接失败的从库在下次检查前不再分配，全部不可用时走主库。
+    """
+    BIND_PREFIX = "replica_"
+
+    def __init__(self, db, app_getter):
+        """
+        :param app_getter: 返回当前 app 的函数，每次用到配置和 engine 时才调用
+        """
+        self.db = db
+        self.app_getter = app_getter
+        self._nodes = None
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def nodes(self):
+        if self._nodes is None:
+            binds = self.app_getter().config.get("SQLALCHEMY_BINDS") or {}
+            self._nodes = [ReplicaNode(name) for name in sorted(binds) if name.startswith(self.BIND_PREFIX)]
+        return self._nodes
+
+    def get_engine(self, node):
+        return self.db.get_engine(self.app_getter(), bind=node.name)
+
+    def choose(self):
+        """
+        :return: 可用的从库节点，没有可用从库时返回 None
+        """
+        nodes = self.nodes
+        if not nodes:
+            return None
+        start = next(self._counter)
+        for offset in range(len(nodes)):
+            node = nodes[(start + offset) % len(nodes)]
+            self.check(node)
+            if node.healthy:
+                return node
+        return None
+
+    def check(self, node, force=False):
+        config = self.app_getter().config
+        interval = config.get("DB_REPLICA_CHECK_INTERVAL", 5)
+        if not force and time.time() - node.checked_at < interval:
+            return node.healthy
+        with self._lock:
+            if not force and time.time() - node.checked_at < interval:
+                return node.healthy
+            node.checked_at = time.time()
+        lag_sql = config.get("DB_REPLICA_LAG_SQL")
+        if not lag_sql:
+            node.healthy = True
+            return True
+        try:
+            rows = self.get_engine(node).execute(text(lag_sql)).fetchall()
+            lag = None
+            if rows:
+                row = dict(rows[0]._mapping)
+                lag = row.get("Seconds_Behind_Master", row.get("Seconds_Behind_Source"))
+            node.lag = lag
+            node.healthy = lag is not None and int(lag) <= config.get("DB_REPLICA_MAX_LAG", 5)
+            if not node.healthy:
+                logger.warning("从库[%s]延迟[%s]秒，暂时切回主库" % (node.name, lag))
+        except Exception:
+            node.lag = None
+            node.healthy = False
+            logger.warning("从库[%s]延迟检查失败，暂时切回主库：%s" % (node.name, traceback.format_exc()))
+        return node.healthy
+
+    def mark_down(self, name):
+        for node in self.nodes:
+            if node.name == name:
+                node.healthy = False
+                node.checked_at = time.time()
+
+    def stats(self):
+        return [node.to_dict() for node in self.nodes]
@@ -0,0 +1,182 @@
+import datetime
+import decimal
+from operator import itemgetter
+
+from tools.util import JsonTool
+
+DEFAULT_DATE = "1970-01-02"
+DEFAULT_TIME = "1970-01-02 00:00:00"
+DEFAULT_DATETIME = datetime.datetime(1970, 1, 2)
+DEFAULT_DATE_VALUE = datetime.date(1970, 1, 2)
+
+
+def convert_json_list(value):
+    # 如果为空或者不合法，就是空列表
+    return JsonTool.to_dict_or_list(value) if value else []
+
+
+def convert_json_dict(value):
+    # 如果为空或者不合法，就是空字典
+    return JsonTool.to_dict_or_list(value) if value else {}
+
+
+def convert_datetime(value):
+    if isinstance(value, datetime.datetime):
+        value_str = value.strftime('%Y-%m-%d %H:%M:%S')
+        return "" if value_str == DEFAULT_TIME else value_str
+    return value
+
+
+def convert_date(value):
+    if isinstance(value, datetime.date):
+        value_str = value.strftime('%Y-%m-%d')
+        return "" if value_str == DEFAULT_DATE else value_str
+    return value
+
+
+def clear_default_datetime(value):
+    # 按列取数时保留 datetime/date 对象，只把 1970-01-02 默认时间当作空值
+    if isinstance(value, datetime.datetime):
+        return None if value == DEFAULT_DATETIME else value
+    if isinstance(value, datetime.date):
+        return None if value == DEFAULT_DATE_VALUE else value
+    return value
+
+
+def convert_zero_date_str(value):
+    if isinstance(value, str) and value.startswith("0000-00-00"):
+        return ""
+    return value
+
+
+def convert_decimal_to_float(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def get_sample_value(rows, index):
+    # 取该列第一个非空值，按列取数时用来推断数组类型
+    for row in rows:
+        value = row[index]
+        if value is not None:
+            return value
+    return None
+
+
+# 每种类型对应的转换函数，转换函数内部仍判断类型，列中的 NULL 和其他类型原样返回
+KIND_CONVERTERS = {
+    "datetime": convert_datetime,
+    "date": convert_date,
+    "str": convert_zero_date_str,
+    "decimal": convert_decimal_to_float,
+}
+
+
+def get_value_kind(value_type):
+    # datetime 是 date 的子类，要先判断
+    if issubclass(value_type, datetime.datetime):
+        return "datetime"
+    if issubclass(value_type, datetime.date):
+        return "date"
+    if issubclass(value_type, str):
+        return "str"
+    if issubclass(value_type, decimal.Decimal):
+        return "decimal"
+    return None
+
+
+def make_mixed_converter(colname, decimal_to_float, keep_datetime=False):
+    """
+    同一列出现多种需要转换的类型时(如 SQLite 的弱类型列)，退回逐单元格判断，规则与原先完全一致
+    """
+    check_zero_date = colname.endswith("_date") or colname.endswith("_time")
+
+    def convert(value):
+        if keep_datetime:
+            value = clear_default_datetime(value)
+        elif isinstance(value, datetime.datetime):
+            value = convert_datetime(value)
+        elif isinstance(value, datetime.date):
+            value = convert_date(value)
+        elif check_zero_date and isinstance(value, str):
+            value = convert_zero_date_str(value)
+        if decimal_to_float and isinstance(value, decimal.Decimal):
+            value = float(value)
+        return value
+    return convert
+
+
+def build_converter_plan(col_names, rows, json_list_keys=None, json_dict_keys=None, decimal_to_float=False,
+                         keep_datetime=False):
+    """
+    根据列名、请求参数和这批行中每一列实际出现的类型选好转换函数，只返回需要转换的列：[(列名, 下标, 转换函数)]
+    规则与原先逐单元格判断一致：json列 > datetime > date > 以 _date/_time 结尾的字符串列，最后处理 decimal。
+    每列只收集一次类型集合(C 层遍历)，只有一种需要转换的类型时用专门的转换函数，有多种时逐单元格判断，
+    所以弱类型列、流式读取时某一批整列为 NULL 等情况的结果也与逐单元格判断相同
+    :param keep_datetime: 按列取数使用，datetime/date 不格式化为字符串，只把默认时间置为 None，字符串列不处理
+    """
+    json_list_keys = set(json_list_keys) if isinstance(json_list_keys, list) else set()
+    json_dict_keys = set(json_dict_keys) if isinstance(json_dict_keys, list) else set()
+    plan = []
+    for index, colname in enumerate(col_names):
+        if colname in json_list_keys:
+            plan.append((colname, index, convert_json_list))
+            continue
+        if colname in json_dict_keys:
+            plan.append((colname, index, convert_json_dict))
+            continue
+
+        kinds = {get_value_kind(value_type) for value_type in set(map(type, map(itemgetter(index), rows)))}
+        if not (colname.endswith("_date") or colname.endswith("_time")):
+            kinds.discard("str")
+        if not decimal_to_float:
+            kinds.discard("decimal")
+        if keep_datetime:
+            kinds.discard("str")
+        kinds.discard(None)
+        if len(kinds) > 1:
+            plan.append((colname, index, make_mixed_converter(colname, decimal_to_float, keep_datetime)))
+        elif kinds:
+            kind = kinds.pop()
+            if keep_datetime and kind in ("datetime", "date"):
+                plan.append((colname, index, clear_default_datetime))
+            else:
+                plan.append((colname, index, KIND_CONVERTERS[kind]))
+    return plan
+
+
+def convert_rows(col_names, rows, json_list_keys=None, json_dict_keys=None, decimal_to_float=False):
+    """
+    把数据库返回的行转换为dict列表，转换计划每批结果只生成一次，不需要转换的列直接 zip
+    """
+    plan = build_converter_plan(col_names, rows, json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
+                                decimal_to_float=decimal_to_float)
+    if not plan:
+        return [dict(zip(col_names, row_data)) for row_data in rows]
+
+    result = []
+    for row_data in rows:
+        obj_dict = dict(zip(col_names, row_data))
+        for colname, index, converter in plan:
+            obj_dict[colname] = converter(row_data[index])
+        result.append(obj_dict)
+    return result
+
+
+def convert_tuples(col_names, rows, json_list_keys=None, json_dict_keys=None, decimal_to_float=False):
+    """
+    与 convert_rows 的转换规则相同，但每行返回 tuple，不创建 dict
+    """
+    plan = build_converter_plan(col_names, rows, json_list_keys=json_list_keys, json_dict_keys=json_dict_keys,
+                                decimal_to_float=decimal_to_float)
+    if not plan:
+        return [tuple(row_data) for row_data in rows]
+
+    result = []
+    for row_data in rows:
+        values = list(row_data)
+        for colname, index, converter in plan:
+            values[index] = converter(row_data[index])
+        result.append(tuple(values))
+    return result
@@ -0,0 +1,139 @@
+import collections
+import datetime
+import keyword
+import threading
+
+# DORM.execute 的 obj_type 可选的轻量结果类型
+COMPACT_OBJ_TYPES = ("row", "namedtuple", "tuple")
+# 行对象自己的方法名，同名的列也按下标改名
+RESERVED_NAMES = ("get", "get_attrs", "to_tuple")
+
+
+def get_attr_names(col_names):
+    # 列名不是合法标识符(如 count(*)、重复列)时按下标改名为 _0、_1，与 namedtuple(rename=True) 的规则一致
+    attr_names = []
+    seen = set()
+    for index, name in enumerate(col_names):
+        if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_") or name in seen \
+                or name in RESERVED_NAMES:
+            name = "_%s" % index
+        seen.add(name)
+        attr_names.append(name)
+    return tuple(attr_names)
+
+
+class SlotRow(object):
+    """
+    查询结果行的基类，具体的行类按 (表名, 列名) 生成，只有 __slots__，没有实例 __dict__。
+    接口与 DORM 的行对象一致：属性访问、get、get_attrs
+    """
+    __slots__ = ()
+    _fields = ()
+    _attrs = ()
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def get_attrs(self, whether_jsonable=False):
+        attrdict = {}
+        for name, attr in zip(self._fields, self._attrs):
+            value = getattr(self, attr)
+            if whether_jsonable and isinstance(value, (datetime.datetime, datetime.date)):
+                value = str(value).split(".")[0]
+            attrdict[name] = value
+        return attrdict
+
+    def to_tuple(self):
+        return tuple(getattr(self, attr) for attr in self._attrs)
+
+    def __iter__(self):
+        return iter(self.to_tuple())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_tuple() == other.to_tuple()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % item for item in self.get_attrs().items()))
+
+
+class RowTypeFactory(object):
+    """
+    按 (表名, 列名) 缓存生成的行类，同一个查询的每行共用一个类
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._slot_classes = {}
+        self._namedtuple_classes = {}
+        self._lock = threading.Lock()
+
+    def get_slot_class(self, table_name, col_names):
+        key = (table_name, tuple(col_names))
+        row_class = self._slot_classes.get(key)
+        if row_class is None:
+            row_class = self.cache(self._slot_classes, key, self.build_slot_class(table_name, col_names))
+        return row_class
+
+    def get_namedtuple_class(self, table_name, col_names):
+        key = (table_name, tuple(col_names))
+        row_class = self._namedtuple_classes.get(key)
+        if row_class is None:
+            row_class = self.cache(self._namedtuple_classes, key, self.build_namedtuple_class(table_name, col_names))
+        return row_class
+
+    def cache(self, classes, key, row_class):
+        with self._lock:
+            if len(classes) >= self.max_size:
+                classes.pop(next(iter(classes)))
+            return classes.setdefault(key, row_class)
+
+    @staticmethod
+    def get_class_name(table_name):
+        name = "".join(char if char.isalnum() else "_" for char in str(table_name))
+        return "%sRow" % name.title().replace("_", "")
+
+    @staticmethod
+    def build_slot_class(table_name, col_names):
+        attr_names = get_attr_names(col_names)
+        # 按列生成 __init__，逐个 setattr 构造一行要慢 3 倍以上；属性名都是合法标识符
+        init_src = "def __init__(self, %s):\n    %s\n" % (
+            ", ".join(attr_names), "\n    ".join("self.%s = %s" % (name, name) for name in attr_names)) \
+            if attr_names else "def __init__(self):\n    pass\n"
+        namespace = {}
+        exec(init_src, namespace)
+        return type(RowTypeFactory.get_class_name(table_name), (SlotRow,), {
+            "__slots__": attr_names,
+            "__init__": namespace["__init__"],
+            "_fields": tuple(col_names),
+            "_attrs": attr_names,
+        })
+
+    @staticmethod
+    def build_namedtuple_class(table_name, col_names):
+        base = collections.namedtuple(RowTypeFactory.get_class_name(table_name), get_attr_names(col_names),
+                                      rename=True)
+        fields = tuple(col_names)
+
+        def get(self, name, default=None):
+            return getattr(self, name, default)
+
+        def get_attrs(self, whether_jsonable=False):
+            attrdict = {}
+            for name, value in zip(fields, self):
+                if whether_jsonable and isinstance(value, (datetime.datetime, datetime.date)):
+                    value = str(value).split(".")[0]
+                attrdict[name] = value
+            return attrdict
+
+        return type(base.__name__, (base,), {"__slots__": (), "get": get, "get_attrs": get_attrs})
+
+    def build_rows(self, obj_type, table_name, col_names, rows):
+        """
+        :param rows: 已转换好的元组列表
+        """
+        if obj_type == "tuple":
+            return rows
+        if obj_type == "namedtuple":
+            return list(map(self.get_namedtuple_class(table_name, col_names)._make, rows))
+        row_class = self.get_slot_class(table_name, col_names)
+        return [row_class(*row) for row in rows]
@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+
+
+def in_arity_bucket(count):
+    """
+    IN 列表长度分桶：向上取到 2 的幂，多余的位置用最后一个值补齐，
+    这样 IN (1,2,3) 和 IN (4,5,6) 会落在同一个 SQL 骨架上。
+    """
+    if count <= 1:
+        return 1
+    bucket = 1
+    while bucket < count:
+        bucket <<= 1
+    return bucket
+
+
+class SqlSkeletonCache(object):
+    """
+    按查询"形状"缓存 SQL 骨架(只含 :p0 这类绑定参数占位符，不含具体值)，
+    形状一致的查询直接复用骨架，跳过字符串拼接。
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # 读不加锁，命中时不调整顺序，超出容量时按写入先后淘汰(FIFO)，热点骨架被淘汰后会很快重新写入
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"size": len(self._cache), "hits": self.hits, "misses": self.misses}
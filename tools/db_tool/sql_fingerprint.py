@@ -0,0 +1,38 @@
+import hashlib
+import re
+from functools import lru_cache
+
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+STRING_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+BIND_PATTERN = re.compile(r"(?<![\w:]):\w+|%s|%\(\w+\)s")
+NUMBER_PATTERN = re.compile(r"(?<![\w`.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+IN_LIST_PATTERN = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+VALUES_PATTERN = re.compile(r"\bvalues\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*",
+                            re.IGNORECASE)
+LIMIT_PATTERN = re.compile(r"\blimit\s+\?(?:\s*,\s*\?)?", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_sql(sql_str):
+    """
+    SQL指纹：去掉注释，字符串/数字/绑定参数换成 ?，IN 列表和多行 VALUES 折叠，空白合并并转小写。
+    WHERE id = 1 和 WHERE id = 2、IN (1,2) 和 IN (3,4,5) 得到同一个指纹。
+    """
+    sql = COMMENT_PATTERN.sub(" ", sql_str)
+    sql = STRING_PATTERN.sub("?", sql)
+    sql = BIND_PATTERN.sub("?", sql)
+    sql = NUMBER_PATTERN.sub("?", sql)
+    sql = WHITESPACE_PATTERN.sub(" ", sql).strip().lower()
+    sql = IN_LIST_PATTERN.sub("in (?+)", sql)
+    sql = VALUES_PATTERN.sub(r"values \1", sql)
+    sql = LIMIT_PATTERN.sub("limit ?", sql)
+    return sql
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.md5(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+def get_sql_type(sql_str):
+    return sql_str.strip().split(" ")[0].upper()
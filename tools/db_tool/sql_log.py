@@ -0,0 +1,84 @@
+import logging
+import os
+import queue
+import threading
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class SqlLogPipeline(object):
+    """
+    SQL日志后台写入：请求线程只把日志参数放进有界队列，格式化(strftime/json)和输出在后台线程完成。
+    队列满时直接丢弃并计数，不阻塞请求。
+    按进程启动后台线程，pre-fork 的 worker 在子进程第一次写日志时会重新启动自己的线程。
+    """
+
+    def __init__(self, writer, max_size=None, config_getter=None):
+        """
+        :param max_size: 队列长度，默认在启动时读取配置 SQL_LOG_QUEUE_SIZE
+        :param config_getter: 返回 app.config 的函数
+        """
+        self.writer = writer
+        self.max_size = max_size
+        self.config_getter = config_getter
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.failed = 0
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self.max_size is None:
+                config = self.config_getter() if self.config_getter is not None else {}
+                self.max_size = config.get("SQL_LOG_QUEUE_SIZE", 10000)
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._thread = threading.Thread(target=self.run, name="sql-log-pipeline", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, args):
+        self.ensure_started()
+        try:
+            self._queue.put_nowait(args)
+            self.submitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        log_queue = self._queue
+        while True:
+            args = log_queue.get()
+            try:
+                self.writer(*args)
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                logger.error("sql log pipeline write failed: %s" % traceback.format_exc())
+            finally:
+                log_queue.task_done()
+
+    def flush(self):
+        # 等待队列中的日志全部写完，测试和进程退出前使用
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "failed": self.failed,
+        }
@@ -0,0 +1,281 @@
+import bisect
+import collections
+import logging
+import os
+import threading
+import time
+import traceback
+
+from tools.db_tool.sql_fingerprint import fingerprint_sql, fingerprint_id, get_sql_type
+from tools.util import JsonTool
+
+logger = logging.getLogger(__name__)
+
+# 直方图上界(秒)，包含原日志 elapsed_range 的 100/300/600/1000/2000/3000 ms
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.3, 0.6, 1, 2, 3, 5, 10)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class SeriesStats(object):
+    __slots__ = ("count", "sum", "rows", "errors", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+        self.errors = 0
+        # 最后一个是 +Inf
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, elapsed, rows, is_error):
+        self.count += 1
+        self.sum += elapsed
+        self.rows += rows
+        if is_error:
+            self.errors += 1
+        self.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        self.rows += other.rows
+        self.errors += other.errors
+        for index, value in enumerate(other.buckets):
+            self.buckets[index] += value
+
+    def to_fields(self):
+        fields = {"count": self.count, "sum_us": int(self.sum * 1e6), "rows": self.rows, "errors": self.errors}
+        for index, value in enumerate(self.buckets):
+            if value:
+                fields["b%s" % index] = value
+        return fields
+
+    @staticmethod
+    def from_fields(fields):
+        stats = SeriesStats()
+        stats.count = int(fields.get("count", 0))
+        stats.sum = int(fields.get("sum_us", 0)) / 1e6
+        stats.rows = int(fields.get("rows", 0))
+        stats.errors = int(fields.get("errors", 0))
+        for index in range(len(stats.buckets)):
+            stats.buckets[index] = int(fields.get("b%s" % index, 0))
+        return stats
+
+    def quantile(self, q):
+        # 按桶线性插值估算分位数，落在 +Inf 桶时返回最大的有限上界
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, value in enumerate(self.buckets):
+            if cumulative + value >= rank and value:
+                lower = BUCKETS[index - 1] if index > 0 else 0.0
+                if index >= len(BUCKETS):
+                    return BUCKETS[-1]
+                return lower + (BUCKETS[index] - lower) * (rank - cumulative) / value
+            cumulative += value
+        return BUCKETS[-1]
+
+
+class SqlMetrics(object):
+    """
+    按SQL指纹(去掉字面量)和语句类型统计耗时直方图、调用次数、返回行数。
+    请求线程只把 (sql, 耗时, 行数, 是否异常) 追加到有界 deque，
+    后台线程每 flush_interval 秒计算指纹、汇总，并把增量 HINCRBY 到 Redis，多个 pre-fork worker 共享同一份统计；
+    Redis 中每个指纹的 key 在每次写入时续期 retention 秒，不再出现的指纹过期删除，避免指纹很多时内存无限增长；
+    backend 为 local 时只在进程内累计。
+    """
+    KEY_PREFIX = "dorm:sqlmetrics:"
+    INDEX_KEY = "dorm:sqlmetrics:index"
+
+    def __init__(self, redis_getter=None, backend=None, flush_interval=None, max_pending=100000, config_getter=None,
+                 retention=None):
+        """
+        :param backend: redis/local，和 flush_interval 一样默认在第一次使用时读取配置
+        :param retention: Redis 中指纹统计最后一次写入后保留的秒数，0 为不过期，默认取配置 SQL_METRICS_RETENTION
+        :param config_getter: 返回 app.config 的函数
+        """
+        self.redis_getter = redis_getter
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.config_getter = config_getter
+        self._pending = collections.deque(maxlen=max_pending)
+        self._local = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, sql_str, elapsed, rows=0, is_error=False):
+        if self._pid != os.getpid():
+            self.ensure_started()
+        self._pending.append((sql_str, elapsed, rows, is_error))
+
+    def load_config(self):
+        if self.backend is not None and self.flush_interval is not None and self.retention is not None:
+            return
+        config = self.config_getter() if self.config_getter is not None else {}
+        if self.backend is None:
+            self.backend = config.get("SQL_METRICS_BACKEND", "redis")
+        if self.flush_interval is None:
+            self.flush_interval = config.get("SQL_METRICS_FLUSH_INTERVAL", 5)
+        if self.retention is None:
+            self.retention = config.get("SQL_METRICS_RETENTION", 86400)
+
+    def ensure_started(self):
+        self.load_config()
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # fork 后子进程不继承父进程未汇总的数据
+            self._pending.clear()
+            self._local = {}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name="sql-metrics-flush", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.warning("sql metrics flush failed: %s" % traceback.format_exc())
+
+    def drain(self):
+        """
+        汇总待处理的记录，返回本次的增量 {series_key: SeriesStats}
+        series_key 为 ("fp", 指纹id) 或 ("type", 语句类型)
+        """
+        delta = {}
+        pending = self._pending
+        while pending:
+            try:
+                sql_str, elapsed, rows, is_error = pending.popleft()
+            except IndexError:
+                break
+            fingerprint = fingerprint_sql(sql_str)
+            fp_id = fingerprint_id(fingerprint)
+            sql_type = get_sql_type(sql_str)
+            self._labels[fp_id] = {"fingerprint": fingerprint, "type": sql_type}
+            for key in (("fp", fp_id), ("type", sql_type)):
+                stats = delta.get(key)
+                if stats is None:
+                    stats = delta[key] = SeriesStats()
+                stats.add(elapsed, rows, is_error)
+        return delta
+
+    def flush(self):
+        self.load_config()
+        with self._lock:
+            delta = self.drain()
+            if not delta:
+                return
+            if self.backend == "redis" and self.redis_getter is not None:
+                redis_client = self.redis_getter()
+                pipe = redis_client.pipeline(transaction=False)
+                for (kind, name), stats in delta.items():
+                    key = "%s%s:%s" % (self.KEY_PREFIX, kind, name)
+                    for field, value in stats.to_fields().items():
+                        pipe.hincrby(key, field, value)
+                    if self.retention:
+                        pipe.expire(key, self.retention)
+                    if kind == "fp":
+                        pipe.hset(self.INDEX_KEY, name, JsonTool.to_json(self._labels[name]))
+                if self.retention:
+                    pipe.expire(self.INDEX_KEY, self.retention)
+                pipe.execute()
+            else:
+                for key, stats in delta.items():
+                    if key in self._local:
+                        self._local[key].merge(stats)
+                    else:
+                        self._local[key] = stats
+
+    def snapshot(self):
+        """
+        :return: (labels, {series_key: SeriesStats})，labels 为 {指纹id: {"fingerprint", "type"}}
+        """
+        self.flush()
+        if self.backend == "redis" and self.redis_getter is not None:
+            redis_client = self.redis_getter()
+            labels = {fp_id: JsonTool.to_dict_or_list(value)
+                      for fp_id, value in redis_client.hgetall(self.INDEX_KEY).items()}
+            series = {}
+            for key in redis_client.scan_iter(match=self.KEY_PREFIX + "*:*"):
+                if key == self.INDEX_KEY:
+                    continue
+                kind, name = key[len(self.KEY_PREFIX):].split(":", 1)
+                series[(kind, name)] = SeriesStats.from_fields(redis_client.hgetall(key))
+            # 索引是一个 hash，整体续期，已过期指纹的标签在这里清理
+            expired = [fp_id for fp_id in labels if ("fp", fp_id) not in series]
+            if expired:
+                redis_client.hdel(self.INDEX_KEY, *expired)
+                for fp_id in expired:
+                    del labels[fp_id]
+            return labels, series
+        return dict(self._labels), dict(self._local)
+
+    def reset(self):
+        self.load_config()
+        with self._lock:
+            self._pending.clear()
+            self._local = {}
+            if self.backend == "redis" and self.redis_getter is not None:
+                redis_client = self.redis_getter()
+                keys = list(redis_client.scan_iter(match=self.KEY_PREFIX + "*"))
+                if keys:
+                    redis_client.delete(*keys)
+
+    def to_prometheus(self):
+        """
+        指纹的统计输出为 dorm_sql_*，按语句类型的汇总输出为 dorm_sql_type_*，
+        两者是同一批 SQL 的不同聚合，分开命名，避免 sum(rate(dorm_sql_duration_seconds_count[5m])) 重复计数
+        """
+        labels, series = self.snapshot()
+        fp_lines = self.prometheus_header("dorm_sql", "fingerprint and type")
+        type_lines = self.prometheus_header("dorm_sql_type", "statement type")
+        for (kind, name), stats in sorted(series.items()):
+            if kind == "fp":
+                label = labels.get(name, {})
+                label_str = 'fingerprint_id="%s",fingerprint="%s",type="%s"' % (
+                    name, escape_label(label.get("fingerprint", "")), escape_label(label.get("type", "")))
+                self.prometheus_series(fp_lines, "dorm_sql", label_str, stats)
+            else:
+                self.prometheus_series(type_lines, "dorm_sql_type", 'type="%s"' % escape_label(name), stats)
+        return "\n".join(line for family in (fp_lines, type_lines) for lines in family for line in lines) + "\n"
+
+    @staticmethod
+    def prometheus_header(prefix, by):
+        """
+        :return: [耗时直方图, 分位数, 行数, 异常数] 四组行，每组以 HELP/TYPE 开头
+        """
+        return [
+            ["# HELP %s_duration_seconds SQL execution time by %s" % (prefix, by),
+             "# TYPE %s_duration_seconds histogram" % prefix],
+            ["# HELP %s_duration_quantile_seconds Estimated SQL latency quantiles by %s" % (prefix, by),
+             "# TYPE %s_duration_quantile_seconds gauge" % prefix],
+            ["# HELP %s_rows_total Rows returned by SELECTs (rows written for bulk inserts) by %s" % (prefix, by),
+             "# TYPE %s_rows_total counter" % prefix],
+            ["# HELP %s_errors_total Failed statements by %s" % (prefix, by),
+             "# TYPE %s_errors_total counter" % prefix],
+        ]
+
+    @staticmethod
+    def prometheus_series(family, prefix, label_str, stats):
+        lines, quantile_lines, rows_lines, errors_lines = family
+        cumulative = 0
+        for index, upper in enumerate(BUCKETS + ("+Inf",)):
+            cumulative += stats.buckets[index]
+            lines.append('%s_duration_seconds_bucket{%s,le="%s"} %s' % (prefix, label_str, upper, cumulative))
+        lines.append("%s_duration_seconds_sum{%s} %.6f" % (prefix, label_str, stats.sum))
+        lines.append("%s_duration_seconds_count{%s} %s" % (prefix, label_str, stats.count))
+        for q in QUANTILES:
+            quantile_lines.append('%s_duration_quantile_seconds{%s,quantile="%s"} %.6f'
+                                  % (prefix, label_str, q, stats.quantile(q)))
+        rows_lines.append("%s_rows_total{%s} %s" % (prefix, label_str, stats.rows))
+        errors_lines.append("%s_errors_total{%s} %s" % (prefix, label_str, stats.errors))
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
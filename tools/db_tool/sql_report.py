@@ -0,0 +1,186 @@
+import datetime
+import gzip
+import json
+import re
+import sys
+
+from tools.db_tool.sql_fingerprint import fingerprint_id, fingerprint_sql, get_sql_type
+from tools.db_tool.sql_metrics import SeriesStats
+
+# 排序字段：total 总耗时，count 次数，avg 平均耗时，p50/p95/p99 分位数，rows 行数，errors 异常次数
+SORT_KEYS = ("total", "count", "avg", "p50", "p95", "p99", "max", "rows", "errors")
+RELATIVE_TIME_PATTERN = re.compile(r"^(\d+)([smhd])$")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_time_arg(value, now=None):
+    """
+    时间窗口参数：'2022-01-01 10:00:00'、'2022-01-01'，或相对当前时间的 30m/2h/1d
+    :return: 与日志 start_time 同格式的字符串，None 表示不限
+    """
+    if not value:
+        return None
+    match = RELATIVE_TIME_PATTERN.match(value.strip())
+    if match:
+        seconds = int(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+        return ((now or datetime.datetime.now()) - datetime.timedelta(seconds=seconds)).strftime(TIME_FORMAT)
+    for time_format in (TIME_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value.strip(), time_format).strftime(TIME_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError("无法识别的时间[%s]，格式为 YYYY-MM-DD[ HH:MM[:SS]] 或 30m/2h/1d" % value)
+
+
+def open_log(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_log_records(lines):
+    """
+    从日志行中逐条解析 log_sql_result 写出的 JSON，兼容带 logging 前缀(INFO:logger:)和纯 JSON 的格式。
+    慢查询报警会把同一条记录在下一行再输出一次，跳过这一行，避免重复统计；慢查询执行计划的日志也跳过
+    """
+    skip_next_json = False
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            if "慢查询报警" in line:
+                skip_next_json = True
+            continue
+        if "慢查询报警" in line[:start]:
+            skip_next_json = True
+            continue
+        if "慢查询执行计划" in line[:start]:
+            continue
+        if skip_next_json and start == 0:
+            skip_next_json = False
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or "sql_str" not in record or "sql_elapsed_time_ms" not in record:
+            continue
+        yield record
+
+
+class SqlReport(object):
+    """
+    按SQL指纹汇总 SQL 日志：每个指纹只保存计数和耗时直方图(与 SqlMetrics 相同的桶)，
+    内存占用与指纹数有关，与日志行数无关；分位数由直方图插值估算。
+    count 和耗时只统计执行成功的记录，异常的记录只计入 errors
+    """
+
+    def __init__(self, since=None, until=None):
+        self.since = since
+        self.until = until
+        self.series = {}
+        self.labels = {}
+        self.max_elapsed = {}
+        self.records = 0
+        self.skipped = 0
+        self.first_time = None
+        self.last_time = None
+
+    def add(self, record):
+        start_time = record.get("start_time") or ""
+        if (self.since and start_time < self.since) or (self.until and start_time >= self.until):
+            self.skipped += 1
+            return
+        sql_str = record["sql_str"]
+        fingerprint = fingerprint_sql(sql_str)
+        fp_id = fingerprint_id(fingerprint)
+        stats = self.series.get(fp_id)
+        if stats is None:
+            stats = self.series[fp_id] = SeriesStats()
+            self.labels[fp_id] = {"fingerprint": fingerprint, "type": get_sql_type(sql_str)}
+            self.max_elapsed[fp_id] = 0.0
+        self.records += 1
+        if start_time:
+            if self.first_time is None or start_time < self.first_time:
+                self.first_time = start_time
+            if self.last_time is None or start_time > self.last_time:
+                self.last_time = start_time
+        elapsed = float(record["sql_elapsed_time_ms"]) / 1000
+        if record.get("result") == "EXCEPTION" or elapsed < 0:
+            # 旧版本记录的异常SQL耗时是很大的负数，异常只计入 errors，不参与次数和耗时统计
+            stats.errors += 1
+            return
+        rows = record.get("rows")
+        if rows is None:
+            # 旧日志没有 rows 字段，用返回值的长度
+            return_value = record.get("return_value")
+            rows = len(return_value) if isinstance(return_value, list) else 0
+        stats.add(elapsed, int(rows or 0), False)
+        if elapsed > self.max_elapsed[fp_id]:
+            self.max_elapsed[fp_id] = elapsed
+
+    def add_lines(self, lines):
+        for record in iter_log_records(lines):
+            self.add(record)
+
+    def top(self, sort="total", limit=20):
+        """
+        :return: 按 sort 从大到小排序的前 limit 个指纹，耗时单位为毫秒
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError("排序字段只能是 %s" % "/".join(SORT_KEYS))
+        result = []
+        for fp_id, stats in self.series.items():
+            max_elapsed = self.max_elapsed[fp_id]
+            # 直方图插值在桶内是线性的，估算值不超过实际最大耗时
+            p50, p95, p99 = (min(stats.quantile(q), max_elapsed) for q in (0.5, 0.95, 0.99))
+            result.append({
+                "fingerprint_id": fp_id,
+                "type": self.labels[fp_id]["type"],
+                "count": stats.count,
+                "total": round(stats.sum * 1000, 3),
+                "avg": round(stats.sum * 1000 / stats.count, 3) if stats.count else 0,
+                "p50": round(p50 * 1000, 3),
+                "p95": round(p95 * 1000, 3),
+                "p99": round(p99 * 1000, 3),
+                "max": round(max_elapsed * 1000, 3),
+                "rows": stats.rows,
+                "errors": stats.errors,
+                "fingerprint": self.labels[fp_id]["fingerprint"],
+            })
+        result.sort(key=lambda item: item[sort], reverse=True)
+        return result[:limit] if limit else result
+
+    def summary(self):
+        return {
+            "records": self.records,
+            "skipped": self.skipped,
+            "fingerprints": len(self.series),
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "total_ms": round(sum(stats.sum for stats in self.series.values()) * 1000, 3),
+        }
+
+    def to_json(self, sort="total", limit=20):
+        return json.dumps({"summary": self.summary(), "sort": sort, "top": self.top(sort, limit)},
+                          ensure_ascii=False, indent=2)
+
+    def to_table(self, sort="total", limit=20, width=80):
+        summary = self.summary()
+        lines = [
+            "records: %s  fingerprints: %s  skipped: %s  time: %s ~ %s  total: %.1f ms  sort: %s" % (
+                summary["records"], summary["fingerprints"], summary["skipped"], summary["first_time"],
+                summary["last_time"], summary["total_ms"], sort),
+            "%-16s %-7s %8s %12s %10s %10s %10s %10s %10s %10s %6s  %s" % (
+                "fingerprint_id", "type", "count", "total_ms", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                "rows", "errors", "fingerprint"),
+        ]
+        for item in self.top(sort, limit):
+            fingerprint = item["fingerprint"]
+            if width and len(fingerprint) > width:
+                fingerprint = fingerprint[:width - 3] + "..."
+            lines.append("%-16s %-7s %8s %12.1f %10.2f %10.2f %10.2f %10.2f %10.2f %10s %6s  %s" % (
+                item["fingerprint_id"], item["type"][:7], item["count"], item["total"], item["avg"], item["p50"],
+                item["p95"], item["p99"], item["max"], item["rows"], item["errors"], fingerprint))
+        return "\n".join(lines)
@@ -43,27 +43,32 @@ class ReturnDict(object):
         from tools.util import MyJsonEncoder
         return json.dumps(self.to_dict(), ensure_ascii=is_unicode, cls=MyJsonEncoder)
 
+    def to_json_bytes(self):
+        """
+        序列化为 bytes，安装了 orjson 时使用 orjson，见 JsonTool.dumps
+        """
+        from tools.util import JsonTool
+        return JsonTool.dumps(self.to_dict())
+
+    def to_response(self, status=200):
+        from flask import Response
+        return Response(self.to_json_bytes(), status=status, mimetype="application/json")
+
     def to_dict(self):
         ret_dict = {}
         ret_dict['code'] = self.code
         ret_dict['msg'] = self.msg
-        if isinstance(self.data, bytes):
-            self.data = str(self.data, encoding="utf-8")
-        if not isinstance(self.data, dict) \
-                and not isinstance(self.data, list) \
-                and not isinstance(self.data, str) \
-                and not isinstance(self.data, int) \
-                and not isinstance(self.data, float) \
-                and not isinstance(self.data, type(None)):
+        data = self.data
+        if isinstance(data, bytes):
+            data = str(data, encoding="utf-8")
+        if not isinstance(data, (dict, list, str, int, float, type(None))):
             ret_dict['data'] = "不识别的data类型！data必须是dict，list或者str/int/float。"
         else:
-            if isinstance(self.data, dict):
-                for k, v in self.data.items():
-                    if isinstance(v, datetime.datetime):
-                        # 如果是datetime类型的，无法转换为json，要先转换为字符串
-                        self.data[k] = str(v)
+            if isinstance(data, dict) and any(isinstance(v, datetime.datetime) for v in data.values()):
+                # 如果是datetime类型的，无法转换为json，要先转换为字符串；复制一份，不修改调用方的数据
+                data = {k: str(v) if isinstance(v, datetime.datetime) else v for k, v in data.items()}
 
-            ret_dict['data'] = self.data
+            ret_dict['data'] = data
         return ret_dict
 
 
@@ -0,0 +1,88 @@
+import contextvars
+import itertools
+import os
+import re
+from contextlib import ContextDecorator
+
+from flask import g, has_app_context, has_request_context, request
+
+# 调用方通过请求头传入的 trace id，只接受字母数字和 -_.:，会原样写进日志和 SQL 注释
+TRACE_ID_HEADER = "TRACE_ID"
+TRACE_ID_PATTERN = re.compile(r"^[\w\-.:]{1,64}$", re.ASCII)
+
+# TraceContext 设置的 trace id，优先于请求中的 trace id
+_trace_id_var = contextvars.ContextVar("dorm_trace_id", default=None)
+
+# 进程前缀 + 自增序号，每个 id 只需一次格式化；fork 后子进程换一个前缀，避免多个 worker 重复
+_prefix = os.urandom(6).hex()
+_counter = itertools.count(1)
+
+
+def _reset_after_fork():
+    global _prefix, _counter
+    _prefix = os.urandom(6).hex()
+    _counter = itertools.count(1)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def new_trace_id():
+    """
+    生成新的 trace id：12位进程随机前缀 + 12位十六进制序号，共24位
+    """
+    return "%s%012x" % (_prefix, next(_counter))
+
+
+def get_trace_id(create=True):
+    """
+    当前的 trace id，同一个请求(app 上下文)内只生成一次：
+    TraceContext 设置的 > 请求头 TRACE_ID > 新生成并缓存在 g 中
+    :param create: 为 False 时不在上下文外生成新 id，没有时返回 None
+    """
+    trace_id = _trace_id_var.get()
+    if trace_id is not None:
+        return trace_id
+    if not has_app_context():
+        return new_trace_id() if create else None
+    trace_id = g.get("_trace_id")
+    if trace_id is None:
+        if has_request_context():
+            trace_id = request.headers.get(TRACE_ID_HEADER)
+            if trace_id is not None and not TRACE_ID_PATTERN.match(trace_id):
+                trace_id = None
+        g._trace_id = trace_id = trace_id or new_trace_id()
+    return trace_id
+
+
+class TraceContext(ContextDecorator):
+    """
+    在 with 块中使用指定的 trace id(默认新生成)，用于后台任务、脚本，以及把请求的 trace id 带到查询线程池
+        with TraceContext(trace_id):
+            ...
+    """
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or new_trace_id()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _trace_id_var.set(self.trace_id)
+        return self.trace_id
+
+    def __exit__(self, exc_typ, exc_val, tb):
+        _trace_id_var.reset(self._token)
+
+
+def add_sql_comment(conn, cursor, statement, parameters, context, executemany):
+    """
+    engine 的 before_cursor_execute 监听：在 SQL 前加 /* trace_id=... */，慢查询日志和 processlist 里可以按请求关联。
+    executemany 不加，PyMySQL 只有语句以 INSERT/REPLACE 开头时才会改写成多行 INSERT
+    """
+    if executemany:
+        return statement, parameters
+    trace_id = get_trace_id(create=False)
+    if trace_id is None:
+        return statement, parameters
+    return "/* trace_id=%s */ %s" % (trace_id, statement), parameters
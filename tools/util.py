@@ -1,12 +1,15 @@
 import uuid
-import random
 import json
 import hashlib
 import datetime
 from flask.json import JSONEncoder as BaseJSONEncoder
 import decimal
-from flask import request
-from tools.time_tool import get_current_time
+from tools.trace_context import get_trace_id
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，没有安装时用标准库 json
+    orjson = None
 
 
 def md5(basestr, case="lower"):
@@ -52,7 +55,78 @@ class MyJsonEncoder(BaseJSONEncoder):
         return super(MyJsonEncoder, self).default(o)
 
 
+def format_datetime(o):
+    # 与 strftime("%Y-%m-%d %H:%M:%S") 结果相同，isoformat 快很多；带时区或四位以下年份时用 strftime
+    if o.tzinfo is None and o.year >= 1000:
+        return o.isoformat(" ", "seconds")
+    return o.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_date(o):
+    return o.isoformat() if o.year >= 1000 else o.strftime('%Y-%m-%d')
+
+
+# 按类型直接查找转换函数，子类再走 isinstance 判断
+JSON_DEFAULT_CONVERTERS = {
+    datetime.datetime: format_datetime,
+    datetime.date: format_date,
+    decimal.Decimal: str,
+    uuid.UUID: str,
+    bytes: lambda o: o.decode("utf-8"),
+}
+
+
+def json_default(o):
+    """
+    与 MyJsonEncoder.default 的格式一致，供 orjson 使用
+    """
+    converter = JSON_DEFAULT_CONVERTERS.get(type(o))
+    if converter is not None:
+        return converter(o)
+    if isinstance(o, datetime.datetime):
+        return format_datetime(o)
+    if isinstance(o, datetime.date):
+        return format_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, bytes):
+        return o.decode("utf-8")
+    raise TypeError("Object of type %s is not JSON serializable" % type(o).__name__)
+
+
 class JsonTool():
+    # dumps 使用的序列化后端：orjson 或 stdlib，默认安装了 orjson 就用 orjson
+    backend = "orjson" if orjson is not None else "stdlib"
+    if orjson is not None:
+        # datetime/date 交给 json_default，保持 "%Y-%m-%d %H:%M:%S" 格式；非字符串 key 与标准库一样转为字符串
+        ORJSON_OPTION = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    @staticmethod
+    def set_backend(backend="auto"):
+        """
+        :param backend: auto/orjson/stdlib，orjson 没有安装时 auto 使用 stdlib
+        """
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "stdlib"
+        if backend not in ("orjson", "stdlib"):
+            raise ValueError("不支持的json序列化后端[%s]" % backend)
+        if backend == "orjson" and orjson is None:
+            raise ValueError("没有安装orjson")
+        JsonTool.backend = backend
+
+    @staticmethod
+    def dumps(obj):
+        """
+        序列化为 UTF-8 编码的 bytes，可以直接作为 Response 的 body，不修改传入的数据。
+        orjson 不支持的值(如超过 64 位的整数、自定义对象)回退到标准库 json
+        """
+        if JsonTool.backend == "orjson":
+            try:
+                return orjson.dumps(obj, default=json_default, option=JsonTool.ORJSON_OPTION)
+            except TypeError:
+                pass
+        return json.dumps(obj, cls=MyJsonEncoder, ensure_ascii=False).encode("utf-8")
+
 
     @staticmethod
     def to_json(srcdict, cls=MyJsonEncoder, ensure_ascii=False):
@@ -101,15 +175,8 @@ class JsonTool():
 
 
 def get_global_trace_id():
-    try:
-
-        if request and request.headers.get("TRACE_ID"):
-            log_trace_id = request.headers.get("TRACE_ID", "0")
-        else:
-            log_trace_id = md5(get_current_time() + str(random.randint(0, 1000000000)))
-    except:
-        log_trace_id = md5(get_current_time() + str(random.randint(0, 1000000000)))
-    return log_trace_id
+    # 同一个请求内的 SQL 日志共用一个 trace id，见 tools.trace_context.get_trace_id
+    return get_trace_id()
 
 
 def get_sub_string(params, start, end):